@@ -0,0 +1,107 @@
+"""
+Benchmark of ParsedLang construction from KNP -tab output and of the views read by the graph
+parser: time, retained memory and live allocations per parsed sentence.
+
+    python benchmarks/bench_lang_parser.py [--repeat 200]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pyknp import BList
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from jaspice.lang_parser import ParsedLang  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "knp.jsonl")
+
+
+def load_samples(path: str = DATA_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["knp"] for line in f]
+
+
+def use(lparsed: ParsedLang) -> ParsedLang:
+    # the views read by JaSceneGraphParser
+    lparsed.case_args
+    for bnst in lparsed.bnsts:
+        bnst.parent
+    return lparsed
+
+
+def bench_parsed_lang(samples, repeat: int = 200):
+    """
+    Args:
+        samples (List[str]): KNP outputs
+        repeat (int, optional): number of passes over the samples. Defaults to 200.
+
+    Returns:
+        Dict[str, float]: time, retained bytes and live blocks per sentence, and peak bytes
+    """
+    samples = samples * repeat
+    n = len(samples)
+
+    # pyknp parsing excluded
+    blists = [BList(sample, "EOS") for sample in samples]
+    start = time.perf_counter()
+    for blist in blists:
+        use(ParsedLang(blist))
+    elapsed = time.perf_counter() - start
+    del blists
+
+    # retained: parsed sentences as held by the in-process cache, including what they keep of pyknp
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    parsed = [use(ParsedLang(BList(sample, "EOS"))) for sample in samples]
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    retained = sum(stat.size_diff for stat in stats)
+    blocks = sum(stat.count_diff for stat in stats)
+    del parsed
+
+    return {
+        "sentences": n,
+        "us_per_sentence": elapsed / n * 1e6,
+        "bytes_per_sentence": retained / n,
+        "blocks_per_sentence": blocks / n,
+        "peak_bytes": peak,
+    }
+
+
+def bench_cache_hit(samples, repeat: int = 200):
+    """
+    Cache-hit path: from cached KNP output to the views read by the graph parser,
+    through pyknp's BList and through the native -tab parser.
+
+    Args:
+        samples (List[str]): KNP outputs
+        repeat (int, optional): number of passes over the samples. Defaults to 200.
+
+    Returns:
+        Dict[str, float]: time per sentence of each path and the speedup
+    """
+    samples = samples * repeat
+    timings = {}
+    for name, build in [("pyknp", lambda sample: ParsedLang(BList(sample, "EOS"))), ("native", ParsedLang.from_tab)]:
+        start = time.perf_counter()
+        for sample in samples:
+            use(build(sample))
+        timings[f"{name}_us_per_sentence"] = (time.perf_counter() - start) / len(samples) * 1e6
+    timings["speedup"] = timings["pyknp_us_per_sentence"] / timings["native_us_per_sentence"]
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="number of passes over the samples")
+    args = parser.parse_args()
+    samples = load_samples()
+    print(json.dumps({"parsed_lang": bench_parsed_lang(samples, args.repeat), "cache_hit": bench_cache_hit(samples, args.repeat)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
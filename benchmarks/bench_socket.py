@@ -0,0 +1,80 @@
+"""
+Benchmark of reading KNP server responses with Socket, against the former reader
+(1 KB reads, re-decoding and regex-searching the whole accumulated buffer after every read),
+on KNP outputs of long captions served by the stand-in server.
+
+    python benchmarks/bench_socket.py [--repeat 10]
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from jaspice.knp_wrapper import Socket  # noqa: E402
+from jaspice.stub_server import StubServer  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "tests", "data", "knp.jsonl")
+SIZES = [1, 8, 64, 256]  # sentences of the fixture per response
+
+
+class LegacySocket(Socket):
+    def receive(self):
+        def decode(x):
+            try:
+                return x.decode("utf-8")
+            except BaseException:
+                return ""
+
+        recv = bytes(self.buffer) + self.sock.recv(1024)
+        while not re.search("EOS\n$", decode(recv)):
+            recv = recv + self.sock.recv(1024)
+        self.buffer.clear()
+        return recv.strip().decode("utf-8")
+
+
+def long_outputs(path: str = DATA_PATH):
+    with open(path, encoding="utf-8") as f:
+        body = "".join(json.loads(line)["knp"].replace("EOS\n", "") for line in f)
+    return {f"x{size}": body * size for size in SIZES}
+
+
+def bench_socket(repeat: int = 10):
+    """
+    Args:
+        repeat (int, optional): queries per response size and reader. Defaults to 10.
+
+    Returns:
+        Dict[str, Dict[str, float]]: response size, time per query of each reader and the speedup
+    """
+    outputs = long_outputs()
+    results = {}
+    with StubServer(lambda text: outputs[text.strip()]) as server:
+        for key, output in outputs.items():
+            result: Dict[str, float] = {"response_bytes": len(output.encode("utf-8"))}
+            for name, cls in [("legacy", LegacySocket), ("buffered", Socket)]:
+                sock = cls("localhost", server.address[1], b"RUN -tab -normal\n")
+                assert sock.query(f"{key}\nEOS", "EOS") == output + "EOS"
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    sock.query(f"{key}\nEOS", "EOS")
+                result[f"{name}_ms_per_query"] = (time.perf_counter() - start) / repeat * 1e3
+                sock.sock.close()
+                sock.sock = None
+            result["speedup"] = result["legacy_ms_per_query"] / result["buffered_ms_per_query"]
+            results[key] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="queries per response size and reader")
+    args = parser.parse_args()
+    print(json.dumps({"socket": bench_socket(args.repeat)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
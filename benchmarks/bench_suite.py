@@ -0,0 +1,453 @@
+"""
+Benchmark suite: scene graph construction, get_graph_tuple, JaWordNet.get_synonyms and _compute_matching
+microbenchmarks, and end-to-end captions/sec of BatchJaSPICE and of the callback server, as JSON.
+
+Captions come from fixed-seed corpora sampled from recorded KNP outputs (see jaspice-replay), so the suite
+runs without Juman++/KNP; synthetic scene graphs stand in for captions longer than the recorded ones.
+Without --wordnet, a fixed-seed synthetic wnjpn.db is generated. Everything runs in a scratch directory.
+
+    python benchmarks/bench_suite.py [--fixture tests/data/knp.jsonl] [--seed 0] [-o result.json] [--baseline old.json]
+    python benchmarks/bench_suite.py --server  # also measure a callback server listening on localhost:2115
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import functools
+import subprocess
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import jaspice.wordnet  # noqa: E402
+from jaspice.graph_parser import JaSceneGraphParser, SceneGraph, SceneTuple, ZEROP_TUPLE  # noqa: E402
+from jaspice.metrics import BatchJaSPICE, JaSPICE  # noqa: E402
+from jaspice.replay import ReplayKNP, ReplayLangParser, load_recordings  # noqa: E402
+from jaspice.wordnet import JaWordNet, build_artifact  # noqa: E402
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_PATH = os.path.join(ROOT, "tests", "data", "knp.jsonl")
+CLAUSES = [1, 4, 16, 64, 256]  # synthetic caption lengths, in predicate clauses
+CORPORA = [("short", 1), ("short", 5), ("long", 1), ("long", 5)]  # caption length, references per caption
+SECTIONS = ["scene_graph", "synonyms", "matching", "e2e"]
+
+Script = List[Tuple[Any, ...]]
+
+
+def per_call_us(func: Callable[[Any], Any], items: List[Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (repeat * len(items)) * 1e6
+
+
+def synthetic_script(clauses: int, rng: random.Random) -> Script:
+    """
+    add_node/add_edge calls of a caption with `clauses` predicate clauses, shaped like the graph parser's output:
+    subject -> predicate -> object, attributes of objects and "の" relations between nouns.
+    Vocabularies grow with the caption, so that about half of the nodes are looked up again.
+
+    Args:
+        clauses (int): number of clauses
+        rng (random.Random): seeded generator
+
+    Returns:
+        Script: ("node", text, pos, unique) and ("edge", src, dst) operations, edges indexing node operations
+    """
+    nouns = [f"名詞{i}" for i in range(max(4, 2 * clauses))]
+    verbs = [f"動詞{i}" for i in range(max(2, clauses))]
+    attrs = [f"属性{i}" for i in range(max(2, clauses // 2))]
+    script: Script = []
+    nodes = [0]
+
+    def node(text, pos, unique=False) -> int:
+        script.append(("node", text, pos, unique))
+        nodes[0] += 1
+        return nodes[0] - 1
+
+    for _ in range(clauses):
+        subj = node(rng.choice(nouns), "NP") if rng.random() < 0.8 else -1  # the rest get zero pronouns
+        rel = node(rng.choice(verbs), "OTHER")
+        obj = node(rng.choice(nouns), "NP")
+        script.append(("edge", rel, obj))
+        if subj != -1:
+            script.append(("edge", subj, rel))
+        if rng.random() < 0.5:
+            script.append(("edge", obj, node(rng.choice(attrs), "ATTR")))
+        if rng.random() < 0.3:
+            noun, mid = node(rng.choice(nouns), "NP"), node("の", "OTHER", unique=True)
+            script.append(("edge", noun, mid))
+            script.append(("edge", mid, obj))
+    return script
+
+
+def construct(script: Script) -> SceneGraph:
+    graph = SceneGraph()
+    ids = []
+    for op in script:
+        if op[0] == "node":
+            ids.append(graph.add_node(op[1], op[1], op[2], op[3]))
+        else:
+            graph.add_edge(ids[op[1]], ids[op[2]])
+    return graph
+
+
+def make_corpora(texts: List[str], captions: int, seed: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Fixed-seed corpora of candidates and references, split by caption length at the median.
+
+    Args:
+        texts (List[str]): recorded sentences
+        captions (int): candidates per corpus
+        seed (int): random seed
+
+    Returns:
+        Dict[str, Dict[str, Any]]: candidates and references of each corpus
+    """
+    ranked = sorted(texts, key=len)
+    pools = {"short": ranked[:(len(ranked) + 1) // 2], "long": ranked[len(ranked) // 2:]}
+    corpora = {}
+    for length, refs in CORPORA:
+        rng = random.Random(f"{seed}-{length}-{refs}")
+        corpora[f"{length}_refs{refs}"] = {
+            "candidates": [rng.choice(pools[length]) for _ in range(captions)],
+            "references": [[rng.choice(pools[length]) for _ in range(refs)] for _ in range(captions)],
+        }
+    return corpora
+
+
+def synthetic_wordnet(path: str, words: List[str], fillers: int, seed: int):
+    """
+    Write a wnjpn.db with the schema of the Japanese WordNet: the benchmark words and `fillers` other lemmas,
+    grouped into synsets of 1-4 Japanese lemmas and one English lemma; a third of the lemmas are in two synsets.
+
+    Args:
+        path (str): output path
+        words (List[str]): words looked up by the benchmarks
+        fillers (int): number of other lemmas
+        seed (int): random seed
+    """
+    rng = random.Random(seed)
+    lemmas = list(dict.fromkeys(words)) + [f"語彙{i}" for i in range(fillers)]
+    rng.shuffle(lemmas)
+    rows = [(i, "jpn", lemma) for i, lemma in enumerate(lemmas)]
+    senses: List[Tuple[str, int, str]] = []
+    i = 0
+    while i < len(lemmas):
+        synset = f"{len(senses):08d}-n"
+        size = rng.randint(1, 4)
+        members = list(range(i, min(i + size, len(lemmas))))
+        members += [rng.randrange(len(lemmas)) for _ in members if rng.random() < 0.33]
+        eng = len(rows)
+        rows.append((eng, "eng", f"lemma{eng}"))
+        senses.extend([(synset, wordid, "jpn") for wordid in dict.fromkeys(members)] + [(synset, eng, "eng")])
+        i += size
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE word (wordid integer primary key, lang text, lemma text, pron text, pos text)")
+    db.execute("CREATE TABLE sense (synset text, wordid integer, lang text, rank text, lexid integer, freq integer, src text)")
+    db.executemany("INSERT INTO word (wordid, lang, lemma) values (?, ?, ?)", rows)
+    db.executemany("INSERT INTO sense (synset, wordid, lang) values (?, ?, ?)", senses)
+    db.commit()
+    db.close()
+
+
+def bench_scene_graph(scripts: Dict[int, List[Script]], parser: JaSceneGraphParser, texts: List[str], repeat: int):
+    """
+    Args:
+        scripts (Dict[int, List[Script]]): synthetic captions of each length
+        parser (JaSceneGraphParser): graph parser on the replay backend
+        texts (List[str]): recorded sentences
+        repeat (int): passes over the captions
+
+    Returns:
+        Dict[str, Dict[str, float]]: graph size and time per caption of SceneGraph construction and get_graph_tuple
+    """
+    results = {}
+    for clauses, captions in scripts.items():
+        graphs = [construct(script) for script in captions]
+        tuples = sum(len(graph.get_graph_tuple()) for graph in graphs)
+        fresh = [construct(script) for _ in range(repeat) for script in captions]  # build() runs once per graph
+        results[f"clauses{clauses}"] = {
+            "nodes": sum(len(graph.nodes) for graph in graphs) / len(graphs),
+            "tuples": tuples / len(graphs),
+            "construct_us": per_call_us(construct, captions, repeat),
+            "get_graph_tuple_us": per_call_us(SceneGraph.get_graph_tuple, fresh, 1),
+        }
+
+    # the graph parser on recorded parses: predicate-argument structure and dependencies, then tuples
+    parsed = [parser.ja_parser(text) for text in texts]
+    graphs = [SceneGraph() for _ in range(repeat) for _ in parsed]
+    start = time.perf_counter()
+    for graph, lparsed in zip(graphs, parsed * repeat):
+        try:  # as in JaSceneGraphParser.run
+            parser._parse(graph, lparsed)
+        except BaseException:
+            graph.failed = True
+    parse_us = (time.perf_counter() - start) / len(graphs) * 1e6
+    results["recorded"] = {
+        "sentences": len(texts),
+        "failed": sum(graph.failed for graph in graphs[:len(parsed)]),
+        "nodes": sum(len(graph.nodes) for graph in graphs[:len(parsed)]) / len(parsed),
+        "parse_us": parse_us,
+        "get_graph_tuple_us": per_call_us(SceneGraph.get_graph_tuple, graphs, 1),
+    }
+    return results
+
+
+def bench_synonyms(words: List[str], repeat: int):
+    """
+    Args:
+        words (List[str]): looked-up words
+        repeat (int): passes over the words (one for sqlite lookups)
+
+    Returns:
+        Dict[str, Dict[str, float]]: first lookup (loading the index) and time per lookup of each backend
+    """
+    build_artifact()
+    results = {}
+    for name, wordnet, passes in [("artifact", JaWordNet(), repeat), ("index", JaWordNet(artifact=None), repeat),
+                                  ("sqlite", JaWordNet(use_index=False), 1)]:
+        start = time.perf_counter()
+        wordnet.get_synonyms(words[0])
+        first_ms = (time.perf_counter() - start) * 1e3
+        results[name] = {
+            "words": len(words),
+            "synonyms_per_word": sum(len(wordnet.get_synonyms(word)) for word in words) / len(words),
+            "first_lookup_ms": first_ms,
+            "lookup_us": per_call_us(wordnet.get_synonyms, words, passes),
+        }
+    return results
+
+
+def bench_matching(scripts: Dict[int, List[Script]], jaspice: JaSPICE, refs: int, repeat: int):
+    """
+    Matching of a candidate against the union of `refs` references, all drawn from the same vocabulary,
+    with synonym sets already loaded.
+
+    Args:
+        scripts (Dict[int, List[Script]]): synthetic captions of each length, at least refs + 1 per length
+        jaspice (JaSPICE): scorer
+        refs (int): references per candidate
+        repeat (int): calls per pair
+
+    Returns:
+        Dict[str, Dict[str, float]]: tuple set sizes and time per call
+    """
+    def tuple_set(graph: SceneGraph) -> Set[SceneTuple]:
+        tuples = set(graph.get_scene_tuples())
+        tuples.discard(ZEROP_TUPLE)
+        return tuples
+
+    results = {}
+    for clauses, captions in scripts.items():
+        sets = [tuple_set(construct(script)) for script in captions]
+        pairs = [(sets[i], set().union(*sets[i + 1:i + 1 + refs])) for i in range(0, len(sets) - refs, refs + 1)]
+        for cand, ref in pairs:
+            jaspice._compute_matching(cand, ref)
+        results[f"clauses{clauses}"] = {
+            "cand_tuples": sum(len(cand) for cand, _ in pairs) / len(pairs),
+            "ref_tuples": sum(len(ref) for _, ref in pairs) / len(pairs),
+            "compute_matching_us": per_call_us(lambda pair: jaspice._compute_matching(*pair), pairs, repeat),
+        }
+    return results
+
+
+def bench_local(corpora: Dict[str, Dict[str, Any]], fixture: str, size: int, latency: float):
+    """
+    Captions/sec of JaSPICE in this process and of BatchJaSPICE on Ray workers, on the replay backend.
+    Each run starts from an empty parse cache (cold), then scores the corpus again (warm).
+
+    Args:
+        corpora (Dict[str, Dict[str, Any]]): corpora
+        fixture (str): recorded KNP outputs
+        size (int): batch size
+        latency (float): seconds slept per parsed sentence
+
+    Returns:
+        Dict[str, Dict[str, Any]]: captions/sec of each mode and corpus, or the error
+    """
+    def score(scorer, corpus, batched: bool) -> float:
+        cands, refs = corpus["candidates"], corpus["references"]
+        start = time.perf_counter()
+        if batched:
+            for i in range(0, len(cands), size):
+                scorer(refs[i:i + size], cands[i:i + size])
+        else:
+            for cand, ref in zip(cands, refs):
+                scorer(ref, cand)
+        return len(cands) / (time.perf_counter() - start)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for mode in ["sequential", "batch", "batch_vectorized"]:
+        results[mode] = {}
+        for name, corpus in corpora.items():
+            factory = functools.partial(ReplayLangParser, fixture, latency=latency, cache_path=f"parsed-{mode}-{name}.db")
+            batched = mode != "sequential"
+            try:
+                if batched:
+                    scorer: Any = BatchJaSPICE(size, vectorized=mode == "batch_vectorized", lparser_factory=factory)
+                else:
+                    scorer = JaSPICE(factory())
+                results[mode][name] = {"cold_captions_per_sec": score(scorer, corpus, batched),
+                                       "warm_captions_per_sec": score(scorer, corpus, batched)}
+            except Exception as e:  # e.g. Ray cannot start on this machine
+                results[mode] = {"error": repr(e)}
+                break
+    return results
+
+
+def bench_server(corpora: Dict[str, Dict[str, Any]], size: int):
+    """
+    Captions/sec of the callback server (on its own parser backend) through jaspice.api.JaSPICE.
+
+    Args:
+        corpora (Dict[str, Dict[str, Any]]): corpora
+        size (int): batch size
+
+    Returns:
+        Dict[str, Any]: captions/sec of each corpus, or the error
+    """
+    from jaspice.api import JaSPICE as APIJaSPICE
+    results: Dict[str, Any] = {}
+    for name, corpus in corpora.items():
+        keys = [str(i) for i in range(len(corpus["candidates"]))]
+        cands = {key: [cand] for key, cand in zip(keys, corpus["candidates"])}
+        refs = dict(zip(keys, corpus["references"]))
+        start = time.perf_counter()
+        try:
+            APIJaSPICE(batch_size=size, server_mode=True).compute_score(refs, cands)
+        except Exception as e:
+            return {"error": repr(e)}
+        results[name] = {"captions_per_sec": len(keys) / (time.perf_counter() - start)}
+    return results
+
+
+def flatten(result: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and (key.endswith(("_us", "_ms")) or "per_sec" in key):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Speedup of every timing and throughput over a baseline result (above 1 is faster).
+
+    Args:
+        baseline (Dict[str, Any]): earlier result
+        result (Dict[str, Any]): this result
+
+    Returns:
+        Dict[str, float]: speedup of each metric present in both
+    """
+    old, new = flatten(baseline), flatten(result)
+    speedups = {}
+    for key in old.keys() & new.keys():
+        if old[key] and new[key]:
+            speedups[key] = new[key] / old[key] if "per_sec" in key else old[key] / new[key]
+    return dict(sorted(speedups.items()))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    recordings = load_recordings(args.fixture)
+    texts = sorted(recordings)
+    rng = random.Random(args.seed)
+    # enough captions of each length for the matching pairs
+    scripts = {clauses: [synthetic_script(clauses, rng) for _ in range(args.graphs)] for clauses in CLAUSES}
+    corpora = make_corpora(texts, args.captions, args.seed)
+    result: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "seed": args.seed,
+            "fixture": os.path.relpath(args.fixture, ROOT),
+            "fixture_digest": ReplayKNP(args.fixture).options[0],
+            "wordnet": "synthetic" if args.wordnet is None else args.wordnet,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "corpora": {name: {"captions": len(corpus["candidates"]), "references": len(corpus["references"][0]),
+                           "mean_chars": sum(map(len, corpus["candidates"])) / len(corpus["candidates"])}
+                    for name, corpus in corpora.items()},
+    }
+
+    parser = JaSceneGraphParser(ReplayLangParser(args.fixture), cache_tuples=False)
+    if "scene_graph" in args.sections:
+        result["scene_graph"] = bench_scene_graph(scripts, parser, texts, args.repeat)
+
+    # words of every graph node, looked up by the synonym and matching benchmarks
+    graphs = [construct(script) for captions in scripts.values() for script in captions]
+    graphs += [parser.run(text) for text in texts]
+    words = list(dict.fromkeys(node.word for graph in graphs for node in graph.nodes))
+    if args.wordnet is None:
+        synthetic_wordnet(jaspice.wordnet.PATH, words, args.fillers, args.seed)
+    else:
+        os.symlink(args.wordnet, jaspice.wordnet.PATH)
+
+    if "synonyms" in args.sections:
+        result["synonyms"] = bench_synonyms(words, args.repeat)
+    if "matching" in args.sections:
+        result["matching"] = bench_matching(scripts, JaSPICE(parser.ja_parser), args.refs, args.repeat)
+    if "e2e" in args.sections:
+        result["e2e"] = {"local": bench_local(corpora, args.fixture, args.batch_size, args.latency)}
+        result["e2e"]["server"] = bench_server(corpora, args.batch_size) if args.server else \
+            {"skipped": "pass --server with a callback server (python -m jaspice.server) listening on localhost:2115"}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixture", default=DATA_PATH, help="recorded KNP outputs (JSONL) the corpora are sampled from")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the corpora, graphs and synthetic WordNet")
+    parser.add_argument("--repeat", type=int, default=20, help="passes of each microbenchmark")
+    parser.add_argument("--graphs", type=int, default=24, help="synthetic captions per length")
+    parser.add_argument("--refs", type=int, default=5, help="references per candidate in the matching benchmark")
+    parser.add_argument("--captions", type=int, default=64, help="candidates per end-to-end corpus")
+    parser.add_argument("--batch-size", type=int, default=16, help="batch size of the end-to-end runs")
+    parser.add_argument("--latency", type=float, default=0., help="seconds slept per sentence parsed by the replay backend")
+    parser.add_argument("--wordnet", default=None, help="wnjpn.db; a synthetic one is generated if omitted")
+    parser.add_argument("--fillers", type=int, default=20000, help="lemmas of the synthetic WordNet besides the benchmark words")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS, help="benchmarks to run")
+    parser.add_argument("--server", action="store_true", help="measure the callback server on localhost:2115")
+    parser.add_argument("--baseline", default=None, help="earlier result to compute speedups against")
+    parser.add_argument("-o", "--output", default=None, help="also write the result to this file")
+    args = parser.parse_args()
+    args.fixture = os.path.abspath(args.fixture)
+    args.wordnet = args.wordnet and os.path.abspath(args.wordnet)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="jaspice-bench-") as workdir:
+        os.chdir(workdir)  # parse caches, wnjpn.db and its artifact are read from the working directory
+        try:
+            result = run(args)
+        finally:
+            os.chdir(cwd)
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            result["speedup"] = compare(json.load(f), result)
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,24 @@ import json
 import numpy as np
 from typing import List, Tuple, Dict
 from tqdm import tqdm
+from jaspice import instrument
 from jaspice.metrics import BatchJaSPICE
 
 
 class JaSPICE:
-    def __init__(self, batch_size: int = 16, server_mode: bool = True) -> None:
+    def __init__(self, batch_size: int = 16, server_mode: bool = True, vectorized: bool = False, instrumented: bool = False) -> None:
         """
         Args:
             batch_size (int, optional): batch_size. Defaults to 16.
             server_mode (bool, optional): server mode. Defaults to True.
+            vectorized (bool, optional): vectorized batch matching (local mode only). Defaults to False.
+            instrumented (bool, optional): record per-stage latencies into `self.stats`. Defaults to False.
         """
         self.batch_size = batch_size
         self.server_mode = server_mode
+        self.vectorized = vectorized
+        self.instrumented = instrumented
+        self.stats: Dict = {}
 
     def compute_score(self, references: Dict[str, List[str]], candidates: Dict[str, List[str]]) -> Tuple[float, List[float]]:
         """
@@ -28,25 +34,32 @@ class JaSPICE:
         Returns:
             Tuple[float,List[float]]: JaSPICE scores
         """
-        if not self.server_mode:
-            bspice = BatchJaSPICE(size=self.batch_size)
+        # an instrumented call records into its own recorder; the recording block restores the previous one
+        recorder = instrument.Recorder(enabled=True) if self.instrumented else instrument.current()
+        with instrument.recording(recorder):
+            started = instrument.start()
+            if not self.server_mode:
+                bspice = BatchJaSPICE(size=self.batch_size, vectorized=self.vectorized)
 
-        spice, N = [], len(candidates.items())
-        batch_cand, batch_refs = [], []
-        for i, (k, v) in enumerate(tqdm(candidates.items())):
-            candidate = v[0].replace(" ", "")
-            refs = list(map(lambda x: x.replace(" ", ""), references[k]))
-            batch_cand.append(candidate)
-            batch_refs.append(refs)
-            if (i + 1) % self.batch_size == 0 or i == N - 1:
-                if self.server_mode:
-                    results = self._compute_via_server(batch_refs, batch_cand)
-                else:
-                    results = bspice(batch_candidate=batch_cand,
-                                     batch_references=batch_refs)
-                spice.extend(results)
-                batch_cand, batch_refs = [], []
+            spice, N = [], len(candidates.items())
+            batch_cand, batch_refs = [], []
+            for i, (k, v) in enumerate(tqdm(candidates.items())):
+                candidate = v[0].replace(" ", "")
+                refs = list(map(lambda x: x.replace(" ", ""), references[k]))
+                batch_cand.append(candidate)
+                batch_refs.append(refs)
+                if (i + 1) % self.batch_size == 0 or i == N - 1:
+                    if self.server_mode:
+                        results = self._compute_via_server(batch_refs, batch_cand)
+                    else:
+                        results = bspice(batch_candidate=batch_cand,
+                                         batch_references=batch_refs)
+                    spice.extend(results)
+                    batch_cand, batch_refs = [], []
+            instrument.stop("compute_score", started, items=N)
 
+        if self.instrumented:
+            self.stats = recorder.summary()  # per-stage summary, aggregated over workers
         return float(np.mean(spice)), spice
 
     def _compute_via_server(self, references: List[List[str]], candidates: List[str]) -> List[float]:
@@ -61,8 +74,13 @@ class JaSPICE:
             List[float]: JaSPICE scores
         """
         data = {"references": references, "candidates": candidates}
+        if self.instrumented:
+            data["instrument"] = True
         response = requests.post('http://localhost:2115', json=data)
         jaspice = json.loads(response.text)
+        if isinstance(jaspice, dict):
+            instrument.current().merge(jaspice["instrument"])
+            return jaspice["scores"]
         return jaspice
 
 
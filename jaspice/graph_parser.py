@@ -1,23 +1,158 @@
-import heapq
+import json
 from dataclasses import dataclass
-from typing import Any, List, Optional
-from jaspice.lang_parser import LangParser, ParsedLang
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+from jaspice import instrument
+from jaspice.lang_parser import LangParser, ParsedLang, _LangParser
+from jaspice.parse_cache import LRUCache, TupleCache
 
 DEBUG = False
 ZEROP = "[PHI]"
+GRAPH_VERSION = "1"  # bump when graph construction changes, to invalidate cached tuples
+OBJECT, ATTRIBUTE, RELATION = 0, 1, 2
+UNASSIGNED = -1
+KINDS = {"object": OBJECT, "attribute": ATTRIBUTE, "relation": RELATION}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+MAX_WORDS = 1 << 20  # interned words kept before the vocabulary is reset at a checkpoint
 
 
-@dataclass
+class Vocab:
+    """
+    Vocab interns words to integer ids.
+    Ids are only meaningful within the process that interned them.
+
+    The vocabulary grows with every distinct word seen, so `checkpoint` resets it once it holds more than
+    `max_words`, keeping the pinned words, and bumps `generation` for the caches of word ids to drop theirs.
+    """
+
+    def __init__(self, max_words: int = MAX_WORDS) -> None:
+        self.words: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.max_words = max_words
+        self.pinned = 0  # words interned before `pin`, which keep their ids across resets
+        self.generation = 0
+
+    def intern(self, word: str) -> int:
+        """
+        Get the id of a word, assigning a new one if needed.
+
+        Args:
+        word (str): word to be interned.
+
+        Returns:
+        int: id of the word.
+        """
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.ids[word] = word_id
+            self.words.append(word)
+        return word_id
+
+    def word(self, word_id: int) -> str:
+        """
+        Get the word of an id.
+
+        Args:
+        word_id (int): id of the word.
+
+        Returns:
+        str: the word.
+        """
+        return self.words[word_id]
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def pin(self):
+        """
+        Keep the ids of all words interned so far across resets, e.g. those of module-level tuples.
+        """
+        self.pinned = len(self.words)
+
+    def checkpoint(self) -> bool:
+        """
+        Reset the vocabulary if it holds more than `max_words`.
+        Call it only where no ids of unpinned words are held outside of generation-checked caches,
+        e.g. at the start of scoring a batch.
+
+        Returns:
+        bool: whether the vocabulary was reset.
+        """
+        if len(self.words) <= self.max_words:
+            return False
+        del self.words[self.pinned:]
+        self.ids = {word: word_id for word_id, word in enumerate(self.words)}
+        self.generation += 1
+        return True
+
+
+VOCAB = Vocab()
+
+
+class SceneTuple(NamedTuple):
+    """
+    SceneTuple represents an object, attribute or relation tuple as interned word ids.
+    """
+    kind: int  # OBJECT, ATTRIBUTE or RELATION
+    ids: Tuple[int, ...]
+
+    @classmethod
+    def from_words(cls, kind: int, words: Tuple[str, ...]) -> "SceneTuple":
+        """
+        Intern the words of an object (1 word), attribute (2 words) or relation (3 words) tuple.
+
+        Raises:
+            ValueError: if the number of words does not match the kind
+        """
+        if len(words) != kind + 1 or kind not in KIND_NAMES:
+            raise ValueError(f"a {KIND_NAMES.get(kind, kind)} tuple cannot have {len(words)} words: {words}")
+        return cls(kind, tuple(VOCAB.intern(word) for word in words))
+
+    @classmethod
+    def from_string(cls, text: str) -> "SceneTuple":
+        """
+        Convert a "_"-joined tuple string (the legacy representation) to a SceneTuple.
+
+        Raises:
+            ValueError: if the string splits into more than 3 words (use `from_words` for words containing "_")
+        """
+        words = tuple(text.split("_"))
+        if len(words) > 3:
+            raise ValueError(f"ambiguous tuple string of {len(words)} words: {text}")
+        return cls.from_words(len(words) - 1, words)
+
+    @property
+    def words(self) -> Tuple[str, ...]:
+        return tuple(VOCAB.words[i] for i in self.ids)
+
+    def __str__(self) -> str:
+        return "_".join(self.words)
+
+    def __reduce__(self):
+        # re-intern on unpickling, since word ids differ between processes
+        return (SceneTuple.from_words, (self.kind, self.words))
+
+
+ZEROP_TUPLE = SceneTuple.from_words(OBJECT, (ZEROP,))
+VOCAB.pin()
+
+
+@dataclass(frozen=True)
 class SceneNode:
     """
-    SceneNode represents a node in a SceneGraph.
+    SceneNode is a read-only view of a node in a SceneGraph.
     """
     text: str
     word: str
     pos: str
-    kind: str  # "object", "attribute", "relation"
+    kind_code: int  # OBJECT, ATTRIBUTE, RELATION or UNASSIGNED before build
     id: int
 
+    @property
+    def kind(self) -> str:
+        """"object", "attribute", "relation" or "" before build"""
+        return KIND_NAMES.get(self.kind_code, "")
+
 
 @dataclass
 class BunsetuToken:
@@ -35,6 +170,10 @@ class BunsetuToken:
 class SceneGraph:
     """
     Scene Graph is a directed acyclic graph that represents relationships between objects, attributes, and actions in a scene.
+
+    Nodes are integer ids into per-node arrays (text, word, pos, kind code), looked up by text through `node_map`.
+    Edges are appended to per-node lists while the graph is built, and read from CSR arrays
+    (offsets and targets of the out- and in-edges of every node) once it is built.
     """
 
     def __init__(self, zero_pronoun=True):
@@ -44,14 +183,32 @@ class SceneGraph:
         Args:
         zero_pronoun (bool): whether to consider zero pronouns in the graph or not. Default is True.
         """
-        self.edges = {}  # edges[src] = dst
-        self.inv_edges = {}
-        self.nodes = []
-        self.raw_nodes = []
-        self.node_map = {}
-        self.edge_set = set()
+        self.texts: List[str] = []
+        self.words: List[str] = []
+        self.pos: List[str] = []
+        self.nouns: List[bool] = []  # pos == "NP"
+        self.kinds: List[int] = []
+        self.node_map: Dict[str, List[int]] = {}  # text -> ids, the first one is the node shared by add_node
+        self.edges: List[List[int]] = []  # edges[src] = dsts
+        self.inv_edges: List[List[int]] = []  # inv_edges[dst] = srcs
+        self.edge_set: Set[Tuple[int, int]] = set()
+        self.csr: Optional[Tuple[List[int], List[int], List[int], List[int]]] = None
+        self.node_views: Optional[Tuple[SceneNode, ...]] = None  # built by `nodes`, dropped when a node changes
         self.has_build = False
         self.consider_zerop = zero_pronoun
+        self.failed = False
+
+    @property
+    def nodes(self) -> Tuple[SceneNode, ...]:
+        """
+        Nodes of the graph.
+
+        Returns:
+        Tuple[SceneNode, ...]: read-only nodes in id order.
+        """
+        if self.node_views is None:
+            self.node_views = tuple(SceneNode(*node, i) for i, node in enumerate(zip(self.texts, self.words, self.pos, self.kinds)))
+        return self.node_views
 
     def add_node(self, text: str, lemma: str, pos: str, unique=False) -> int:
         """
@@ -66,15 +223,27 @@ class SceneGraph:
         Returns:
         int: the index of the node in the graph.
         """
-        if not unique and text in self.raw_nodes:
-            return self.raw_nodes.index(text)
+        ids = self.node_map.get(text)
+        if not unique and ids:
+            return ids[0]
 
-        idx = len(self.nodes)
-        self.nodes.append(SceneNode(text, lemma, pos, "", idx))
-        self.raw_nodes.append(text)
+        idx = self._append_node(text, lemma, pos, UNASSIGNED)
+        if ids is None:
+            self.node_map[text] = [idx]
+        else:
+            ids.append(idx)
+        return idx
 
-        self.node_map.setdefault(text, [])
-        self.node_map[text].append(idx)
+    def _append_node(self, text: str, lemma: str, pos: str, kind: int) -> int:
+        idx = len(self.texts)
+        self.texts.append(text)
+        self.words.append(lemma)
+        self.pos.append(pos)
+        self.nouns.append(pos == "NP")
+        self.kinds.append(kind)
+        self.edges.append([])
+        self.inv_edges.append([])
+        self.node_views = None
         return idx
 
     def add_edge(self, src_id: int, dst_id: int):
@@ -90,11 +259,10 @@ class SceneGraph:
         if (src_id, dst_id) in self.edge_set:
             return
 
-        self.edges.setdefault(src_id, [])
-        self.inv_edges.setdefault(dst_id, [])
         self.edges[src_id].append(dst_id)
         self.inv_edges[dst_id].append(src_id)
         self.edge_set.add((src_id, dst_id))
+        self.csr = None
 
     def build(self):
         """
@@ -108,55 +276,62 @@ class SceneGraph:
             self._complement_zerop()
 
         self.has_build = True
+        self._compact()
+
+    def _compact(self) -> Tuple[List[int], List[int], List[int], List[int]]:
+        """
+        Lay out the edges as CSR arrays, in insertion order.
+
+        Returns:
+        Tuple[List[int], List[int], List[int], List[int]]: out-edge offsets and targets, in-edge offsets and sources.
+        """
+        if self.csr is None:
+            out_offsets: List[int] = [0]
+            in_offsets: List[int] = [0]
+            out_targets: List[int] = []
+            in_sources: List[int] = []
+            for dsts, srcs in zip(self.edges, self.inv_edges):
+                out_targets.extend(dsts)
+                out_offsets.append(len(out_targets))
+                in_sources.extend(srcs)
+                in_offsets.append(len(in_sources))
+            self.csr = (out_offsets, out_targets, in_offsets, in_sources)
+        return self.csr
 
     def _complement_zerop(self):
         """
         Complement the SceneGraph with zero pronouns.
         """
-        for node_id in range(len(self.nodes)):
-            self.edges.setdefault(node_id, [])
-            self.inv_edges.setdefault(node_id, [])
-            if self.nodes[node_id].kind != "relation":
-                continue
-            if len(self.inv_edges[node_id]) == 0:
-                L = len(self.nodes)
-                self.inv_edges[node_id].append(L)
-                self.nodes.append(SceneNode(ZEROP, ZEROP, ZEROP, "object", L))
-                self.edges[L] = [node_id]
+        for node_id in range(len(self.texts)):
+            if self.kinds[node_id] == RELATION and len(self.inv_edges[node_id]) == 0:
+                self.add_edge(self._append_node(ZEROP, ZEROP, ZEROP, OBJECT), node_id)
 
     def _assign_node_kind(self):
         """
         Assign the kind of each node in the graph.
         """
-        for node_id in range(len(self.nodes)):
-            self.edges.setdefault(node_id, [])
-            self.inv_edges.setdefault(node_id, [])
-            o_deg = len(self.edges[node_id])
-            if self.nodes[node_id].pos == "NP":
-                self.nodes[node_id].kind = "object"
-            else:
-                self.nodes[node_id].kind = "attribute" if o_deg == 0 else "relation"
+        self.kinds = [OBJECT if noun else RELATION if dsts else ATTRIBUTE for noun, dsts in zip(self.nouns, self.edges)]
+        self.node_views = None
 
     def _complement_nsubj(self):
         """
         Complement the SceneGraph with subject information.
         (find this; node (relation) -> obj_node <- rel_node <- nsubj)
         """
-
-        for node_id in range(len(self.nodes)):
-            node = self.nodes[node_id]
-            i_deg = len(self.inv_edges[node_id])
-            if node.kind == "relation" and i_deg == 0:
-                for obj_node_id in self.edges[node_id]:
-                    if self.nodes[obj_node_id].pos != "NP" or node_id not in self.inv_edges:
+        kinds, nouns = self.kinds, self.nouns
+        for node_id in range(len(self.texts)):
+            if kinds[node_id] != RELATION or len(self.inv_edges[node_id]) > 0:
+                continue
+            for obj_node_id in self.edges[node_id]:
+                if not nouns[obj_node_id]:
+                    continue
+                for rel_node_id in self.inv_edges[obj_node_id]:
+                    if kinds[rel_node_id] != RELATION or self.texts[rel_node_id] == "の":
                         continue
-                    for rel_node_id in self.inv_edges[obj_node_id]:
-                        if self.nodes[rel_node_id].kind != "relation" or self.nodes[rel_node_id].text == "の":
-                            continue
-                        nsubj = self.get_nsubj_node(self.nodes[rel_node_id].text)
-                        if nsubj != -1:
-                            self.add_edge(nsubj, node.id)
-                            break
+                    nsubj = self.get_nsubj_node(self.texts[rel_node_id])
+                    if nsubj != -1:
+                        self.add_edge(nsubj, node_id)
+                        break
 
     def search_nodes(self, text: str) -> List[int]:
         """
@@ -168,14 +343,12 @@ class SceneGraph:
         Returns:
         List[int]: A list of node IDs that match the text.
         """
-        if text not in self.node_map:
-            return []
-
-        return self.node_map[text]
+        return self.node_map.get(text, [])
 
     def get_nsubj_node(self, text: str, allow_direct: bool = True) -> int:
         """
-        Get the subject node for the given text.
+        Get the subject node for the given text: the nearest noun node upstream of the node of the text,
+        the lowest id among the nearest.
 
         Args:
         text (str): The text to search for the subject node.
@@ -184,35 +357,29 @@ class SceneGraph:
         Returns:
         int: The ID of the subject node or -1 if not found.
         """
-        nodes = self.search_nodes(text)
-        if len(nodes) == 0:
+        nodes = self.node_map.get(text)
+        if not nodes:
             return -1
 
+        # breadth-first search over in-edges, one distance at a time
         node_id = nodes[0]
-        if node_id not in self.inv_edges:
-            return -1
-
-        INF = 1 << 20
-        stack = [(0, node_id, False)]
-        dists = [INF if i != node_id else 0 for i in range(len(self.nodes))]
-        cand = (INF, -1)
-        heapq.heapify(stack)
-        while len(stack) > 0:
-            dist, current, is_noun = heapq.heappop(stack)
-            if is_noun and cand[0] > dist:
-                if not allow_direct and dist <= 1:
-                    pass
-                else:
-                    cand = (dist, current)
-
-            if current not in self.inv_edges:
-                continue
-            for i in self.inv_edges[current]:
-                if dists[i] > dist + 1:
-                    heapq.heappush(stack, (dist + 1, i, self.nodes[i].pos == "NP"))
-                    dists[i] = dist + 1
-
-        return cand[-1]
+        visited = {node_id}
+        frontier = [node_id]
+        dist = 0
+        while len(frontier) > 0:
+            dist += 1
+            upstream = []
+            for current in frontier:
+                for i in self.inv_edges[current]:
+                    if i not in visited:
+                        visited.add(i)
+                        upstream.append(i)
+            if allow_direct or dist > 1:
+                cand = [i for i in upstream if self.nouns[i]]
+                if len(cand) > 0:
+                    return min(cand)
+            frontier = upstream
+        return -1
 
     def get_connected_noun_nodes(self, target_id: int, direction: str = "in") -> int:
         """
@@ -228,8 +395,7 @@ class SceneGraph:
         assert direction == "in" or direction == "out", "invalid direction"
         ref_table = self.edges if direction == "out" else self.inv_edges
         for node_id in ref_table[target_id]:
-            node = self.nodes[node_id]
-            if node.pos == "NP":
+            if self.nouns[node_id]:
                 return node_id
         return -1
 
@@ -248,6 +414,10 @@ class SceneGraph:
             return False
 
         nodes = [src, dst]
+        for node_id in nodes:
+            # fails like the former dict adjacency did for nodes without in-edges, so that graph tuples are unchanged
+            if not self.has_build and len(self.inv_edges[node_id]) == 0:
+                raise KeyError(node_id)
         inedge_nodes = [self.inv_edges[nodes[i]] for i in range(2)]
         for i in range(2):
             for inv_node_id in inedge_nodes[i]:
@@ -262,7 +432,7 @@ class SceneGraph:
         Returns:
         List[str]: A list of object nodes.
         """
-        return [node.word for node in self.nodes if node.kind == "object"]
+        return [str(t) for t in self.get_object_tuples()]
 
     def get_attribute(self) -> List[str]:
         """
@@ -271,18 +441,7 @@ class SceneGraph:
         Returns:
         List[str]: A list of nodes.
         """
-        res = []
-        for node_id in range(len(self.nodes)):
-            self.edges.setdefault(node_id, [])
-            if self.nodes[node_id].kind != "attribute":
-                continue
-
-            for dst_id in self.inv_edges[node_id]:
-                node1 = self.nodes[node_id]
-                node2 = self.nodes[dst_id]
-                atrr = f"{node1.word}_{node2.word}"
-                res.append(atrr)
-        return res
+        return [str(t) for t in self.get_attribute_tuples()]
 
     def get_relation(self) -> List[str]:
         """
@@ -291,21 +450,91 @@ class SceneGraph:
         Returns:
         List[str]: A list of nodes.
         """
-        res = []
-        for node_id in range(len(self.nodes)):
-            self.edges.setdefault(node_id, [])
-            self.inv_edges.setdefault(node_id, [])
-            if self.nodes[node_id].kind != "relation":
-                continue
+        return [str(t) for t in self.get_relation_tuples()]
+
+    def _word_ids(self) -> List[int]:
+        """
+        Intern the words of all nodes.
+
+        Returns:
+        List[int]: word id of each node.
+        """
+        return [VOCAB.intern(word) for word in self.words]
+
+    def _object_nodes(self) -> List[Tuple[int]]:
+        return [(node_id,) for node_id, kind in enumerate(self.kinds) if kind == OBJECT]
+
+    def _attribute_nodes(self) -> List[Tuple[int, int]]:
+        _, _, in_offsets, in_sources = self._compact()
+        res: List[Tuple[int, int]] = []
+        for node_id, kind in enumerate(self.kinds):
+            if kind == ATTRIBUTE:
+                for i in range(in_offsets[node_id], in_offsets[node_id + 1]):
+                    res.append((node_id, in_sources[i]))
+        return res
+
+    def _relation_nodes(self) -> List[Tuple[int, int, int]]:
+        out_offsets, out_targets, in_offsets, in_sources = self._compact()
+        res: List[Tuple[int, int, int]] = []
+        for node_id, kind in enumerate(self.kinds):
+            if kind == RELATION:
+                srcs = in_sources[in_offsets[node_id]:in_offsets[node_id + 1]]
+                for i in range(out_offsets[node_id], out_offsets[node_id + 1]):
+                    dst_id = out_targets[i]
+                    res.extend((src_id, node_id, dst_id) for src_id in srcs)
+        return res
+
+    def get_object_tuples(self, word_ids: Optional[List[int]] = None) -> List[SceneTuple]:
+        """
+        Get the object tuples in the graph.
+
+        Args:
+        word_ids (Optional[List[int]]): word id of each node. Defaults to None.
+
+        Returns:
+        List[SceneTuple]: A list of object tuples.
+        """
+        ids = word_ids or self._word_ids()
+        return [SceneTuple(OBJECT, (ids[node_id],)) for (node_id,) in self._object_nodes()]
+
+    def get_attribute_tuples(self, word_ids: Optional[List[int]] = None) -> List[SceneTuple]:
+        """
+        Get the attribute tuples in the graph.
 
-            for dst_id in self.edges[node_id]:
-                for src_id in self.inv_edges[node_id]:
-                    node1 = self.nodes[src_id]
-                    node2 = self.nodes[node_id]
-                    node3 = self.nodes[dst_id]
-                    # rel = (node1.word, node2.word, node3.word)
-                    rel = f"{node1.word}_{node2.word}_{node3.word}"
-                    res.append(rel)
+        Args:
+        word_ids (Optional[List[int]]): word id of each node. Defaults to None.
+
+        Returns:
+        List[SceneTuple]: A list of attribute tuples.
+        """
+        ids = word_ids or self._word_ids()
+        return [SceneTuple(ATTRIBUTE, (ids[node_id], ids[dst_id])) for node_id, dst_id in self._attribute_nodes()]
+
+    def get_relation_tuples(self, word_ids: Optional[List[int]] = None) -> List[SceneTuple]:
+        """
+        Get the relation tuples in the graph.
+
+        Args:
+        word_ids (Optional[List[int]]): word id of each node. Defaults to None.
+
+        Returns:
+        List[SceneTuple]: A list of relation tuples.
+        """
+        ids = word_ids or self._word_ids()
+        return [SceneTuple(RELATION, (ids[src_id], ids[node_id], ids[dst_id])) for src_id, node_id, dst_id in self._relation_nodes()]
+
+    def get_scene_tuples(self) -> List[SceneTuple]:
+        """
+        Get the graph tuple as interned SceneTuples.
+
+        Returns:
+        List[SceneTuple]: a graph tuple.
+        """
+        self.build()
+        ids = self._word_ids()
+        res = self.get_object_tuples(ids)
+        res.extend(self.get_attribute_tuples(ids))
+        res.extend(self.get_relation_tuples(ids))
         return res
 
     def get_graph_tuple(self) -> List[str]:
@@ -315,13 +544,12 @@ class SceneGraph:
         Returns:
         List[str]: a graph tuple.
         """
+        # joined from the node words directly, the same strings as those of get_scene_tuples
         self.build()
-        res = []
-        objs = self.get_objects()
-        attrs = self.get_attribute()
-        rels = self.get_relation()
-        for t in [objs, attrs, rels]:
-            res.extend(t)
+        words = self.words
+        res = [words[node_id] for (node_id,) in self._object_nodes()]
+        res.extend(f"{words[node_id]}_{words[dst_id]}" for node_id, dst_id in self._attribute_nodes())
+        res.extend(f"{words[src_id]}_{words[node_id]}_{words[dst_id]}" for src_id, node_id, dst_id in self._relation_nodes())
         return res
 
     def print(self, word: bool = True):
@@ -332,9 +560,10 @@ class SceneGraph:
         word (bool): A flag to print the word or text. Defaults to True.
         """
         self.build()
-        for src_id in range(len(self.nodes)):
+        nodes = self.nodes
+        for src_id in range(len(nodes)):
             for dst_id in self.edges[src_id]:
-                src, dst = self.nodes[src_id], self.nodes[dst_id]
+                src, dst = nodes[src_id], nodes[dst_id]
                 if word:
                     print(f"{src.word}({src.kind}) ----> {dst.word}({dst.kind})")
                 else:
@@ -356,24 +585,24 @@ class SceneGraph:
             return {n: (x + x_shift, y + y_shift) for n, (x, y) in pos.items()}
 
         self.build()
+        nodes = self.nodes
         dg = nx.DiGraph()
         obj, rel, attr = [], [], []
-        for src_id in range(len(self.nodes)):
-            src = self.nodes[src_id]
-            if src.kind == "relation":
+        for src_id in range(len(nodes)):
+            src = nodes[src_id]
+            if src.kind_code == RELATION:
                 rel.append(src_id)
-            elif src.kind == "attribute":
+            elif src.kind_code == ATTRIBUTE:
                 attr.append(src_id)
             else:
                 obj.append(src_id)
 
-        dg.add_nodes_from([idx for idx in range(len(self.nodes))])
-        for src_id in range(len(self.nodes)):
-            src = self.nodes[src_id]
+        dg.add_nodes_from([idx for idx in range(len(nodes))])
+        for src_id in range(len(nodes)):
             for dst_id in self.edges[src_id]:
                 dg.add_edge(src_id, dst_id)
 
-        labels = {idx: self.nodes[idx].word for idx in range(len(self.nodes))}
+        labels = {idx: nodes[idx].word for idx in range(len(nodes))}
         pos = nx.circular_layout(dg)
         pos_nodes = nudge(pos, 0, 0.15)
         options = {"edgecolors": "tab:gray", "alpha": 0.9}
@@ -396,16 +625,16 @@ class SceneGraph:
 
         dg = Digraph(format='png')
         dg.attr('node', shape='circle', fontname='IPA ゴシック')
-        for src_id in range(len(self.nodes)):
-            src = self.nodes[src_id]
+        for src_id in range(len(nodes)):
+            src = nodes[src_id]
             color = "#ffaeb9"
-            if src.kind == "relation":
+            if src.kind_code == RELATION:
                 color = "#bfefff"
-            elif src.kind == "attribute":
+            elif src.kind_code == ATTRIBUTE:
                 color = "#a8dda8"
             dg.node(str(src_id), src.word.replace(ZEROP, "φ"), style='filled', fillcolor=color, fontcolor='black')
             for dst_id in self.edges[src_id]:
-                if src.kind != self.nodes[dst_id].kind:
+                if src.kind_code != nodes[dst_id].kind_code:
                     dg.edge(str(src_id), str(dst_id))
         dg.view()
 
@@ -415,20 +644,29 @@ class JaSceneGraphParser:
     Scene graph parser for Japanese language.
     """
 
-    def __init__(self, lparser: Optional[LangParser] = None, verbose: bool = False) -> None:
+    def __init__(self, lparser: Optional[_LangParser] = None, verbose: bool = False, cache_tuples: bool = True) -> None:
         """
         Initializes a new instance of JaSceneGraphParser.
 
         Args:
-            lparser (Optional[LangParser], optional): The language parser instance. Defaults to None.
+            lparser (Optional[_LangParser], optional): The language parser instance. Defaults to None.
             verbose (bool, optional): Whether to enable verbose output. Defaults to False.
+            cache_tuples (bool, optional): Whether to cache graph tuples next to the parse cache. Defaults to True.
         """
         self.ja_parser = lparser or LangParser(verbose=verbose)
         self.verbose = verbose
+        parse_cache = getattr(self.ja_parser, "cache", None)
+        # shares the size cap of the parse cache, whose eviction covers both tables of the file
+        self.tuple_cache = TupleCache(GRAPH_VERSION, parse_cache.path, parse_cache.fingerprint, max_bytes=parse_cache.max_bytes,
+                                      policy=parse_cache.policy) if cache_tuples and parse_cache is not None else None
+        # hottest tuple lists, sized by their encoded form
+        self.memory = LRUCache()
+        self.vocab_generation = VOCAB.generation  # of the tuples in memory
         # self.loc_table = ["上", "下", "前", "後ろ", "右", "左", "中", "外", "隣", "近く", "間", "上部", "下部"]
         self.loc_table = ["上", "下", "前", "後ろ", "右", "左", "中", "外", "隣", "近く", "間", "上部", "下部", "右下", "右上", "左下", "左上"]
         self.attr_categories = ["動物-部位", "植物-部位", "場所-施設部位", "形・模様", "色", "数量", "時間"]
 
+    @instrument.timed("graph")
     def _parse(self, graph: SceneGraph, lparsed: ParsedLang):
         """
         Parse the scene graph.
@@ -450,40 +688,41 @@ class JaSceneGraphParser:
         des, timeframe = [], []
         # 述語項構造情報
         for (tag, cargs) in lparsed.case_args:
+            text = tag.text  # parsed sentences are shared through the parser's memory, so never modify them
             if "ヨリ" in [c.case for c in cargs]:
-                tag.text = f"ヨリ{tag.text}"
+                text = f"ヨリ{text}"
 
             for carg in cargs:
                 src, dst, mid = -1, -1, None
                 if carg.case[0] == "ガ":  # ガ or ガ２ or ...
                     src = graph.add_node(carg.arg, carg.arg, "NP")
-                    dst = graph.add_node(tag.text, tag.text, "OTHER")
+                    dst = graph.add_node(text, text, "OTHER")
                 elif carg.case == "ヲ":
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "ニ":
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "カラ":
                     # mid = graph.add_node("カラ", "カラ", "OTHER", unique=True)
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "ヨリ":
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "ト":
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "ヘ":
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "時間":
-                    timeframe.append((tag.text, carg.arg))
+                    timeframe.append((text, carg.arg))
                 elif carg.case == "外の関係":
-                    src = graph.add_node(tag.text, tag.text, "OTHER")
+                    src = graph.add_node(text, text, "OTHER")
                     dst = graph.add_node(carg.arg, carg.arg, "NP")
                 elif carg.case == "デ":
-                    des.append((tag.text, carg.arg))
+                    des.append((text, carg.arg))
                 else:
                     continue
 
@@ -496,15 +735,15 @@ class JaSceneGraphParser:
                     graph.add_edge(mid, dst)
 
         # 時間
-        for tag, arg in timeframe:
-            src = graph.get_nsubj_node(tag)
+        for text, arg in timeframe:
+            src = graph.get_nsubj_node(text)
             dst = graph.add_node(arg, arg, "ATTR")
             if src != -1 and dst != -1:
                 graph.add_edge(src, dst)
 
         # デ格
-        for tag, arg in des:
-            src = graph.add_node(tag, tag, "NP")
+        for text, arg in des:
+            src = graph.add_node(text, text, "NP")
             dst = graph.add_node(arg, arg, "OTHER")
             if src != -1 and dst != -1:
                 graph.add_edge(src, dst)
@@ -590,8 +829,76 @@ class JaSceneGraphParser:
             self._parse(graph, lparsed)
             return graph
         except BaseException:
+            graph.failed = True
             return graph
 
+    def run_many(self, texts: List[str]) -> List[SceneGraph]:
+        """
+        Run parser on many texts, sharing cache lookups and writes.
+
+        Args:
+            texts (List[str]): texts to be parsed.
+
+        Returns:
+            List[SceneGraph]: parsed scene graphs.
+        """
+        try:
+            lparsed_list = self.ja_parser.parse_many(texts)
+        except BaseException:
+            return [self.run(text) for text in texts]
+
+        graphs = []
+        for lparsed in lparsed_list:
+            graph = SceneGraph()
+            try:
+                self._parse(graph, lparsed)
+            except BaseException:
+                graph.failed = True
+            graphs.append(graph)
+        return graphs
+
+    def get_tuples_many(self, texts: List[str]) -> List[List[SceneTuple]]:
+        """
+        Get the graph tuples of many texts without zero pronoun objects.
+        Tuples of known texts are served from memory or the tuple cache without parsing.
+
+        Args:
+            texts (List[str]): texts to be parsed.
+
+        Returns:
+            List[List[SceneTuple]]: graph tuples of each text (shared, must not be modified).
+        """
+        if self.vocab_generation != VOCAB.generation:
+            self.memory.clear()
+            self.vocab_generation = VOCAB.generation
+        tuples: Dict[str, List[SceneTuple]] = {}
+        for text in dict.fromkeys(texts):
+            hit = self.memory.get(text)
+            if hit is not None:
+                tuples[text] = hit
+        unknown = [text for text in dict.fromkeys(texts) if text not in tuples]
+        cached = self.tuple_cache.get_many(unknown) if self.tuple_cache is not None else {}
+        for text, result in cached.items():
+            tuples[text] = self._decode_tuples(result)
+            self.memory.put(text, tuples[text], len(result.encode("utf-8")))
+        missing = [text for text in unknown if text not in tuples]
+        encoded = {}
+        for text, graph in zip(missing, self.run_many(missing)):
+            tuples[text] = [t for t in graph.get_scene_tuples() if t != ZEROP_TUPLE]
+            if not graph.failed:
+                encoded[text] = self._encode_tuples(tuples[text])
+                self.memory.put(text, tuples[text], len(encoded[text].encode("utf-8")))
+
+        if self.tuple_cache is not None and len(encoded) > 0:
+            self.tuple_cache.put_many(encoded)
+        return [tuples[text] for text in texts]
+
+    def _encode_tuples(self, tuples: List[SceneTuple]) -> str:
+        return json.dumps([[t.kind, t.words] for t in tuples], ensure_ascii=False)
+
+    def _decode_tuples(self, result: str) -> List[SceneTuple]:
+        return [SceneTuple.from_words(kind, tuple(words)) for kind, words in json.loads(result)]
+
 
 if __name__ == "__main__":
     text = "人通りの少なくなった道路で青いズボンを着た男の子がオレンジ色のヘルメットを被りスケートボードに乗っている"
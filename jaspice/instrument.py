@@ -0,0 +1,222 @@
+"""
+Opt-in per-stage latency instrumentation of the parse pipeline
+
+Stages: juman, knp (analyzer waits), cache (parse/tuple cache lookups and writes), result (parsing KNP output),
+graph (scene graph building), wordnet (synonym lookups) and matching.
+Enable with `enable()` or JASPICE_INSTRUMENT=1; while disabled, an instrumented call costs one flag check.
+Stages are recorded into the process-wide RECORDER, or into the recorder of the enclosing `recording` block
+of the calling thread, so that concurrent requests each get their own timings.
+"""
+import os
+import time
+import threading
+import functools
+import contextlib
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+BUCKETS = 40  # bucket i counts durations in [2^(i-1), 2^i) microseconds
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Recorder:
+    """
+    Per-process counters and log2 latency histograms of each stage. Snapshots are plain dicts,
+    so the ones of Ray workers or the callback server can be sent back and merged.
+    """
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages: Dict[str, Dict[str, Any]] = {}
+            self.counters: Dict[str, int] = {}
+
+    def _stage(self, stage: str) -> Dict[str, Any]:
+        if stage not in self.stages:
+            self.stages[stage] = {"count": 0, "items": 0, "total": 0., "max": 0., "buckets": [0] * BUCKETS}
+        return self.stages[stage]
+
+    def record(self, stage: str, seconds: float, items: int = 1):
+        with self.lock:
+            stats = self._stage(stage)
+            stats["count"] += 1
+            stats["items"] += items
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+            stats["buckets"][min(int(seconds * 1e6).bit_length(), BUCKETS - 1)] += 1
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"stages": {stage: dict(stats, buckets=list(stats["buckets"])) for stage, stats in self.stages.items()},
+                    "counters": dict(self.counters)}
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Snapshot and reset, so that long-lived workers report each batch once.
+
+        Returns:
+            Dict[str, Any]: snapshot
+        """
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Any]):
+        with self.lock:
+            for stage, other in snapshot["stages"].items():
+                stats = self._stage(stage)
+                for key in ["count", "items", "total"]:
+                    stats[key] += other[key]
+                stats["max"] = max(stats["max"], other["max"])
+                stats["buckets"] = [a + b for a, b in zip(stats["buckets"], other["buckets"])]
+            for name, n in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summary of the recorded stages
+
+        Returns:
+            Dict[str, Any]: calls, items, total/mean/max and approximate p50/p90/p99 (upper bucket bounds) in ms per stage, and counters
+        """
+        snapshot = self.snapshot()
+        stages = {}
+        for stage, stats in snapshot["stages"].items():
+            stages[stage] = {
+                "count": stats["count"],
+                "items": stats["items"],
+                "total_ms": stats["total"] * 1e3,
+                "mean_ms": stats["total"] / stats["count"] * 1e3,
+                "p50_ms": _percentile(stats["buckets"], 0.5, stats["max"]),
+                "p90_ms": _percentile(stats["buckets"], 0.9, stats["max"]),
+                "p99_ms": _percentile(stats["buckets"], 0.99, stats["max"]),
+                "max_ms": stats["max"] * 1e3,
+            }
+        return {"stages": stages, "counters": snapshot["counters"]}
+
+
+def _percentile(buckets: List[int], q: float, max_seconds: float) -> float:
+    rank = q * sum(buckets)
+    seen = 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if n and seen >= rank:
+            return min(2 ** i / 1e3, max_seconds * 1e3)
+    return max_seconds * 1e3
+
+
+RECORDER = Recorder(enabled=os.environ.get("JASPICE_INSTRUMENT", "") not in ["", "0"])
+_local = threading.local()
+
+
+def current() -> Recorder:
+    """
+    Recorder of the calling thread: the one of the enclosing `recording` block, or RECORDER.
+
+    Returns:
+        Recorder: recorder
+    """
+    return getattr(_local, "recorder", None) or RECORDER
+
+
+@contextlib.contextmanager
+def recording(recorder: Recorder) -> Iterator[Recorder]:
+    """
+    Record the stages of the calling thread into `recorder` within the block.
+
+    Args:
+        recorder (Recorder): recorder, e.g. a per-request Recorder(enabled=True)
+
+    Yields:
+        Recorder: recorder
+    """
+    previous = getattr(_local, "recorder", None)
+    _local.recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+def bind(func: F) -> F:
+    """
+    Bind a function to the recorder of the calling thread, for running it on another thread.
+
+    Args:
+        func (F): function
+
+    Returns:
+        F: function recording into the current recorder
+    """
+    recorder = current()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with recording(recorder):
+            return func(*args, **kwargs)
+    return wrapper  # type: ignore
+
+
+def enable(flag: bool = True):
+    current().enabled = flag
+
+
+def enabled() -> bool:
+    return current().enabled
+
+
+def start() -> float:
+    """
+    Start timing a stage inline; pair with `stop`.
+
+    Returns:
+        float: start time, or 0 while disabled
+    """
+    return time.perf_counter() if current().enabled else 0.
+
+
+def stop(stage: str, started: float, items: int = 1):
+    if started:
+        current().record(stage, time.perf_counter() - started, items)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """
+    Decorator recording the latency of every call as `stage`.
+
+    Args:
+        stage (str): stage name
+
+    Returns:
+        Callable[[F], F]: decorator
+    """
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = current()
+            if not recorder.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.record(stage, time.perf_counter() - started)
+        return wrapper  # type: ignore
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    recorder = current()
+    if recorder.enabled:
+        recorder.count(name, n)
+
+
+def summary() -> Dict[str, Any]:
+    return current().summary()
@@ -0,0 +1,258 @@
+"""
+asyncio client for KNP/JUMAN servers (`knp -S`, `juman -S`) with connection pools
+
+The client is standalone: it returns raw KNP outputs and ParsedLang objects, and does not go through
+the parse cache of the _LangParser backends.
+"""
+import re
+import asyncio
+from typing import List, Optional, Sequence, Tuple, Union
+from jaspice.knp_wrapper import AnalyzerError
+from jaspice.lang_parser import ParsedLang
+
+TIMEOUT = 60
+KNP_OPTION = b"RUN -tab -normal\n"
+JUMAN_OPTION = b"RUN -e2\n"
+
+
+class AsyncConnection:
+    """
+    Connection to a KNP or JUMAN server, opened lazily and serving one query at a time.
+    """
+    def __init__(self, host: str, port: int, option: Optional[bytes] = KNP_OPTION):
+        """
+        Args:
+            host (str): host name
+            port (int): port
+            option (Optional[bytes], optional): option sent after connecting. Defaults to KNP_OPTION.
+        """
+        self.host = host
+        self.port = port
+        self.option = option
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        if self.option is not None:
+            self.writer.write(self.option)
+            await self.writer.drain()
+            while b"OK" not in await self._readline():
+                pass
+
+    async def _readline(self) -> bytes:
+        line = await self.reader.readline()
+        if not line:
+            raise AnalyzerError(f"connection to {self.host}:{self.port} closed by the server")
+        return line
+
+    async def query(self, text: str, pattern: str = r"^EOS$") -> str:
+        """
+        Send a request and read the response up to the line matching `pattern`.
+
+        Args:
+            text (str): request
+            pattern (str, optional): pattern of the terminating line. Defaults to r"^EOS$".
+
+        Returns:
+            str: response lines without the terminating line
+        """
+        if self.writer is None:
+            await self.open()
+        self.writer.write((text.strip() + "\n").encode("utf-8"))
+        await self.writer.drain()
+        regex = re.compile(pattern)
+        result: List[str] = []
+        while True:
+            line = (await self._readline()).decode("utf-8").rstrip()
+            if regex.search(line):
+                return "".join(result)
+            result.append(line + "\n")
+
+    async def close(self):
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def detach(self):
+        """
+        Drop the streams of a previous event loop, which cannot be awaited from another one.
+        """
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            try:
+                writer.close()
+            except RuntimeError:  # the event loop is closed; the transport is released when collected
+                pass
+
+
+class AsyncProcess(AsyncConnection):
+    """
+    Local analyzer process (e.g. Juman++, which has no server mode) with the same interface as AsyncConnection.
+    """
+    def __init__(self, command: List[str]):
+        """
+        Args:
+            command (List[str]): command and options
+        """
+        super().__init__(command[0], 0, None)
+        self.command = command
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    async def open(self):
+        try:
+            self.process = await asyncio.create_subprocess_exec(*self.command, stdin=asyncio.subprocess.PIPE,
+                                                                stdout=asyncio.subprocess.PIPE)
+        except OSError as e:
+            raise AnalyzerError(f"cannot start {self.command[0]}: {e}") from e
+        self.reader, self.writer = self.process.stdout, self.process.stdin
+
+    async def close(self):
+        process, self.process = self.process, None
+        await super().close()
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    def detach(self):
+        process, self.process = self.process, None
+        super().detach()
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+            except (ProcessLookupError, RuntimeError):
+                pass
+
+
+class ConnectionPool:
+    """
+    Pool of connections, spread round-robin over several servers and reopened after failures.
+    The pool binds to the running event loop on first use and rebinds when used from another one
+    (e.g. a later `asyncio.run`), reopening its connections there.
+    """
+    def __init__(self, connections: Sequence[AsyncConnection], timeout: float = TIMEOUT, retries: int = 1):
+        """
+        Args:
+            connections (Sequence[AsyncConnection]): connections, opened lazily
+            timeout (float, optional): seconds to wait for a response. Defaults to TIMEOUT.
+            retries (int, optional): retries on a fresh connection after a failure. Defaults to 1.
+        """
+        self.connections = list(connections)
+        self.timeout = timeout
+        self.retries = retries
+        self.idle: Optional[asyncio.Queue] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None  # the loop that idle and the open streams belong to
+
+    def _bind(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            if self.loop is not None:
+                for connection in self.connections:
+                    connection.detach()
+            self.loop = loop
+            self.idle = asyncio.Queue()
+            for connection in self.connections:
+                self.idle.put_nowait(connection)
+        return self.idle
+
+    async def query(self, text: str, pattern: str = r"^EOS$") -> str:
+        idle = self._bind()
+        connection = await idle.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await asyncio.wait_for(connection.query(text, pattern), self.timeout)
+                except (OSError, asyncio.TimeoutError, AnalyzerError) as e:
+                    await connection.close()  # a half-read response would desynchronize the next query
+                    if attempt == self.retries:
+                        raise AnalyzerError(f"{connection.host}:{connection.port}: {e!r}") from e
+            raise AssertionError("unreachable")
+        finally:
+            idle.put_nowait(connection)
+
+    async def close(self):
+        if self.loop is not None and self.loop is not asyncio.get_running_loop():
+            for connection in self.connections:
+                connection.detach()
+        else:
+            for connection in self.connections:
+                await connection.close()
+        self.idle = None
+        self.loop = None
+
+
+Address = Tuple[str, int]
+
+
+class AsyncKNPClient:
+    """
+    asyncio KNP client keeping many parses in flight over pooled connections to one or more `knp -S` servers.
+    Morphological analysis runs on `juman -S` servers or, by default, local Juman++ processes.
+    """
+    def __init__(self, servers: Sequence[Union[Address, int]], connections: int = 8,
+                 juman_servers: Optional[Sequence[Union[Address, int]]] = None, juman_command: Sequence[str] = ("jumanpp",),
+                 juman_processes: int = 2, pattern: str = "EOS", timeout: float = TIMEOUT):
+        """
+        Args:
+            servers (Sequence[Union[Address, int]]): KNP servers as (host, port) or ports on localhost
+            connections (int, optional): connections per server. Defaults to 8.
+            juman_servers (Optional[Sequence[Union[Address, int]]], optional): JUMAN servers. Defaults to None.
+            juman_command (Sequence[str], optional): local morphological analyzer without JUMAN servers. Defaults to ("jumanpp",).
+            juman_processes (int, optional): number of local morphological analyzers. Defaults to 2.
+            pattern (str, optional): end of a KNP response. Defaults to "EOS".
+            timeout (float, optional): seconds to wait for each response. Defaults to TIMEOUT.
+        """
+        def addresses(servers):
+            return [("localhost", server) if isinstance(server, int) else server for server in servers]
+
+        self.pattern = pattern
+        self.knp = ConnectionPool([AsyncConnection(host, port, KNP_OPTION)
+                                   for _ in range(connections) for host, port in addresses(servers)], timeout)
+        if juman_servers:
+            juman: List[AsyncConnection] = [AsyncConnection(host, port, JUMAN_OPTION)
+                                            for _ in range(connections) for host, port in addresses(juman_servers)]
+        else:
+            juman = [AsyncProcess(list(juman_command)) for _ in range(juman_processes)]
+        self.juman = ConnectionPool(juman, timeout)
+
+    async def query(self, text: str) -> str:
+        """
+        Analyze a sentence with JUMAN/Juman++ and KNP.
+
+        Args:
+            text (str): sentence
+
+        Returns:
+            str: KNP output
+        """
+        juman_lines = await self.juman.query(text.replace("\n", ""))
+        return await self.knp.query("%s%s" % (juman_lines, self.pattern), r"^%s$" % self.pattern)
+
+    async def query_many(self, texts: List[str]) -> List[str]:
+        return list(await asyncio.gather(*[self.query(text) for text in texts]))
+
+    async def parse_many(self, texts: List[str]) -> List[ParsedLang]:
+        """
+        Parse many sentences concurrently, with as many in flight as there are pooled connections.
+
+        Args:
+            texts (List[str]): sentences
+
+        Returns:
+            List[ParsedLang]: parsed sentences
+        """
+        return [ParsedLang.from_tab(result, self.pattern) for result in await self.query_many(texts)]
+
+    async def close(self):
+        await self.knp.close()
+        await self.juman.close()
+
+    async def __aenter__(self) -> "AsyncKNPClient":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
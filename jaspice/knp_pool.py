@@ -0,0 +1,464 @@
+"""
+Supervised pool of persistent Juman++/KNP processes
+"""
+import os
+import re
+import time
+import queue
+import select
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from jaspice import instrument
+from jaspice.knp_wrapper import AnalyzerError, Socket, STARTUP_TIMEOUT
+
+PROBE = "テスト"  # readiness probe parsed by every freshly started worker
+TIMEOUT = 60
+JOIN_TIMEOUT = 5  # seconds to wait for the threads of a failed stream once its analyzers are closed
+
+
+class AnalyzerProcess:
+    """
+    Long-lived line-oriented analyzer process (Juman++ or KNP).
+    Reads are bounded by a deadline, so a hung child raises AnalyzerError instead of blocking forever.
+    """
+    def __init__(self, command: List[str], timeout: float = TIMEOUT):
+        """
+        Args:
+            command (List[str]): command and options
+            timeout (float, optional): seconds to wait for a response. Defaults to TIMEOUT.
+        """
+        self.command = command
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.buffer = b""
+
+    def __getstate__(self):
+        return {"command": self.command, "timeout": self.timeout, "process": None, "buffer": b""}
+
+    def start(self, timeout: float = STARTUP_TIMEOUT):
+        try:
+            self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        except OSError as e:
+            raise AnalyzerError(f"cannot start {self.command[0]}: {e}") from e
+        self.buffer = b""
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def send(self, text: str):
+        process = self.process
+        if process is None or process.poll() is not None:
+            raise AnalyzerError(f"{self.command[0]} is not running")
+        try:
+            process.stdin.write((text.strip() + "\n").encode("utf-8"))
+            process.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise AnalyzerError(f"{self.command[0]} exited with {process.poll()}") from e
+
+    def query(self, text: str, pattern: str, timeout: Optional[float] = None) -> str:
+        """
+        Send a sentence and read the response up to the line matching `pattern`.
+
+        Args:
+            text (str): input
+            pattern (str): pattern of the terminating line
+            timeout (Optional[float], optional): seconds to wait. Defaults to self.timeout.
+
+        Returns:
+            str: response lines without the terminating line
+        """
+        self.send(text)
+        return self.receive(pattern, timeout)
+
+    def receive(self, pattern: str, timeout: Optional[float] = None) -> str:
+        process = self.process
+        if process is None:
+            raise AnalyzerError(f"{self.command[0]} is not running")
+        regex = re.compile(pattern)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        fd = process.stdout.fileno()
+        result: List[str] = []
+        while True:
+            end = self.buffer.find(b"\n")
+            while end >= 0:
+                line = self.buffer[:end].decode("utf-8").rstrip()
+                self.buffer = self.buffer[end + 1:]
+                if regex.search(line):
+                    return "".join(result)
+                result.append(line + "\n")
+                end = self.buffer.find(b"\n")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise AnalyzerError(f"{self.command[0]} did not respond within {timeout or self.timeout}s")
+            if self.process is not process:  # closed meanwhile, fd may already belong to another file
+                raise AnalyzerError(f"{self.command[0]} was closed")
+            data = os.read(fd, 65536)
+            if not data:
+                raise AnalyzerError(f"{self.command[0]} exited with {process.wait()}")
+            self.buffer += data
+
+    def close(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+            process.wait(timeout=1)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
+class AnalyzerSocket:
+    """
+    Connection to a KNP server (`knp -S`). Connecting doubles as the readiness probe of the server.
+    """
+    def __init__(self, server: str, port: int, option: Optional[bytes] = b"RUN -tab -normal\n", timeout: float = TIMEOUT):
+        """
+        Args:
+            server (str): host name
+            port (int): port
+            option (Optional[bytes], optional): option sent after connecting. Defaults to b"RUN -tab -normal\\n".
+            timeout (float, optional): seconds to wait for a response. Defaults to TIMEOUT.
+        """
+        self.server = server
+        self.port = port
+        self.option = option
+        self.timeout = timeout
+        self.socket: Optional[Socket] = None
+
+    def __getstate__(self):
+        return {"server": self.server, "port": self.port, "option": self.option, "timeout": self.timeout, "socket": None}
+
+    def start(self, timeout: float = STARTUP_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self.socket = Socket(self.server, self.port, self.option, timeout=self.timeout)
+                return
+            except (OSError, AnalyzerError) as e:
+                if time.monotonic() > deadline:
+                    raise AnalyzerError(f"server on port {self.port} is not ready after {timeout}s") from e
+                time.sleep(0.05)
+
+    def alive(self) -> bool:
+        return self.socket is not None
+
+    def send(self, text: str):
+        if self.socket is None:
+            raise AnalyzerError(f"not connected to port {self.port}")
+        try:
+            self.socket.send(text)
+        except (OSError, AttributeError) as e:
+            raise AnalyzerError(f"server on port {self.port}: {e}") from e
+
+    def receive(self, pattern: str, timeout: Optional[float] = None) -> str:
+        if self.socket is None:
+            raise AnalyzerError(f"not connected to port {self.port}")
+        try:
+            self.socket.sock.settimeout(timeout or self.timeout)
+            return self.socket.receive()
+        except (OSError, AttributeError) as e:
+            raise AnalyzerError(f"server on port {self.port}: {e}") from e
+
+    def query(self, text: str, pattern: str, timeout: Optional[float] = None) -> str:
+        self.send(text)
+        return self.receive(pattern, timeout)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.sock.close()
+            self.socket.sock = None
+            self.socket = None
+
+
+class KNPWorker:
+    """
+    Juman++ and KNP analyzers chained like `KNP.parse`, restarted as a unit.
+    """
+    def __init__(self, juman, knp, juman_pattern: str = r"^EOS$", pattern: str = "EOS", probe: Optional[str] = PROBE,
+                 startup_timeout: float = STARTUP_TIMEOUT):
+        """
+        Args:
+            juman (AnalyzerProcess): morphological analyzer
+            knp (Union[AnalyzerProcess, AnalyzerSocket]): KNP
+            juman_pattern (str, optional): end of a Juman++ response. Defaults to r"^EOS$".
+            pattern (str, optional): end of a KNP response. Defaults to "EOS".
+            probe (Optional[str], optional): sentence parsed to check readiness, or None. Defaults to PROBE.
+            startup_timeout (float, optional): seconds to wait for the probe. Defaults to STARTUP_TIMEOUT.
+        """
+        self.juman = juman
+        self.knp = knp
+        self.juman_pattern = juman_pattern
+        self.pattern = pattern
+        self.probe = probe
+        self.startup_timeout = startup_timeout
+        self.queries = 0
+        self.threads: List[threading.Thread] = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["threads"] = []
+        return state
+
+    def start(self):
+        self.close()
+        if not self.join(JOIN_TIMEOUT):  # stale threads would read and write the restarted analyzers
+            raise AnalyzerError("threads of a failed stream are still running")
+        try:
+            self.juman.start(self.startup_timeout)
+            self.knp.start(self.startup_timeout)
+            if self.probe:
+                self.parse(self.probe, timeout=self.startup_timeout)
+        except AnalyzerError:
+            self.close()
+            raise
+        self.queries = 0
+
+    def alive(self) -> bool:
+        return self.juman.alive() and self.knp.alive()
+
+    def parse(self, text: str, timeout: Optional[float] = None) -> str:
+        started = instrument.start()
+        juman_lines = self.juman.query(text.replace("\n", ""), self.juman_pattern, timeout)
+        instrument.stop("juman", started)
+        started = instrument.start()
+        result = self.knp.query("%s%s" % (juman_lines, self.pattern), r"^%s$" % self.pattern, timeout)
+        instrument.stop("knp", started)
+        self.queries += 1
+        return result
+
+    def parse_many(self, texts: List[str], timeout: Optional[float] = None) -> List[str]:
+        """
+        Stream sentences through both analyzers back to back and split the responses on EOS,
+        so that Juman++ analyzes sentence n+1 while KNP parses sentence n.
+
+        Args:
+            texts (List[str]): sentences
+            timeout (Optional[float], optional): seconds to wait for each response. Defaults to the stage timeouts.
+
+        Returns:
+            List[str]: KNP outputs
+        """
+        errors: List[Exception] = []
+
+        def feed():
+            try:
+                for text in texts:
+                    self.juman.send(text.replace("\n", ""))
+            except (AnalyzerError, OSError, ValueError) as e:  # OSError/ValueError: closed by a failing reader
+                errors.append(e)
+
+        def relay():
+            try:
+                for _ in texts:
+                    started = instrument.start()
+                    juman_lines = self.juman.receive(self.juman_pattern, timeout)
+                    instrument.stop("juman", started)  # time waited for each response of the pipeline
+                    self.knp.send("%s%s" % (juman_lines, self.pattern))
+            except (AnalyzerError, OSError, ValueError) as e:
+                errors.append(e)
+
+        # threads keep every pipe drained, so neither analyzer blocks on a full pipe
+        self.threads = [threading.Thread(target=instrument.bind(feed), daemon=True), threading.Thread(target=instrument.bind(relay), daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        results = []
+        try:
+            for _ in texts:
+                started = instrument.start()
+                results.append(self.knp.receive(r"^%s$" % self.pattern, timeout))
+                instrument.stop("knp", started)
+        except AnalyzerError as e:
+            self.close()  # unblocks the threads with EOF or a broken pipe
+            self.join(JOIN_TIMEOUT)
+            raise (errors[0] if errors and isinstance(errors[0], AnalyzerError) else e)
+        self.join()
+        self.queries += len(texts)
+        return results
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the threads of the last `parse_many`.
+
+        Args:
+            timeout (Optional[float], optional): seconds to wait in total. Defaults to None (no limit).
+
+        Returns:
+            bool: whether all threads have exited
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0., deadline - time.monotonic()))
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        return not self.threads
+
+    def close(self):
+        self.juman.close()
+        self.knp.close()
+
+
+class KNPPool:
+    """
+    Pool of supervised KNP workers shared by LangParser instances.
+    Dead or hung workers are restarted on checkout, and workers are recycled after `max_queries` parses.
+    """
+    def __init__(self, workers: List[KNPWorker], max_queries: Optional[int] = None, retries: int = 1, verbose: bool = False):
+        """
+        Args:
+            workers (List[KNPWorker]): workers, started lazily
+            max_queries (Optional[int], optional): restart a worker after this many parses. Defaults to None.
+            retries (int, optional): retries on a fresh worker after a failure. Defaults to 1.
+            verbose (bool, optional): print restarts. Defaults to False.
+        """
+        self.workers = workers
+        self.max_queries = max_queries
+        self.retries = retries
+        self.verbose = verbose
+        self.counts = {"queries": 0, "failures": 0, "restarts": 0, "recycles": 0}
+        self._init_queue()
+
+    def _init_queue(self):
+        self.lock = threading.Lock()
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"], state["idle"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_queue()
+
+    @classmethod
+    def from_knp(cls, knp, size: int = 1, max_queries: Optional[int] = None, **kwargs) -> "KNPPool":
+        """
+        Pool running the commands and options of a KNP instance (subprocess or `knp -S` server).
+
+        Args:
+            knp (KNP): KNP instance
+            size (int, optional): number of workers. Defaults to 1.
+            max_queries (Optional[int], optional): restart a worker after this many parses. Defaults to None.
+
+        Returns:
+            KNPPool: pool
+        """
+        juman = knp.juman
+        juman_command = [juman.command] + juman.options + (["-r", juman.rcfile] if juman.rcfile else [])
+        knp_command = [knp.command] + knp.options + (["-r", knp.rcfile] if knp.rcfile else [])
+        timeout = getattr(knp.analyzer, "timeout", None) or TIMEOUT
+        server = getattr(knp.analyzer, "server", None)
+
+        def worker() -> KNPWorker:
+            stage = AnalyzerSocket(server, knp.analyzer.port, knp.analyzer.socket_option, timeout) if server is not None \
+                else AnalyzerProcess(knp_command, timeout)
+            return KNPWorker(AnalyzerProcess(juman_command, timeout), stage, juman.pattern, knp.pattern)
+
+        return cls([worker() for _ in range(size)], max_queries, **kwargs)
+
+    def _count(self, key: str, n: int = 1):
+        with self.lock:
+            self.counts[key] += n
+        instrument.count(f"pool.{key}", n)
+
+    def query(self, text: str) -> str:
+        """
+        Parse a sentence on an idle worker, restarting it if it is dead, hangs or crashes.
+
+        Args:
+            text (str): sentence
+
+        Returns:
+            str: KNP output
+        """
+        worker = self.idle.get()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    if not worker.alive():
+                        worker.start()
+                    result = worker.parse(text)
+                    break
+                except AnalyzerError as e:
+                    self._count("failures")
+                    self._count("restarts")  # a fresh worker is started on the next attempt or checkout
+                    worker.close()
+                    if self.verbose:
+                        print(f"KNP worker failed on {text!r}: {e}")
+                    if attempt == self.retries:
+                        raise
+            self._count("queries")
+            if self.max_queries and worker.queries >= self.max_queries:
+                worker.close()  # bound memory leaks of long-running analyzers
+                self._count("recycles")
+            return result
+        finally:
+            self.idle.put(worker)
+
+    def query_many(self, texts: List[str], chunk_size: int = 64) -> List[str]:
+        """
+        Parse many sentences, pipelining chunks of them through the idle workers in parallel.
+        A chunk whose worker fails is retried sentence by sentence on a fresh worker.
+
+        Args:
+            texts (List[str]): sentences
+            chunk_size (int, optional): sentences streamed to a worker at once. Defaults to 64.
+
+        Returns:
+            List[str]: KNP outputs
+        """
+        if not texts:
+            return []
+        size = max(1, min(chunk_size, -(-len(texts) // len(self.workers))))
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        if len(chunks) == 1:
+            return self._query_chunk(chunks[0])
+        with ThreadPoolExecutor(min(len(chunks), len(self.workers))) as executor:
+            return [result for results in executor.map(instrument.bind(self._query_chunk), chunks) for result in results]
+
+    def _query_chunk(self, texts: List[str]) -> List[str]:
+        worker = self.idle.get()
+        try:
+            if not worker.alive():
+                worker.start()
+            results = worker.parse_many(texts)
+        except AnalyzerError as e:
+            self._count("failures")
+            self._count("restarts")
+            worker.close()
+            if not worker.join(JOIN_TIMEOUT) and self.verbose:
+                print("KNP worker is not restarted until the threads of its failed chunk exit")
+            if self.verbose:
+                print(f"KNP worker failed on a chunk of {len(texts)} sentences: {e}")
+            results = None
+        else:
+            self._count("queries", len(texts))
+            if self.max_queries and worker.queries >= self.max_queries:
+                worker.close()
+                self._count("recycles")
+        finally:
+            self.idle.put(worker)
+        return results if results is not None else [self.query(text) for text in texts]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Statistics of the pool
+
+        Returns:
+            Dict[str, int]: queries, failures, restarts, recycles and live workers
+        """
+        with self.lock:
+            stats = dict(self.counts)
+        stats["alive"] = sum(worker.alive() for worker in self.workers)
+        return stats
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
@@ -1,11 +1,115 @@
 import subprocess
+import functools
+import hashlib
 import pexpect
+import time
 import re
 import socket
 from pyknp import KNP
 from pyknp import Juman
 from pyknp.utils.analyzer import Analyzer
-from pyknp.utils.process import Subprocess
+
+STARTUP_TIMEOUT = 30
+RECV_SIZE = 65536
+VERSION_PROBE = 'テスト てすと テスト 名詞 6 普通名詞 1 * 0 * 0 "代表表記:テスト/てすと"\nEOS'  # Juman output parsed by KNP servers
+
+
+class AnalyzerError(RuntimeError):
+    """Raised when an analyzer process or server dies, hangs or cannot be started"""
+
+
+@functools.lru_cache(maxsize=None)
+def command_version(command: str) -> str:
+    """
+    Version string printed by `command -v` (KNP, JUMAN and Juman++ all support it).
+
+    Args:
+        command (str): command
+
+    Returns:
+        str: version string or "unknown"
+    """
+    try:
+        proc = subprocess.run([command, "-v"], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=10)
+        return proc.stdout.decode("utf-8", errors="replace").strip()
+    except BaseException:
+        return "unknown"
+
+
+def server_version(server: str, port: int, option=None, timeout: float = 10) -> str:
+    """
+    Version of the KNP behind a `knp -S` server, read from the `KNP:` field in the header of a parsed probe.
+
+    Args:
+        server (str): host name
+        port (int): port
+        option (Optional[Union[str, bytes]], optional): option sent after connecting. Defaults to None.
+        timeout (float, optional): seconds to wait. Defaults to 10.
+
+    Returns:
+        str: version string or "" if the server is unreachable or its output has no version
+    """
+    try:
+        sock = Socket(server, port, option, timeout=timeout)
+        try:
+            response = sock.query(VERSION_PROBE, "EOS")
+        finally:
+            sock.sock.close()
+            sock.sock = None
+    except (OSError, AnalyzerError):
+        return ""
+    match = re.search(r"\bKNP:(\S+)", response)
+    return match.group(1) if match else ""
+
+
+def backend_fingerprint(knp) -> str:
+    """
+    Fingerprint of a KNP instance: commands, options and versions of KNP and its morphological analyzer.
+    The version of a server spawned by the instance (ServerKNP) is that of the local `knp`; other servers are asked
+    for theirs with a probe. A server whose version cannot be read is identified by its address instead,
+    so an upgrade behind the same address then goes unnoticed.
+
+    Args:
+        knp (KNP): KNP instance
+
+    Returns:
+        str: fingerprint
+    """
+    juman = knp.juman
+    server = getattr(knp.analyzer, "server", None)
+    socket_option = getattr(knp.analyzer, "socket_option", None) or ""
+    if isinstance(socket_option, bytes):
+        socket_option = socket_option.decode("utf-8")
+    if server is None or getattr(knp, "proc", None) is not None:
+        knp_version = command_version(knp.command)
+    else:
+        knp_version = server_version(server, knp.analyzer.port, socket_option or None) or f"{server}:{knp.analyzer.port}"
+    spec = [knp.command, " ".join(knp.options), knp.rcfile, socket_option.strip(), knp_version,
+            juman.command, " ".join(juman.options), juman.rcfile, command_version(juman.command)]
+    return hashlib.sha256("\t".join(spec).encode("utf-8")).hexdigest()[:16]
+
+
+def wait_for_server(server: str, port: int, timeout: float = STARTUP_TIMEOUT, proc=None):
+    """
+    Wait until a KNP/Juman++ server accepts connections.
+
+    Args:
+        server (str): host name
+        port (int): port
+        timeout (float, optional): seconds to wait. Defaults to STARTUP_TIMEOUT.
+        proc (Optional[subprocess.Popen], optional): server process, checked for an early exit. Defaults to None.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((server, port), timeout=1).close()
+            return
+        except OSError as e:
+            if proc is not None and proc.poll() is not None:
+                raise AnalyzerError(f"server on port {port} exited with {proc.returncode}") from e
+            if time.monotonic() > deadline:
+                raise AnalyzerError(f"server on port {port} is not ready after {timeout}s") from e
+            time.sleep(0.05)
 
 
 class ServerKNP(KNP):
@@ -23,20 +127,18 @@ class ServerKNP(KNP):
                  jumanpp=True,
                  multithreading=False,
                  ):
+        # pyknp's socket analyzer only records the server: the KNP pool opens the connections
         super().__init__(command, server, port, timeout, option, rcfile, pattern, jumancommand, jumanrcfile, jumanoption, jumanpp, multithreading)
         self._open_server(port)
-        self.analyzer = SocketAnalyzer(backend='socket', timeout=timeout, server=server, port=port,
-                                       socket_option=b'RUN -tab -normal\n')
 
     def _open_server(self, knp_port):
         try:
             proc = subprocess.Popen(f"knp -tab -S -N {knp_port}".split(" "))
-            import time
-            time.sleep(1)
         except BaseException:
             proc = None
 
         self.proc = proc
+        wait_for_server("localhost", knp_port, proc=proc)
 
     def __del__(self):
         if self.proc is not None:
@@ -58,11 +160,8 @@ class PexpectKNP(KNP):
                  jumanoption='',
                  jumanpp=True,
                  multithreading=False):
+        # the KNP pool runs the commands of pyknp's (lazy) analyzers; no process is started here
         super().__init__(command, server, port, timeout, option, rcfile, pattern, jumancommand, jumanrcfile, jumanoption, jumanpp, multithreading)
-        knp_command = self.analyzer.command
-        juman_command = self.juman.command
-        self.analyzer = _Analyzer(backend='subprocess', multithreading=multithreading, timeout=timeout, command=knp_command)
-        self.juman.analyzer = PexpectAnalyzer(backend='subprocess', multithreading=multithreading, timeout=timeout, command=juman_command)
 
 
 class ServerKNP2(KNP):
@@ -79,10 +178,8 @@ class ServerKNP2(KNP):
                  jumanoption='',
                  jumanpp=True,
                  multithreading=False):
+        # the KNP pool connects to the server recorded by pyknp's (lazy) socket analyzer
         super().__init__(command, server, port, timeout, option, rcfile, pattern, jumancommand, jumanrcfile, jumanoption, jumanpp, multithreading)
-        juman_command = self.juman.command
-        self.analyzer = SocketAnalyzer(backend='subprocess', server=server, port=port, timeout=timeout, socket_option="RUN -tab -normal")
-        self.juman.analyzer = PexpectAnalyzer(backend='subprocess', multithreading=multithreading, timeout=timeout, command=juman_command)
 
 
 class SocketAnalyzer(Analyzer):
@@ -105,40 +202,68 @@ class SocketAnalyzer(Analyzer):
 
 
 class Socket(object):
-    def __init__(self, hostname, port, option=None):
-        try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((hostname, port))
-        except BaseException:
-            raise
+    """
+    Blocking connection to a KNP/JUMAN server. Responses are framed on the EOS line while reading:
+    each byte is scanned once, each response is decoded once, and the read buffers are reused across queries.
+    """
+    def __init__(self, hostname, port, option=None, timeout=None):
+        self.sock = None
+        self.buffer = bytearray()
+        self.chunk = memoryview(bytearray(RECV_SIZE))
+        self.scanned = 0  # bytes of the buffer already searched for EOS
+        self.sock = socket.create_connection((hostname, port), timeout=timeout)
         if option is not None:
-            self.sock.send(option)
-        data = ""
-        while "OK" not in data:
-            data = self.sock.recv(1024)
-            data = str(data, 'utf-8')
+            if isinstance(option, str):
+                option = option.encode('utf-8')
+            self.sock.sendall(option if option.endswith(b'\n') else option + b'\n')
+            while True:
+                ok = self.buffer.find(b'OK')
+                end = self.buffer.find(b'\n', ok) if ok >= 0 else -1
+                if end >= 0:
+                    del self.buffer[:end + 1]
+                    break
+                self._fill()
 
     def __del__(self):
         if self.sock:
             self.sock.close()
 
-    def _decode(self, x):
-        try:
-            s = x.decode('utf-8')
-            return s
-        except BaseException:
-            return ""
+    def _fill(self):
+        n = self.sock.recv_into(self.chunk)
+        if not n:
+            raise AnalyzerError("connection closed by the server")
+        self.buffer += self.chunk[:n]
 
-    def query(self, sentence, pattern):
+    def _find_eos(self):
+        # end of the first EOS line, searching only bytes that can still complete one
+        start = self.scanned
+        while True:
+            i = self.buffer.find(b'EOS\n', start)
+            if i < 0:
+                self.scanned = max(len(self.buffer) - 3, 0)
+                return -1
+            if i == 0 or self.buffer[i - 1] == 0x0a:
+                return i + 4
+            start = i + 1
+
+    def send(self, sentence):
         sentence = sentence.strip() + '\n'  # ensure sentence ends with '\n'
         self.sock.sendall(sentence.encode('utf-8'))
-        data = self.sock.recv(1024)
-        recv = data
-        pattern = "EOS\n$"
-        while not re.search(pattern, self._decode(recv)):
-            data = self.sock.recv(1024)
-            recv = recv + data
-        return recv.strip().decode('utf-8')
+
+    def receive(self):
+        # responses to pipelined sentences can share a read; the rest is kept for the next call
+        end = self._find_eos()
+        while end < 0:
+            self._fill()
+            end = self._find_eos()
+        response = self.buffer[:end].decode('utf-8')
+        del self.buffer[:end]
+        self.scanned = 0
+        return response.strip()
+
+    def query(self, sentence, pattern):
+        self.send(sentence)
+        return self.receive()
 
 
 class PexpectAnalyzer(Analyzer):
@@ -166,50 +291,11 @@ class PexpectAnalyzer(Analyzer):
         buffer, line = "", ""
         while True:
             line = self.subprocess.readline()
+            if not line:
+                raise AnalyzerError(f"{self.command} exited")
             if re.match(pattern, line.strip()):
                 break
             if line.strip() != input_str:
                 buffer += line.rstrip() + "\n"
 
         return buffer
-
-
-class _Analyzer(Analyzer):
-    def __init__(self,
-                 backend,
-                 multithreading=False,
-                 server=None,
-                 port=None,
-                 socket_option=None,
-                 command=None,
-                 timeout=180,
-                 ):
-        super().__init__(backend, multithreading, server, port, socket_option, command, timeout)
-        self.subprocess = _Subprocess(self.command, timeout=self.timeout)
-
-    def query(self, input_str, pattern):
-        assert self.subprocess
-        res = super().query(input_str, pattern)
-        return res
-
-
-class _Subprocess(Subprocess):
-    def __init__(self, command, timeout=180):
-        super().__init__(command, timeout)
-
-    def query(self, sentence, pattern):
-        sentence = sentence.strip() + '\n'  # ensure sentence ends with '\n'
-        result = ''
-        try:
-            self.process.stdin.write(sentence.encode('utf-8'))
-            self.process.stdin.flush()
-            while True:
-                line = self.process.stdout.readline().decode('utf-8').rstrip()
-                if re.search(pattern, line):
-                    break
-                result += line + '\n'
-        except BaseException:
-            pass
-
-        self.process.stdout.flush()
-        return result
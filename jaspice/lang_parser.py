@@ -1,37 +1,92 @@
-import sqlite3
-import hashlib
 import re
+from types import MappingProxyType
 from dataclasses import dataclass
-from typing import Any, List, Tuple
-from pyknp import KNP
-from jaspice.knp_wrapper import ServerKNP, PexpectKNP, ServerKNP2
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from pyknp import KNP, BList
+from pyknp.knp.features import Features
+from jaspice import instrument
+from jaspice.knp_wrapper import ServerKNP, PexpectKNP, ServerKNP2, backend_fingerprint
+from jaspice.knp_pool import KNPPool
+from jaspice.parse_cache import LRUCache, ParseCache, DB_PATH, MEMORY_BYTES, MEMORY_ENTRIES
 
 subcategory_pattern = re.compile(r'.*カテゴリ:([^\s]+).*')
 wiki_pattern = re.compile(r'.*Wikipediaエントリ:([^\s]+):.*')
+# as read by pyknp
+repname_pattern = re.compile(r"代表表記:([^\"\s]+)")
+bnst_pattern = re.compile(r'\* (-?\d+)([DPIA])(.*)$')
+tag_pattern = re.compile(r'\+ (-?\d+)(\w)(.*)$')
+cfid_pattern = r'(.*?):([^:/]+?)'
+# retained size of a ParsedLang per byte of its KNP output, as measured with tracemalloc
+PARSED_SIZE_RATIO = 4
+case_arg_patterns = {"CASE": r'(.+?/[CNODEU-]/.+?(?:/(?:-|\d+)){2}/[^;/]+)', "PASv42": r'(.+?/[CNODEU-]/.+?(?:/(?:-?\d*)){3})'}
+
+
+SUBCATEGORIES = ("人", "組織・団体", "動物", "植物", "動物-部位", "植物-部位", "人工物-食べ物", "人工物-衣類", "人工物-乗り物", "人工物-金銭", "人工物-その他", "自然物", "場所-施設", "場所-施設部位", "場所-自然", "場所-機能", "場所-その他", "抽象物", "形・模様", "色", "数量", "時間")
+SUBCATEGORY_BITS = MappingProxyType({sub: 1 << i for i, sub in enumerate(SUBCATEGORIES)})
+
+
+def subcategory_mask(subcategories: Iterable[str]) -> int:
+    """
+    Bitmask of KNP categories (unknown ones are ignored)
+
+    Args:
+        subcategories (Iterable[str]): categories
+
+    Returns:
+        int: bitmask over SUBCATEGORIES
+    """
+    mask = 0
+    for sub in subcategories:
+        mask |= SUBCATEGORY_BITS.get(sub, 0)
+    return mask
+
+
+def get_subcategories(imis: str) -> List[str]:
+    matched = subcategory_pattern.match(imis)
+    if not matched:
+        return []
+
+    sub = matched.group(1)
+    return sub.split(';')
 
 
 class LinguisticUnit:
-    def __init__(self) -> None:
-        self.phrase_table = {"<用言:動>": "VP", "<用言:形>": "AD", "<体言>": "NP"}
-        self.subcategories = ["人", "組織・団体", "動物", "植物", "動物-部位", "植物-部位", "人工物-食べ物", "人工物-衣類", "人工物-乗り物", "人工物-金銭", "人工物-その他", "自然物", "場所-施設", "場所-施設部位", "場所-自然", "場所-機能", "場所-その他", "抽象物", "形・模様", "色", "数量", "時間"]
+    __slots__ = ()
+    # shared read-only tables
+    phrase_table = MappingProxyType({"<用言:動>": "VP", "<用言:形>": "AD", "<体言>": "NP"})
+    subcategories: Any = SUBCATEGORIES
 
     def is_suffix(self, text):
         return "接尾辞" in text
 
 
 class Bnst(LinguisticUnit):
-    def __init__(self, knp_bnst) -> None:
-        super().__init__()
-        knp_mrphs = knp_bnst.mrph_list()
-        knp_parent = knp_bnst.parent
-        morphemes = [Morpheme(mrph) for mrph in knp_mrphs]
-        kind = self.get_kind(knp_bnst.fstring)
+    __slots__ = ("morphemes", "parent_id", "parent", "text", "raw_text", "kind", "subcategory_mask")
+
+    def __init__(self, knp_bnst, morphemes=None) -> None:
+        if morphemes is None:
+            morphemes = [Morpheme(mrph) for mrph in knp_bnst.mrph_list()]
+        self._init(knp_bnst.parent_id, knp_bnst.fstring, morphemes)
+
+    @classmethod
+    def from_fields(cls, parent_id: int, fstring: str, morphemes: List["Morpheme"]) -> "Bnst":
+        bnst = cls.__new__(cls)
+        bnst._init(parent_id, fstring, morphemes)
+        return bnst
+
+    def _init(self, parent_id, fstring, morphemes):
+        kind = self.get_kind(fstring)
 
         self.morphemes = morphemes
-        self.parent = Bnst(knp_parent) if knp_parent is not None else None
+        # linked to the shared parent Bnst by ParsedLang
+        self.parent_id = parent_id
+        self.parent: Optional[Bnst] = None
         self.text = ''.join([mrph.repname for mrph in morphemes if not self.is_suffix(mrph.category)])
         self.raw_text = ''.join([mrph.morpheme for mrph in morphemes])
         self.kind = kind
+        self.subcategory_mask = 0
+        for mrph in morphemes:
+            self.subcategory_mask |= mrph.subcategory_mask
 
     def get_kind(self, knp_fstring):
         for k, v in self.phrase_table.items():
@@ -41,33 +96,37 @@ class Bnst(LinguisticUnit):
         return None
 
     def have_subcategory_mrph(self, subcategories):
-        matched = [mrph for mrph in self.morphemes for sub in mrph.subcategories if sub in subcategories]
-        return len(matched) > 0
+        mask = subcategories if isinstance(subcategories, int) else subcategory_mask(subcategories)
+        return self.subcategory_mask & mask != 0
 
 
 class Morpheme(LinguisticUnit):
+    __slots__ = ("morpheme", "pronounce", "category", "repname", "subcategory_mask")
+
     def __init__(self, knp_mrph) -> None:
-        super().__init__()
-        base = knp_mrph.genkei
-        category = knp_mrph.bunrui
-        subcategories = self._get_subcategories(knp_mrph)
-        repname = self.get_repname(knp_mrph)
+        self._init(knp_mrph.genkei, knp_mrph.bunrui, self._get_subcategories(knp_mrph), self.get_repname(knp_mrph))
+
+    @classmethod
+    def from_fields(cls, base: str, category: str, subcategories: List[str], repname: str) -> "Morpheme":
+        mrph = cls.__new__(cls)
+        mrph._init(base, category, subcategories, repname)
+        return mrph
+
+    def _init(self, base, category, subcategories, repname):
         spl = base.split('/')
 
         self.morpheme = spl[0] if len(spl) > 0 else None
         self.pronounce = spl[1] if len(spl) > 1 else None
         self.category = category
         self.repname = repname
-        self.subcategories = subcategories
+        self.subcategory_mask = subcategory_mask(subcategories)
 
-    def _get_subcategories(self, knp_mrph):
-        imis = knp_mrph.imis
-        matched = subcategory_pattern.match(imis)
-        if not matched:
-            return []
+    @property
+    def subcategories(self):
+        return [sub for sub in SUBCATEGORIES if self.subcategory_mask & SUBCATEGORY_BITS[sub]]
 
-        sub = matched.group(1)
-        return sub.split(';')
+    def _get_subcategories(self, knp_mrph):
+        return get_subcategories(knp_mrph.imis)
 
     def get_repname(self, knp_mrph):
         use_wiki_pattern = False
@@ -84,136 +143,368 @@ class Morpheme(LinguisticUnit):
 
 
 class Tag(LinguisticUnit):
-    def __init__(self, knp_tag) -> None:
-        super().__init__()
-        knp_mrphs = knp_tag.mrph_list()
-        morphemes = [Morpheme(mrph) for mrph in knp_mrphs]
+    __slots__ = ("arguments", "morphemes", "text")
+
+    def __init__(self, knp_tag, morphemes=None) -> None:
+        if morphemes is None:
+            morphemes = [Morpheme(mrph) for mrph in knp_tag.mrph_list()]
+        self._init(self.get_arguments(knp_tag.pas), morphemes)
+
+    @classmethod
+    def from_fields(cls, arguments: Optional[Tuple[Tuple[str, str, int], ...]], morphemes: List[Morpheme]) -> "Tag":
+        tag = cls.__new__(cls)
+        tag._init(arguments, morphemes)
+        return tag
+
+    def _init(self, arguments, morphemes):
         text = ''.join([mrph.repname for mrph in morphemes if not self.is_suffix(mrph.category)])
 
-        self.pas = knp_tag.pas
+        # (case, midasi, tid) of the predicate-argument structure, None if not a predicate
+        self.arguments = arguments
         self.morphemes = morphemes
         self.text = text
 
+    def get_arguments(self, knp_pas):
+        if knp_pas is None:
+            return None
+
+        return tuple((case, arg.midasi, arg.tid) for case, args in knp_pas.arguments.items() for arg in args)
+
 
 @dataclass
 class CaseArg:
+    __slots__ = ("tag", "case", "arg")
     tag: Any
     case: Any
     arg: Any
 
 
+def _parse_mrph(line: str) -> Optional[Morpheme]:
+    # fields 2 (genkei), 5 (bunrui) and 11 (imis) of a morpheme line; None if quoting needs pyknp's rules
+    if line.startswith(" ") or line.startswith("\\ "):
+        return None
+    parts = line.split(" ", 11)
+    if len(parts) < 12:
+        return None
+    fields = line[:len(line) - len(parts[11])]
+    if '"' in fields or "  " in fields:
+        return None
+
+    rest = parts[11]
+    if rest.startswith('"'):
+        end = rest.find('"', 1)
+        if end == -1 or rest.count('"', 0, rest.find("<") if "<" in rest else len(rest)) != 2 or rest[end + 1:end + 2] not in ("", " "):
+            return None
+        imis = rest[1:end]
+    else:
+        imis = rest.split(" ", 1)[0]
+
+    matched = repname_pattern.search(imis)
+    repname = matched.group(1).split('/')[0] if matched else ""
+    subcategories = get_subcategories(imis) if "カテゴリ:" in imis else []
+    return Morpheme.from_fields(parts[2], parts[5], subcategories, repname)
+
+
+def _parse_case_analysis(analysis: str, case_format: str) -> Optional[Tuple[Tuple[str, str, int], ...]]:
+    # arguments of <格解析結果:...> (CASE) or <述語項構造:...> (PASv42) as pyknp's Pas reads them
+    arg_pat = case_arg_patterns[case_format]
+    matched = re.match(r'{}(?::{}|$)'.format(cfid_pattern, arg_pat), analysis)
+    if matched is None:
+        return None  # pyknp reports it
+    if matched.group(3) is None:
+        return ()
+
+    arg_pat_compiled = re.compile(';' + arg_pat)
+    cases = [matched.group(3)]
+    pos = matched.end(3)
+    while True:
+        matched = arg_pat_compiled.match(analysis, pos=pos)
+        if matched is None:
+            break
+        cases.append(matched.group(1))
+        pos = matched.end(1)
+
+    # grouped by case in order of first appearance like Pas.arguments
+    grouped: Dict[str, List[Tuple[str, str, int]]] = {}
+    for case in cases:
+        items = case.split('/')
+        if items[1] == 'U' or items[1] == '-':
+            continue
+        if case_format == "CASE":
+            tid, _ = int(items[3]), int(items[4])
+        else:
+            _, tid, _ = int(items[3]), int(items[4]), int(items[5])
+        grouped.setdefault(items[0], []).append((items[0], items[2], tid))
+    return tuple(arg for args in grouped.values() for arg in args)
+
+
+def parse_tab(result: str, pattern: str = r'EOS') -> Optional[Tuple[List[Morpheme], List[Tag], List[Bnst]]]:
+    """
+    Streaming parser of KNP -tab output that extracts only the fields used by ParsedLang.
+    Outputs it does not handle exactly like pyknp's BList (quoted or blank surface forms,
+    KNP v4.1 anaphora, lattice formats, malformed lines) are left to pyknp.
+
+    Args:
+        result (str): KNP output
+        pattern (str, optional): end of sentence pattern. Defaults to r'EOS'.
+
+    Returns:
+        Optional[Tuple[List[Morpheme], List[Tag], List[Bnst]]]: morphemes, tags and bnsts (parents unlinked), or None to use pyknp
+    """
+    morhs: List[Morpheme] = []
+    tags: List[Tag] = []
+    bnsts: List[Bnst] = []
+    # pending (spec, morphemes) of the current bnst and tag
+    bnst: Optional[Tuple[int, str, List[Morpheme]]] = None
+    tag: Optional[Tuple[Optional[Tuple[Tuple[str, str, int], ...]], List[Morpheme]]] = None
+    end_pattern = re.compile(pattern)
+
+    try:
+        for line in result.split("\n"):
+            if line.strip() == "":
+                continue
+            head = line[0]
+            if head == "#":
+                if "KNP++" in line or line.startswith("#\t"):
+                    return None
+                continue
+            if end_pattern.match(line):
+                break
+            if head == "*" or head == "+":
+                matched = (bnst_pattern if head == "*" else tag_pattern).match(line.strip())
+                if matched is None:
+                    return None
+                if head == "*":
+                    if bnst is not None:
+                        bnsts.append(Bnst.from_fields(*bnst))
+                    if tag is not None:
+                        tags.append(Tag.from_fields(*tag))
+                        tag = None
+                    bnst = (int(matched.group(1)), matched.group(3).strip(), [])
+                    continue
+
+                if bnst is None:
+                    return None
+                if tag is not None:
+                    tags.append(Tag.from_fields(*tag))
+                fstring = matched.group(3).strip()
+                arguments = None
+                if "格解析結果" in fstring or "述語項構造" in fstring:
+                    features = Features(fstring)
+                    if "項構造" in features:
+                        return None
+                    if "述語項構造" in features:
+                        arguments = _parse_case_analysis(features["述語項構造"], "PASv42")
+                    elif "格解析結果" in features:
+                        arguments = _parse_case_analysis(features["格解析結果"], "CASE")
+                    if ("述語項構造" in features or "格解析結果" in features) and arguments is None:
+                        return None
+                tag = (arguments, [])
+                continue
+            if head == "!" or line.startswith(";;"):
+                return None
+
+            mrph = _parse_mrph(line)
+            if mrph is None or bnst is None:
+                return None
+            morhs.append(mrph)
+            bnst[2].append(mrph)
+            if tag is not None:
+                tag[1].append(mrph)
+    except ValueError:
+        return None
+
+    if bnst is not None:
+        bnsts.append(Bnst.from_fields(*bnst))
+    if tag is not None:
+        tags.append(Tag.from_fields(*tag))
+    return morhs, tags, bnsts
+
+
 class ParsedLang:
+    """
+    Views of a KNP result, each built on first access. The pyknp result is released
+    once tags, bnsts and case arguments have been extracted.
+    """
+
     def __init__(self, parsed, verbose=False) -> None:
-        knp_tags = parsed.tag_list()
-        knp_bnsts = parsed.bnst_list()
-        knp_morhs = parsed.mrph_list()
-        # morh < tag < bnst
-
-        self.tags = [Tag(tag) for tag in knp_tags]
-        self.bnsts = [Bnst(bnst) for bnst in knp_bnsts]
-        self.morhs = [Morpheme(morh) for morh in knp_morhs]
+        self.parsed = parsed
         self.verbose = verbose
-        self.case_args = self.get_case_args(knp_tags)
-
-    def get_case_args(self, knp_tags):
+        self._morhs: Optional[List[Morpheme]] = None
+        self._tags: Optional[List[Tag]] = None
+        self._bnsts: Optional[List[Bnst]] = None
+        self._case_args: Optional[List[Tuple[Tag, List[CaseArg]]]] = None
+
+    @classmethod
+    @instrument.timed("result")
+    def from_tab(cls, result: str, pattern: str = r'EOS', verbose: bool = False) -> "ParsedLang":
+        """
+        Build from KNP -tab output with the native parser, falling back to pyknp
+        for the outputs it does not handle.
+
+        Args:
+            result (str): KNP output
+            pattern (str, optional): end of sentence pattern. Defaults to r'EOS'.
+            verbose (bool, optional): print case arguments. Defaults to False.
+
+        Returns:
+            ParsedLang: parsed sentence
+        """
+        units = parse_tab(result, pattern)
+        if units is None:
+            return cls(BList(result, pattern), verbose=verbose)
+
+        lparsed = cls(None, verbose=verbose)
+        lparsed._morhs, lparsed._tags, bnsts = units
+        lparsed._bnsts = lparsed.link_bnsts(bnsts)
+        return lparsed
+
+    @property
+    def morhs(self) -> List[Morpheme]:
+        # morh < tag < bnst: morphemes are built once and shared by tags and bnsts
+        if self._morhs is None:
+            self._morhs = [Morpheme(morh) for morh in self.parsed.mrph_list()]
+        return self._morhs
+
+    @property
+    def tags(self) -> List[Tag]:
+        if self._tags is None:
+            morhs = self.morhs
+            self._tags = [Tag(tag, [morhs[morh.mrph_id] for morh in tag.mrph_list()]) for tag in self.parsed.tag_list()]
+            self._release()
+        return self._tags
+
+    @property
+    def bnsts(self) -> List[Bnst]:
+        if self._bnsts is None:
+            morhs = self.morhs
+            self._bnsts = self.link_bnsts([Bnst(bnst, [morhs[morh.mrph_id] for morh in bnst.mrph_list()]) for bnst in self.parsed.bnst_list()])
+            self._release()
+        return self._bnsts
+
+    @property
+    def case_args(self) -> List[Tuple[Tag, List[CaseArg]]]:
+        if self._case_args is None:
+            self._case_args = self.get_case_args()
+            self._release()
+        return self._case_args
+
+    def _release(self):
+        if self._tags is not None and self._bnsts is not None and self._case_args is not None:
+            self.parsed = None
+
+    def link_bnsts(self, bnsts):
+        # each Bnst is built once and its parent is a reference into the same list
+        for bnst in bnsts:
+            bnst.parent = bnsts[bnst.parent_id] if bnst.parent_id != -1 else None
+        return bnsts
+
+    def get_case_args(self):
         cargs = []
-        for i, knp_tag in enumerate(knp_tags):
-            if knp_tag.pas is None:
+        for tag in self.tags:
+            if tag.arguments is None:
                 continue
 
             _cargs = []
-            tag = self.tags[i]
             if self.verbose:
                 print(f"target: {tag.text}")
-            for case, args in knp_tag.pas.arguments.items():
-                for arg in args:
-                    if self.verbose:
-                        print('\t格: %s,  項: %s  (項の基本句ID: %d)' % (case, arg.midasi, arg.tid))
-                        print('\t', list(map(lambda x: x.text, self.tags)))
-
-                    carg = CaseArg(tag, case, self.tags[arg.tid].text)
-                    _cargs.append(carg)
+            for case, midasi, tid in tag.arguments:
+                if self.verbose:
+                    print('\t格: %s,  項: %s  (項の基本句ID: %d)' % (case, midasi, tid))
+                    print('\t', list(map(lambda x: x.text, self.tags)))
+
+                carg = CaseArg(tag, case, self.tags[tid].text)
+                _cargs.append(carg)
             cargs.append((tag, _cargs))
         return cargs
 
 
 class _LangParser:
-    def __init__(self, knp_instance, verbose=False) -> None:
+    def __init__(self, knp_instance, verbose=False, cache_path=DB_PATH, memory_entries=MEMORY_ENTRIES, memory_bytes=MEMORY_BYTES,
+                 cache_max_bytes=None, cache_policy="lru", pool: Optional[KNPPool] = None, pool_size=1, max_queries=None) -> None:
         self.knp = knp_instance
         self.verbose = verbose
-        db = self._connect_db()
-        self._create_table(db)
-        db.close()
+        self.cache = ParseCache(cache_path, fingerprint=backend_fingerprint(knp_instance), max_bytes=cache_max_bytes, policy=cache_policy)
+        # hottest ParsedLang objects, sized by the memory they retain
+        self.memory = LRUCache(memory_entries, memory_bytes)
+        # supervised Juman++/KNP processes; may be shared by several parsers
+        self.pool = pool or KNPPool.from_knp(knp_instance, size=pool_size, max_queries=max_queries, verbose=verbose)
 
     def __call__(self, text) -> ParsedLang:
-        db = self._connect_db()
-        cached = self._fetch_from_table(text, db)
-        if cached:
-            parsed = self.knp.result(cached)
-        else:
-            parsed = self.knp_parse(text, db)
+        lparsed = self.memory.get(text)
+        if lparsed is not None:
+            return lparsed
+
+        knp_lines = self.cache.get(text)
+        if not knp_lines:
+            knp_lines = self._knp_query(text)
+            self.cache.put(text, knp_lines)
+        return self._build(text, knp_lines)
+
+    def _build(self, text: str, knp_lines: str) -> ParsedLang:
+        lparsed = ParsedLang.from_tab(knp_lines, self.knp.pattern, verbose=self.verbose)
+        self.memory.put(text, lparsed, len(knp_lines.encode("utf-8")) * PARSED_SIZE_RATIO)
+        return lparsed
+
+    def parse_many(self, texts: List[str]) -> List[ParsedLang]:
+        """
+        Parse many sentences, serving hot ones from memory, fetching the other cached parses
+        with one query, pipelining the rest through the KNP pool and storing them in a single transaction.
+
+        Args:
+            texts (List[str]): sentences
+
+        Returns:
+            List[ParsedLang]: parsed sentences
+        """
+        lparsed: Dict[str, ParsedLang] = {}
+        for text in dict.fromkeys(texts):
+            hit = self.memory.get(text)
+            if hit is not None:
+                lparsed[text] = hit
+        missing = [text for text in dict.fromkeys(texts) if text not in lparsed]
+        results = self.cache.get_many(missing)
+        misses = [text for text in missing if not results.get(text)]
+        parsed = dict(zip(misses, self.pool.query_many(misses)))
+        self.cache.put_many(parsed)
+        results.update(parsed)
+        for text in missing:
+            lparsed[text] = self._build(text, results[text])
+        return [lparsed[text] for text in texts]
+
+    def knp_parse(self, text):
+        knp_lines = self._knp_query(text)
+        self.cache.put(text, knp_lines)
+        return self.knp.result(knp_lines)
 
-        db.close()
-        return ParsedLang(parsed, verbose=self.verbose)
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Statistics of the in-process and persistent parse caches
 
-    def knp_parse(self, text, db):
-        juman_lines = self.knp.juman.juman_lines(text)
-        juman_str = "%s%s" % (juman_lines, self.knp.pattern)
-        knp_lines = self.knp.analyzer.query(juman_str, pattern=r'^%s$' % self.knp.pattern)
-        self._save_to_table(text, knp_lines, db)
-        return self.knp.result(knp_lines)
+        Returns:
+            Dict[str, Dict[str, float]]: statistics of each tier
+        """
+        return {"memory": self.memory.stats, "disk": self.cache.stats()}
 
-    def _connect_db(self):
-        DEBUG = False
-        dbname = "parsed.db" if not DEBUG else ":memory:"
-        db = sqlite3.connect(dbname, check_same_thread=False)
-        return db
-
-    def _create_table(self, db):
-        cursor = db.cursor()
-        try:
-            cursor.execute('CREATE TABLE parsed(id STRING PRIMARY KEY, result STRING)')
-            db.commit()
-        except sqlite3.OperationalError:
-            pass
-        cursor.close()
-
-    def _save_to_table(self, text, parsed, db):
-        cursor = db.cursor()
-        key = self._hash(text)
-        cursor.execute(f"INSERT INTO parsed values('{key}','{parsed}')")
-        db.commit()
-        cursor.close()
-
-    def _fetch_from_table(self, text, db):
-        cursor = db.cursor()
-        key = self._hash(text)
-        cursor.execute(f"SELECT result FROM parsed WHERE id = '{key}'")
-        results = cursor.fetchall()
-        cursor.close()
-        fetched = results[0] if len(results) > 0 else [None]
-        return fetched[0] if len(fetched) > 0 else None
-
-    def _hash(self, text):
-        hex = hashlib.sha256(text.encode('UTF-8')).hexdigest()
-        return hex
+    def _knp_query(self, text) -> str:
+        return self.pool.query(text)
 
 
 class LangParser(_LangParser):
-    def __init__(self, verbose=False) -> None:
-        super().__init__(KNP(), verbose)
+    def __init__(self, verbose=False, **kwargs) -> None:
+        super().__init__(KNP(), verbose, **kwargs)
 
 
 class LangParserWithServer(_LangParser):
-    def __init__(self, port, verbose=False) -> None:
-        super().__init__(ServerKNP(port=port), verbose)
+    def __init__(self, port, verbose=False, **kwargs) -> None:
+        super().__init__(ServerKNP(port=port), verbose, **kwargs)
 
 
 class LangParserWithServer2(_LangParser):
-    def __init__(self, port, verbose=False) -> None:
-        super().__init__(ServerKNP2(port=port), verbose)
+    def __init__(self, port, verbose=False, **kwargs) -> None:
+        super().__init__(ServerKNP2(port=port), verbose, **kwargs)
 
 
 class LangParserWithPexpect(_LangParser):
-    def __init__(self, verbose=False) -> None:
-        super().__init__(PexpectKNP(), verbose)
+    def __init__(self, verbose=False, **kwargs) -> None:
+        super().__init__(PexpectKNP(), verbose, **kwargs)
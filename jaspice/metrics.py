@@ -1,21 +1,30 @@
 import ray
-import itertools
-from typing import List, Tuple, Set, Optional
-from jaspice.graph_parser import JaSceneGraphParser, SceneGraph, ZEROP
-from jaspice.lang_parser import LangParser
-from jaspice.wordnet import JaWordNet
+import numpy as np
+from typing import Callable, Dict, FrozenSet, List, Tuple, Set, Optional
+from jaspice import instrument
+from jaspice.graph_parser import JaSceneGraphParser, SceneTuple, VOCAB
+from jaspice.lang_parser import LangParser, _LangParser
+from jaspice.wordnet import JaWordNet, artifact_is_fresh, build_artifact
 
 
 class JaSPICE:
-    def __init__(self, lparser: Optional[LangParser] = None, verbose: bool = False):
+    def __init__(self, lparser: Optional[_LangParser] = None, verbose: bool = False):
         """
         Args:
-            lparser (Optional[LangParser], optional): LangParser. Defaults to None.
+            lparser (Optional[_LangParser], optional): LangParser. Defaults to None.
             verbose (bool, optional): verbose mode. Defaults to False.
         """
         self.parser = JaSceneGraphParser(lparser, verbose=verbose)
         self.verbose = verbose
         self.wordnet: Optional[JaWordNet] = None
+        self.synonym_sets: Dict[int, FrozenSet[int]] = {}
+        self.vocab_generation = VOCAB.generation  # of the word ids in synonym_sets
+
+    def __getstate__(self):
+        # word ids are interned per process, so workers rebuild their own synonym sets
+        state = self.__dict__.copy()
+        state["synonym_sets"] = {}
+        return state
 
     def __call__(self, references: List[str], candidate: str) -> float:
         """
@@ -27,11 +36,7 @@ class JaSPICE:
         Returns:
             float: JaSPICE
         """
-        targets = references + [candidate]
-        graphs = [self.parser.run(t) for t in targets]
-        cand_graph, ref_graphs = graphs[-1], graphs[:-1]
-
-        cand_tuple, ref_tuple = self._get_tuple_sets(cand_graph, ref_graphs)
+        cand_tuple, ref_tuple = self.get_tuple_sets(references, candidate)
         match = self._compute_matching(cand_tuple, ref_tuple)
         precision = match / len(cand_tuple) if len(cand_tuple) > 0 else 0.
         recall = match / len(ref_tuple) if len(ref_tuple) > 0 else 0.
@@ -45,71 +50,109 @@ class JaSPICE:
             print("JaSPICE:", F, "\n\n\n")
         return F
 
-    def _get_tuple_sets(self, cand_graph: SceneGraph, ref_graphs: List[SceneGraph]) -> Tuple[Set[str], Set[str]]:
+    def get_tuple_sets(self, references: List[str], candidate: str) -> Tuple[Set[SceneTuple], Set[SceneTuple]]:
         """
-        Convert scene graphs to tuple sets
+        Parse captions and convert them to tuple sets.
+        The vocabulary may be reset here, so tuple sets are only valid until the next call.
 
         Args:
-            cand_graph (SceneGraph): scene graph of candidate
-            ref_graphs (List[SceneGraph]): scene graph of references
+            references (List[str]): references
+            candidate (str): candidate
 
         Returns:
-            Tuple[Set[str],Set[str]]: tuple sets
+            Tuple[Set[SceneTuple],Set[SceneTuple]]: tuple sets of candidate and references
         """
-        ref_tuple = []
-        for graph in ref_graphs:
-            tp = graph.get_graph_tuple()
-            ref_tuple.extend(tp)
-
-        cand_tuple = cand_graph.get_graph_tuple()
-        cand_set = self._delete_zero_pronoun(set(cand_tuple))
-        ref_set = self._delete_zero_pronoun(set(ref_tuple))
+        VOCAB.checkpoint()
+        tuples = self.parser.get_tuples_many(references + [candidate])
+        cand_set = set(tuples[-1])
+        ref_set = set(t for tp in tuples[:-1] for t in tp)
         if self.verbose:
-            print(f"cand: {cand_set}\nref: {ref_set}")
+            print(f"cand: {set(map(str, cand_set))}\nref: {set(map(str, ref_set))}")
         return cand_set, ref_set
 
-    def _delete_zero_pronoun(self, tuple_set: Set[str]) -> Set[str]:
+    @instrument.timed("matching")
+    def _compute_matching(self, query_tuple: Set[SceneTuple], target_tuple: Set[SceneTuple]) -> float:
         """
-        delete zero pronouns
+        binary matching
+
+        Each slot of a query tuple is expanded to the ids of its word and synonyms, and the tuple matches
+        if the per-slot intersection over the target tuples of the same kind is not empty.
 
         Args:
-            tuple_set (Set[str]): tuple set
+            query_tuple (Set[SceneTuple]): query tuple
+            target_tuple (Set[SceneTuple]): target tuple
 
         Returns:
-            Set[str]: tuple set without zero pronouns
+            float: matching score
         """
-        if ZEROP in tuple_set:
-            tuple_set.remove(ZEROP)
-        return tuple_set
+        if self.vocab_generation != VOCAB.generation:
+            self.synonym_sets = {}
+            self.vocab_generation = VOCAB.generation
+        if len(query_tuple) > len(target_tuple):
+            query_tuple, target_tuple = target_tuple, query_tuple
 
-    def _compute_matching(self, query_tuple: Set[str], target_tuple: Set[str]) -> float:
+        target_index = self._index_tuples(target_tuple)
+        cnt = 0
+        for query in query_tuple:
+            slots = [self._get_synonym_ids(word_id) for word_id in query.ids]
+            if self._match_slots(slots, target_index.get(query.kind, [])):
+                cnt += 1
+
+        return float(cnt)
+
+    def _index_tuples(self, tuple_set: Set[SceneTuple]) -> Dict[int, List[Dict[int, Set[int]]]]:
         """
-        binary matching
+        Index tuples by kind and slot
 
         Args:
-            query_tuple (Set[str]): query tuple
-            target_tuple (Set[str]): target tuple
+            tuple_set (Set[SceneTuple]): tuple set
 
         Returns:
-            float: matching score
+            Dict[int, List[Dict[int, Set[int]]]]: index[kind][slot][word id] = ids of tuples having the word at the slot
         """
-        if len(query_tuple) > len(target_tuple):
-            query_tuple, target_tuple = target_tuple, query_tuple
+        index: Dict[int, List[Dict[int, Set[int]]]] = {}
+        for i, tp in enumerate(tuple_set):
+            slots = index.setdefault(tp.kind, [{} for _ in range(len(tp.ids))])
+            for slot, word_id in zip(slots, tp.ids):
+                slot.setdefault(word_id, set()).add(i)
+        return index
+
+    def _match_slots(self, slots: List[FrozenSet[int]], slot_index: List[Dict[int, Set[int]]]) -> bool:
+        """
+        Check whether some indexed tuple matches every slot
 
-        cnt = 0
-        for query in query_tuple:
-            dec = query.split("_")
-            tp = []
-            for i in range(len(dec)):
-                tp.append(self._get_synonyms(dec[i]) + [dec[i]])
+        Args:
+            slots (List[FrozenSet[int]]): acceptable word ids for each slot
+            slot_index (List[Dict[int, Set[int]]]): index of tuples of the same kind
 
-            for x in itertools.product(*tp):
-                cand = "_".join(list(x))
-                if cand in target_tuple:
-                    cnt += 1
-                    break
+        Returns:
+            bool: matched or not
+        """
+        if len(slot_index) == 0:
+            return False
+
+        candidates: Optional[Set[int]] = None
+        for word_ids, word_index in zip(slots, slot_index):
+            ids = set().union(*[word_index[word_id] for word_id in word_ids if word_id in word_index])
+            candidates = ids if candidates is None else candidates & ids
+            if len(candidates) == 0:
+                return False
+        return True
+
+    def _get_synonym_ids(self, word_id: int) -> FrozenSet[int]:
+        """
+        get the ids of a word and its synonyms
 
-        return float(cnt)
+        Args:
+            word_id (int): word id
+
+        Returns:
+            FrozenSet[int]: ids of the word and its synonyms
+        """
+        if word_id not in self.synonym_sets:
+            synonyms = self._get_synonyms(VOCAB.word(word_id))
+            self.synonym_sets[word_id] = frozenset([VOCAB.intern(word) for word in synonyms] + [word_id])
+        return self.synonym_sets[word_id]
 
     def _get_synonyms(self, query: str) -> List[str]:
         """
@@ -141,17 +184,173 @@ class JaSPICE:
         return F
 
 
+class BatchMatcher:
+    """
+    Vectorized matcher that scores the tuple sets of a whole batch with NumPy.
+
+    Tuples are encoded as integer matrices of word ids (one row per tuple, padded with -1),
+    and the synonym closure as a sorted array of (word id << 32 | synonym id) keys.
+    The scores are identical to JaSPICE._compute_matching.
+    """
+
+    MAX_SLOTS = 3
+
+    def __init__(self, wordnet: Optional[JaWordNet] = None) -> None:
+        """
+        Args:
+            wordnet (Optional[JaWordNet], optional): JaWordNet. Defaults to None.
+        """
+        self.wordnet = wordnet or JaWordNet()
+        self.closure_keys: Dict[int, np.ndarray] = {}
+        self.vocab_generation = VOCAB.generation  # of the word ids in closure_keys
+
+    @instrument.timed("matching")
+    def __call__(self, batch_cand_tuple: List[Set[SceneTuple]], batch_ref_tuple: List[Set[SceneTuple]]) -> List[float]:
+        """
+        compute JaSPICE scores
+
+        Args:
+            batch_cand_tuple (List[Set[SceneTuple]]): tuple sets of candidates
+            batch_ref_tuple (List[Set[SceneTuple]]): tuple sets of references
+
+        Returns:
+            List[float]: JaSPICE scores
+        """
+        _, _, _, F = self.compute(batch_cand_tuple, batch_ref_tuple)
+        return F.tolist()
+
+    def compute(self, batch_cand_tuple: List[Set[SceneTuple]], batch_ref_tuple: List[Set[SceneTuple]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        compute match counts, precision, recall and F for all items
+
+        Args:
+            batch_cand_tuple (List[Set[SceneTuple]]): tuple sets of candidates
+            batch_ref_tuple (List[Set[SceneTuple]]): tuple sets of references
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: match, precision, recall, F
+        """
+        assert len(batch_cand_tuple) == len(batch_ref_tuple)
+        if self.vocab_generation != VOCAB.generation:
+            self.closure_keys = {}
+            self.vocab_generation = VOCAB.generation
+        n_cand = np.array([len(t) for t in batch_cand_tuple], dtype=np.float64)
+        n_ref = np.array([len(t) for t in batch_ref_tuple], dtype=np.float64)
+
+        # the smaller set is the query, as in JaSPICE._compute_matching
+        queries, targets = [], []
+        for cand, ref in zip(batch_cand_tuple, batch_ref_tuple):
+            query, target = (ref, cand) if len(cand) > len(ref) else (cand, ref)
+            queries.append(query)
+            targets.append(target)
+
+        q_group, q_slots = self._encode(queries)
+        t_group, t_slots = self._encode(targets)
+        q_matched = self._match(q_group, q_slots, t_group, t_slots)
+        match = np.bincount(q_group[q_matched] // 3, minlength=len(queries)).astype(np.float64)
+
+        precision = np.divide(match, n_cand, out=np.zeros_like(match), where=n_cand > 0)
+        recall = np.divide(match, n_ref, out=np.zeros_like(match), where=n_ref > 0)
+        total = precision + recall
+        F = np.divide(2 * precision * recall, total, out=np.zeros_like(match), where=total != 0)
+        return match, precision, recall, F
+
+    def _encode(self, tuple_sets: List[Set[SceneTuple]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encode tuple sets as integer matrices
+
+        Args:
+            tuple_sets (List[Set[SceneTuple]]): tuple sets
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: group (item * 3 + kind) of each tuple, word ids of each slot (-1 for unused slots)
+        """
+        n = sum(len(t) for t in tuple_sets)
+        group = np.empty(n, dtype=np.int64)
+        slots = np.full((n, self.MAX_SLOTS), -1, dtype=np.int64)
+        row = 0
+        for item, tuple_set in enumerate(tuple_sets):
+            for tp in tuple_set:
+                group[row] = item * 3 + tp.kind
+                slots[row, :len(tp.ids)] = tp.ids
+                row += 1
+        return group, slots
+
+    def _match(self, q_group: np.ndarray, q_slots: np.ndarray, t_group: np.ndarray, t_slots: np.ndarray) -> np.ndarray:
+        """
+        Check for every query tuple whether some target tuple of the same item and kind matches every slot
+
+        Args:
+            q_group (np.ndarray): groups of query tuples
+            q_slots (np.ndarray): word ids of query tuples
+            t_group (np.ndarray): groups of target tuples
+            t_slots (np.ndarray): word ids of target tuples
+
+        Returns:
+            np.ndarray: matched or not for each query tuple
+        """
+        matched = np.zeros(len(q_group), dtype=bool)
+        if len(q_group) == 0 or len(t_group) == 0:
+            return matched
+
+        # enumerate all (query, target) pairs within the same group
+        n_groups = int(max(q_group.max(), t_group.max())) + 1
+        order = np.argsort(t_group, kind="stable")
+        t_count = np.bincount(t_group, minlength=n_groups)
+        t_start = np.cumsum(t_count) - t_count
+        pair_count = t_count[q_group]
+        pair_query = np.repeat(np.arange(len(q_group)), pair_count)
+        pair_offset = np.arange(len(pair_query)) - np.repeat(np.cumsum(pair_count) - pair_count, pair_count)
+        pair_target = order[t_start[q_group][pair_query] + pair_offset]
+
+        closure = self._closure(np.unique(q_slots[q_slots >= 0]))
+        ok = np.ones(len(pair_query), dtype=bool)
+        for s in range(self.MAX_SLOTS):
+            qs, ts = q_slots[pair_query, s], t_slots[pair_target, s]
+            keys = (qs << 32) | np.maximum(ts, 0)
+            pos = np.minimum(np.searchsorted(closure, keys), len(closure) - 1)
+            ok &= (qs < 0) | (closure[pos] == keys)
+
+        matched[pair_query[ok]] = True
+        return matched
+
+    def _closure(self, word_ids: np.ndarray) -> np.ndarray:
+        """
+        Sorted synonym closure keys (word id << 32 | synonym id) of the given words
+
+        Args:
+            word_ids (np.ndarray): word ids
+
+        Returns:
+            np.ndarray: sorted keys
+        """
+        keys = []
+        for word_id in word_ids.tolist():
+            if word_id not in self.closure_keys:
+                synonyms = [VOCAB.intern(word) for word in self.wordnet.get_synonyms(VOCAB.word(word_id))]
+                synonym_ids = np.array(synonyms + [word_id], dtype=np.int64)
+                self.closure_keys[word_id] = (word_id << 32) | synonym_ids
+            keys.append(self.closure_keys[word_id])
+        return np.unique(np.concatenate(keys))
+
+
 class BatchJaSPICE():
-    def __init__(self, size: int = 8, num_cpus: Optional[int] = None):
+    def __init__(self, size: int = 8, num_cpus: Optional[int] = None, vectorized: bool = False,
+                 lparser_factory: Optional[Callable[[], _LangParser]] = None):
         """
         Args:
             size (int, optional): batch size. Defaults to 8.
             num_cpus (Optional[int], optional): cpu size. Defaults to None.
+            vectorized (bool, optional): match the whole batch with BatchMatcher in this process. Defaults to False.
+            lparser_factory (Optional[Callable[[], _LangParser]], optional): builds the parser of each worker. Defaults to LangParser.
         """
         ray.init(num_cpus=num_cpus or size, ignore_reinit_error=True)
-        lparsers = [LangParser(verbose=False) for _ in range(size)]
+        if not artifact_is_fresh():
+            build_artifact()  # compiled once here, then memory-mapped by every worker
+        lparsers = [lparser_factory() if lparser_factory else LangParser(verbose=False) for _ in range(size)]
         self.jaspice = [JaSPICE(lparsers[i], verbose=False) for i in range(size)]
         self.jaspice_id = [ray.put(self.jaspice[i]) for i in range(size)]
+        self.matcher = BatchMatcher() if vectorized else None
         self.size = size
 
     def __call__(self, batch_references: List[List[str]], batch_candidate: List[str]) -> List[float]:
@@ -167,19 +366,35 @@ class BatchJaSPICE():
         """
         assert len(batch_references) == len(batch_candidate)
         assert len(batch_references) <= self.size
+        VOCAB.checkpoint()  # no tuples of this process are held between batches
+
+        # workers return the stage timings of their task, which are merged into this process
+        @ray.remote
+        def run(jaspice, references, candidate, instrumented):
+            instrument.enable(instrumented)
+            return jaspice(references, candidate), instrument.current().collect() if instrumented else None
 
         @ray.remote
-        def run(jaspice, references, candidate):
-            return jaspice(references, candidate)
+        def parse(jaspice, references, candidate, instrumented):
+            instrument.enable(instrumented)
+            return jaspice.get_tuple_sets(references, candidate), instrument.current().collect() if instrumented else None
+
+        remote = parse if self.matcher is not None else run
+        process = [remote.remote(self.jaspice_id[i], batch_references[i], batch_candidate[i], instrument.enabled())
+                   for i in range(len(batch_references))]
+        results = []
+        for result, snapshot in ray.get(process):
+            results.append(result)
+            if snapshot is not None:
+                instrument.current().merge(snapshot)
 
-        process = [run.remote(self.jaspice_id[i], batch_references[i], batch_candidate[i]) for i in range(len(batch_references))]
-        batch_results = ray.get(process)
-        # print(batch_results)
-        return batch_results
+        if self.matcher is not None:
+            return self.matcher([cand for cand, _ in results], [ref for _, ref in results])
+        # print(results)
+        return results
 
 
 if __name__ == "__main__":
-    import numpy as np
     from tqdm import tqdm
     cap = "赤い傘をさした人がベンチに座っている"
     ref = [
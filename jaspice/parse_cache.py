@@ -0,0 +1,762 @@
+"""
+Persistent cache of KNP parse results
+"""
+import os
+import glob
+import json
+import time
+import zlib
+import heapq
+import atexit
+import sqlite3
+import hashlib
+import weakref
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from jaspice import instrument
+
+DEBUG = False
+DB_PATH = "parsed.db" if not DEBUG else ":memory:"
+MAX_VARIABLES = 900  # below SQLITE_MAX_VARIABLE_NUMBER of old SQLite builds
+MEMORY_ENTRIES = 4096
+MEMORY_BYTES = 64 * 1024 * 1024
+TABLES = ["parsed", "tuples"]
+POLICIES = ["lru", "lfu"]
+EVICT_WATERMARK = 0.9  # evict down to this fraction of the max size
+MAX_PENDING_COMMITS = 16  # failed group commits kept for retry before their entries are dropped
+MANIFEST = "manifest.json"
+
+# entry formats (first byte of a stored value); legacy entries are uncompressed text
+FORMAT_ZLIB = 1
+# preset dictionary of frequent KNP -tab fragments (most frequent last, as zlib prefers)
+ZDICT = "".join([
+    "<rel type=\"", "<NE:", "<EID:", "<Wikipediaエントリ:", "<Wikipedia上位語:", "<否定表現>",
+    "<数量>", "<時間>", "<用言代表表記:", "<格解析結果:", "<述語項構造:", "<格要素-ガ:", "<格要素-ヲ:",
+    "<格要素-ニ:", "<格要素-デ:", "<係:連用>", "<係:連格>", "<係:ノ格>", "<係:ガ格>", "<係:ヲ格>",
+    "<係:ニ格>", "<係:デ格>", "<係:未格>", "<係:文末>", "<提題>", "<連体修飾>", "<連用要素>",
+    "<用言:形>", "<用言:判>", "<用言:動>", "<体言>", "<名詞項候補>", "<先行詞候補>", "<SM-主体>",
+    "<SM-人>", "<区切:0-0>", "<区切:0-4>", "<区切:0-5>", "<区切:3-5>", "<レベル:A>", "<レベル:B>",
+    "<レベル:B+>", "<レベル:C>", "<ID:〜が>", "<ID:〜を>", "<ID:〜に>", "<ID:〜の>", "<RID:",
+    "<節-区切>", "<節-主辞>", "<節-機能-", "<状態述語>", "<動態述語>", "<文頭>", "<文末>", "<句点>",
+    "<格助詞>", "<助詞>", "<付属>", "<活用語>", "<かな漢字>", "<ひらがな>", "<カタカナ>", "<漢字>",
+    "<表現文末>", "<タグ単位始>", "<文節始>", "<文節主辞>", "<自立>", "<内容語>", "<主辞代表表記:",
+    "<正規化代表表記:", "<代表表記:", "<カテゴリ:", "カテゴリ:人", "カテゴリ:場所-施設",
+    "カテゴリ:人工物-その他", " 特殊 1 句点 1 * 0 * 0 NIL ", " 助動詞 5 * 0 ", " 接尾辞 14 ",
+    " 形容詞 3 * 0 イ形容詞アウオ段 18 基本形 2 ", " 動詞 2 * 0 ", " 基本形 2 ", " タ形 10 ",
+    " 基本連用形 8 ", " 助詞 9 格助詞 1 * 0 * 0 NIL ", " 助詞 9 接続助詞 3 * 0 * 0 NIL ",
+    " 名詞 6 普通名詞 1 * 0 * 0 \"", "代表表記:", "\n+ ", "\n* ", "D <", "EOS\n", "# S-ID:1 KNP:4.20",
+]).encode("utf-8")
+
+_connections: Dict[Tuple[int, str], sqlite3.Connection] = {}
+_connections_lock = threading.Lock()
+_caches: "weakref.WeakSet[ParseCache]" = weakref.WeakSet()  # flushed on exit, without keeping them alive
+
+
+@atexit.register
+def _flush_caches():
+    for cache in list(_caches):
+        cache.flush()
+
+
+def get_connection(path: str = DB_PATH) -> sqlite3.Connection:
+    """
+    Get the long-lived connection of this process, opening it on first use.
+    Connections are keyed by pid so that forked or unpickled workers never share one.
+
+    Args:
+        path (str, optional): path to the cache database. Defaults to DB_PATH.
+
+    Returns:
+        sqlite3.Connection: connection
+    """
+    key = (os.getpid(), path)
+    with _connections_lock:
+        db = _connections.get(key)
+        if db is None:
+            db = sqlite3.connect(path, timeout=60, check_same_thread=False, cached_statements=256)
+            if path != ":memory:":
+                db.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+            db.execute("PRAGMA synchronous=NORMAL")  # fsync on checkpoints only
+            for table in TABLES:
+                db.execute(f"CREATE TABLE IF NOT EXISTS {table}(id STRING PRIMARY KEY, result STRING, atime REAL DEFAULT 0, hits INTEGER DEFAULT 0)")
+                columns = [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+                if "atime" not in columns:  # caches created before access tracking
+                    db.execute(f"ALTER TABLE {table} ADD COLUMN atime REAL DEFAULT 0")
+                    db.execute(f"ALTER TABLE {table} ADD COLUMN hits INTEGER DEFAULT 0")
+            db.commit()
+            _connections[key] = db
+    return db
+
+
+class LRUCache:
+    """
+    Bounded in-process LRU cache in front of the SQLite tiers.
+    The least recently used entries are evicted once either `max_entries` or `max_bytes` is exceeded,
+    where the size of an entry is given by the caller. Entries are not pickled.
+    """
+
+    def __init__(self, max_entries: int = MEMORY_ENTRIES, max_bytes: int = MEMORY_BYTES) -> None:
+        """
+        Args:
+            max_entries (int, optional): max number of entries (0 disables the cache). Defaults to MEMORY_ENTRIES.
+            max_bytes (int, optional): max total size of entries. Defaults to MEMORY_BYTES.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._init_entries()
+
+    def _init_entries(self):
+        self.entries: OrderedDict = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["entries"], state["nbytes"], state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_entries()
+
+    def get(self, key: str) -> Any:
+        """
+        Fetch an entry and mark it as most recently used
+
+        Args:
+            key (str): key
+
+        Returns:
+            Any: entry or None if not cached
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any, size: int):
+        """
+        Store an entry, evicting the least recently used ones if over the limits
+
+        Args:
+            key (str): key
+            value (Any): entry
+            size (int): size of the entry in bytes
+        """
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (value, size)
+            self.nbytes += size
+            while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.nbytes}
+
+
+class ParseCache:
+    """
+    SQLite cache of raw KNP outputs keyed by sha256 of the sentence and a backend fingerprint,
+    so that several parser configurations can share one cache file.
+
+    Entries are zlib-compressed with a preset dictionary of KNP fragments (legacy uncompressed
+    entries are still readable). Writes are buffered and group-committed in a single transaction
+    once `commit_size` entries are pending or by the first write `commit_interval` seconds after the
+    last commit, and by `flush`, `close` and on exit. Buffered entries are visible to lookups.
+
+    In managed mode (`max_bytes` is set) access times and hit counts are recorded with the group
+    commits, and once the entries of the cache file (parses and tuples together) exceed `max_bytes`
+    the least recently (lru) or least frequently (lfu) used ones are evicted from either table.
+    """
+
+    TABLE = "parsed"
+
+    def __init__(self, path: str = DB_PATH, fingerprint: str = "", compress: bool = True, commit_size: int = 64, commit_interval: float = 1.0,
+                 max_bytes: Optional[int] = None, policy: str = "lru") -> None:
+        """
+        Args:
+            path (str, optional): path to the cache database. Defaults to DB_PATH.
+            fingerprint (str, optional): fingerprint of the parser backend. Defaults to "" (legacy keys).
+            compress (bool, optional): compress new entries. Defaults to True.
+            commit_size (int, optional): max number of buffered writes. Defaults to 64.
+            commit_interval (float, optional): commit with the next write after this many seconds. Defaults to 1.0.
+            max_bytes (Optional[int], optional): max total size of the entries of both tables. Defaults to None (unbounded).
+            policy (str, optional): eviction policy, "lru" or "lfu". Defaults to "lru".
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown eviction policy: {policy}")
+        self.path = path
+        self.fingerprint = fingerprint
+        self.compress = compress
+        self.commit_size = commit_size
+        self.commit_interval = commit_interval
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._init_buffer()
+        db = get_connection(self.path)
+        if self.max_bytes is not None:
+            for table in TABLES:
+                db.execute(f"CREATE INDEX IF NOT EXISTS {table}_atime ON {table}(atime)")
+            db.commit()
+
+    def _init_buffer(self):
+        self.pending: Dict[str, str] = {}
+        self.touched: Dict[str, Tuple[float, int]] = {}
+        self.last_commit = time.monotonic()
+        self.written = self.max_bytes or 0  # check the size on the first group commit
+        self.lock = threading.Lock()
+        _caches.add(self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["pending"], state["touched"], state["last_commit"], state["written"], state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_buffer()
+
+    def __del__(self):
+        if getattr(self, "pending", None) or getattr(self, "touched", None):
+            self.flush()
+
+    def close(self):
+        """
+        Commit the buffered writes, e.g. before handing the file to another process.
+        """
+        self.flush()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        return get_connection(self.path)
+
+    def key(self, text: str) -> str:
+        """
+        Cache key of a sentence
+
+        Args:
+            text (str): sentence
+
+        Returns:
+            str: key
+        """
+        key = hashlib.sha256(text.encode('UTF-8')).hexdigest()
+        return f"{key}:{self.fingerprint}" if self.fingerprint else key
+
+    def _touch(self, key: str):
+        # record an access to be written with the next group commit (lock held)
+        if self.max_bytes is not None:
+            _, count = self.touched.get(key, (0., 0))
+            self.touched[key] = (time.time(), count + 1)
+
+    def encode(self, result: str) -> Any:
+        """
+        Encode an entry to be stored
+
+        Args:
+            result (str): entry
+
+        Returns:
+            Any: compressed bytes, or the text itself if compression is disabled
+        """
+        if not self.compress:
+            return result
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zdict=ZDICT)
+        return bytes([FORMAT_ZLIB]) + compressor.compress(result.encode("utf-8")) + compressor.flush()
+
+    def decode(self, value: Any) -> str:
+        """
+        Decode a stored entry
+
+        Args:
+            value (Any): stored value
+
+        Raises:
+            ValueError: unknown entry format
+
+        Returns:
+            str: entry
+        """
+        if isinstance(value, str):
+            return value
+        if value[0] == FORMAT_ZLIB:
+            decompressor = zlib.decompressobj(zdict=ZDICT)
+            return (decompressor.decompress(value[1:]) + decompressor.flush()).decode("utf-8")
+        raise ValueError(f"unknown cache entry format: {value[0]}")
+
+    @instrument.timed("cache")
+    def get(self, text: str) -> Optional[str]:
+        """
+        Fetch a cached KNP output
+
+        Args:
+            text (str): sentence
+
+        Returns:
+            Optional[str]: KNP output or None if not cached
+        """
+        key = self.key(text)
+        with self.lock:
+            if key in self.pending:
+                self.hits += 1
+                instrument.count(f"{self.TABLE}.hits")
+                return self.pending[key]
+            row = self.db.execute(f"SELECT result FROM {self.TABLE} WHERE id = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                instrument.count(f"{self.TABLE}.misses")
+                return None
+            self.hits += 1
+            instrument.count(f"{self.TABLE}.hits")
+            self._touch(key)
+        return self.decode(row[0])
+
+    @instrument.timed("cache")
+    def get_many(self, texts: Iterable[str]) -> Dict[str, str]:
+        """
+        Fetch cached KNP outputs of many sentences with one query per MAX_VARIABLES keys
+
+        Args:
+            texts (Iterable[str]): sentences
+
+        Returns:
+            Dict[str, str]: KNP outputs of the cached sentences
+        """
+        keys = {self.key(text): text for text in texts}
+        fetched: Dict[str, str] = {}
+        with self.lock:
+            for key in keys.keys() & self.pending.keys():
+                fetched[keys[key]] = self.pending[key]
+            missing = [key for key in keys if keys[key] not in fetched]
+            for i in range(0, len(missing), MAX_VARIABLES):
+                chunk = missing[i:i + MAX_VARIABLES]
+                placeholders = ",".join("?" * len(chunk))
+                for key, result in self.db.execute(f"SELECT id, result FROM {self.TABLE} WHERE id IN ({placeholders})", chunk):
+                    fetched[keys[key]] = self.decode(result)
+                    self._touch(key)
+            self.hits += len(fetched)
+            self.misses += len(keys) - len(fetched)
+        instrument.count(f"{self.TABLE}.hits", len(fetched))
+        instrument.count(f"{self.TABLE}.misses", len(keys) - len(fetched))
+        return fetched
+
+    @instrument.timed("cache")
+    def put_many(self, results: Dict[str, str]):
+        """
+        Store KNP outputs of many sentences in a single transaction
+
+        Args:
+            results (Dict[str, str]): KNP output of each sentence
+        """
+        with self.lock:
+            for text, result in results.items():
+                self.pending[self.key(text)] = result
+        self.flush()
+
+    @instrument.timed("cache")
+    def put(self, text: str, result: str):
+        """
+        Buffer a KNP output to be group-committed
+
+        Args:
+            text (str): sentence
+            result (str): KNP output
+        """
+        with self.lock:
+            self.pending[self.key(text)] = result
+            due = len(self.pending) >= self.commit_size or time.monotonic() - self.last_commit >= self.commit_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Commit all buffered writes in a single transaction.
+
+        A failed commit (e.g. a locked or full disk) is reported and retried with the next one, and its
+        entries are dropped once the buffer outgrows `MAX_PENDING_COMMITS` commits: the cache never fails a parse.
+        """
+        with self.lock:
+            if len(self.pending) > 0 or len(self.touched) > 0:
+                db = self.db
+                now = time.time()
+                try:
+                    with db:
+                        rows = [(key, self.encode(result), now) for key, result in self.pending.items()]
+                        db.executemany(f"INSERT OR IGNORE INTO {self.TABLE} (id, result, atime) VALUES (?, ?, ?)", rows)
+                        accesses = [(atime, count, key) for key, (atime, count) in self.touched.items()]
+                        db.executemany(f"UPDATE {self.TABLE} SET atime = ?, hits = hits + ? WHERE id = ?", accesses)
+                    self.written += sum(len(key) + len(value) for key, value, _ in rows)
+                    self.pending = {}
+                    self.touched = {}
+                except sqlite3.Error as e:
+                    print(f"Failed to write {len(self.pending)} entries to the cache {self.path}: {e}")
+                    if len(self.pending) > self.commit_size * MAX_PENDING_COMMITS:
+                        self.pending = {}
+                        self.touched = {}
+            self.last_commit = time.monotonic()
+            due = self.max_bytes is not None and self.written > self.max_bytes * (1 - EVICT_WATERMARK)
+            if due:
+                self.written = 0
+        if due:
+            try:
+                self.evict()
+            except sqlite3.Error as e:
+                print(f"Failed to evict entries from the cache {self.path}: {e}")
+
+    def count(self) -> int:
+        """
+        Number of cached entries
+
+        Returns:
+            int: number of entries
+        """
+        self.flush()
+        return self.db.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def size(self, table: Optional[str] = None) -> int:
+        """
+        Total size of the cached entries (keys and stored values)
+
+        Args:
+            table (Optional[str], optional): table. Defaults to None (the table of this cache).
+
+        Returns:
+            int: size in bytes
+        """
+        return self.db.execute(f"SELECT COALESCE(SUM(LENGTH(id) + LENGTH(result)), 0) FROM {table or self.TABLE}").fetchone()[0]
+
+    def evict(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Evict entries of both tables by the eviction policy until they fit in the watermark of `max_bytes`.
+        The freed pages are reused by later writes; the file itself only shrinks by `compact`.
+
+        Args:
+            max_bytes (Optional[int], optional): max total size of the entries. Defaults to None (self.max_bytes).
+
+        Returns:
+            int: number of evicted entries
+        """
+        max_bytes = max_bytes if max_bytes is not None else self.max_bytes
+        if max_bytes is None:
+            return 0
+        self.flush()
+        with self.lock:
+            db = self.db
+            size = sum(self.size(table) for table in TABLES)
+            if size <= max_bytes:
+                return 0
+            excess = size - int(max_bytes * EVICT_WATERMARK)
+
+            # the tables' entries in eviction order, merged from one ordered cursor per table
+            order = "atime" if self.policy == "lru" else "hits, atime"
+            cursors = [db.execute(f"SELECT {order}, id, LENGTH(id) + LENGTH(result), '{table}' FROM {table} ORDER BY {order}")
+                       for table in TABLES]
+            victims: Dict[str, List[str]] = {table: [] for table in TABLES}
+            freed = 0
+            for row in heapq.merge(*cursors):
+                key, nbytes, table = row[-3:]
+                victims[table].append(key)
+                freed += nbytes
+                if freed >= excess:
+                    break
+            for cursor in cursors:
+                cursor.close()
+            with db:
+                for table, keys in victims.items():
+                    for i in range(0, len(keys), MAX_VARIABLES):
+                        chunk = keys[i:i + MAX_VARIABLES]
+                        db.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            evicted = sum(map(len, victims.values()))
+            self.evictions += evicted
+        return evicted
+
+    def compact(self) -> None:
+        """
+        Reclaim the space of deleted entries (VACUUM) and truncate the write-ahead log.
+        VACUUM locks out the writers of all processes, so this is left to the `jaspice-cache` CLI
+        (or a single maintenance process) and never runs during parsing.
+        """
+        if self.path == ":memory:":
+            return None
+
+        self.flush()
+        db = sqlite3.connect(self.path, timeout=60)  # VACUUM must not run inside the shared connection's transactions
+        try:
+            db.execute("VACUUM")
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            db.close()
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Statistics of the cache: entries, size of the entries and of the files, lookups of this process
+        and hits recorded by all processes in managed mode
+
+        Returns:
+            Dict[str, float]: statistics
+        """
+        self.flush()
+        entries, recorded_hits = self.db.execute(f"SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM {self.TABLE}").fetchone()
+        files = [self.path, self.path + "-wal"] if self.path != ":memory:" else []
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self.size(),
+            "file_bytes": sum(os.path.getsize(f) for f in files if os.path.exists(f)),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else 0.,
+            "evictions": self.evictions,
+            "recorded_hits": recorded_hits,
+        }
+
+
+class TupleCache(ParseCache):
+    """
+    Second cache tier holding the final graph tuples of a sentence, keyed by sha256 of the sentence,
+    the backend fingerprint and the version of the scene graph parser, so that known sentences skip
+    KNP result parsing and graph building entirely.
+    """
+
+    TABLE = "tuples"
+
+    def __init__(self, version: str, path: str = DB_PATH, fingerprint: str = "", compress: bool = True, commit_size: int = 64, commit_interval: float = 1.0,
+                 max_bytes: Optional[int] = None, policy: str = "lru") -> None:
+        """
+        Args:
+            version (str): version of the scene graph parser
+            path (str, optional): path to the cache database. Defaults to DB_PATH.
+            fingerprint (str, optional): fingerprint of the parser backend. Defaults to "".
+            compress (bool, optional): compress new entries. Defaults to True.
+            commit_size (int, optional): max number of buffered writes. Defaults to 64.
+            commit_interval (float, optional): commit with the next write after this many seconds. Defaults to 1.0.
+            max_bytes (Optional[int], optional): max total size of the entries of both tables. Defaults to None (unbounded).
+            policy (str, optional): eviction policy, "lru" or "lfu". Defaults to "lru".
+        """
+        self.version = version
+        super().__init__(path, fingerprint, compress, commit_size, commit_interval, max_bytes, policy)
+
+    def key(self, text: str) -> str:
+        return f"{super().key(text)}:{self.version}"
+
+
+def _file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _attached_tables(db: sqlite3.Connection) -> Dict[str, List[str]]:
+    # cache tables of the attached database "shard" and their columns
+    tables = {}
+    for (table,) in db.execute("SELECT name FROM shard.sqlite_master WHERE type = 'table'"):
+        if table in TABLES:
+            tables[table] = [row[1] for row in db.execute(f"PRAGMA shard.table_info({table})")]
+    return tables
+
+
+def export_shards(path: str, directory: str, prefix_length: int = 1, chunk_size: int = 1024) -> Dict[str, int]:
+    """
+    Export a cache as content-addressed shards: entries are partitioned by the hex prefix of their
+    sha256 key into `<prefix>.db` files, which are plain caches, and a manifest records the entries
+    and digest of each shard so that copies can be verified. Rows are streamed in a single pass,
+    so the cache never has to fit in memory.
+
+    Args:
+        path (str): path to the cache database
+        directory (str): output directory
+        prefix_length (int, optional): length of the key prefix (16 ** prefix_length shards). Defaults to 1.
+        chunk_size (int, optional): number of rows written at once. Defaults to 1024.
+
+    Returns:
+        Dict[str, int]: number of entries of each shard
+    """
+    os.makedirs(directory, exist_ok=True)
+    shard_dbs: Dict[str, sqlite3.Connection] = {}
+    entries: Dict[str, int] = {}
+
+    def shard_db(prefix: str) -> sqlite3.Connection:
+        if prefix not in shard_dbs:
+            shard_path = os.path.join(directory, f"{prefix}.db")
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+            shard_dbs[prefix] = sqlite3.connect(shard_path)
+            for table in TABLES:
+                shard_dbs[prefix].execute(f"CREATE TABLE {table}(id STRING PRIMARY KEY, result STRING, atime REAL DEFAULT 0, hits INTEGER DEFAULT 0)")
+            entries[prefix] = 0
+        return shard_dbs[prefix]
+
+    db = sqlite3.connect(path, timeout=60)
+    try:
+        for table in TABLES:
+            columns = [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+            if len(columns) == 0:  # legacy caches have no tuples table
+                continue
+            select = ", ".join(c for c in ["id", "result", "atime", "hits"] if c in columns)
+            insert = f"INSERT OR IGNORE INTO {table} ({select}) VALUES ({','.join('?' * len(select.split(', ')))})"
+            buffers: Dict[str, List[Tuple]] = {}
+            # keys are routed in Python: the STRING columns have numeric affinity, so range queries on them mis-compare
+            for row in db.execute(f"SELECT {select} FROM {table}"):
+                prefix = str(row[0])[:prefix_length].lower()
+                buffer = buffers.setdefault(prefix, [])
+                buffer.append(row)
+                if len(buffer) >= chunk_size:
+                    shard_db(prefix).executemany(insert, buffer)
+                    entries[prefix] += len(buffer)
+                    buffer.clear()
+            for prefix, buffer in buffers.items():
+                if len(buffer) > 0:
+                    shard_db(prefix).executemany(insert, buffer)
+                    entries[prefix] += len(buffer)
+    finally:
+        db.close()
+        for shard in shard_dbs.values():
+            shard.commit()
+            shard.close()
+
+    manifest: Dict[str, Dict[str, Any]] = {}
+    for prefix in sorted(entries):
+        shard_path = os.path.join(directory, f"{prefix}.db")
+        manifest[os.path.basename(shard_path)] = {"entries": entries[prefix], "sha256": _file_digest(shard_path)}
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return {name: shard["entries"] for name, shard in manifest.items()}
+
+
+def merge_shards(path: str, shards: List[str]) -> int:
+    """
+    Merge shards, shard directories or whole caches of other nodes into a cache. Entries are
+    deduplicated by their sha256 key (existing entries win) and copied inside SQLite, so the shards
+    never have to fit in memory. Shards listed in the manifest of a directory are verified first.
+
+    Args:
+        path (str): path to the cache database
+        shards (List[str]): shard files or directories written by export_shards
+
+    Raises:
+        ValueError: a shard does not match the digest of its manifest
+
+    Returns:
+        int: number of new entries
+    """
+    files = []
+    for shard in shards:
+        if not os.path.isdir(shard):
+            files.append(shard)
+            continue
+        manifest_path = os.path.join(shard, MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        for shard_path in sorted(glob.glob(os.path.join(shard, "*.db"))):
+            expected = manifest.get(os.path.basename(shard_path), {}).get("sha256")
+            if expected is not None and _file_digest(shard_path) != expected:
+                raise ValueError(f"corrupted shard: {shard_path}")
+            files.append(shard_path)
+
+    get_connection(path)  # create or migrate the tables
+    db = sqlite3.connect(path, timeout=60, isolation_level=None)
+    merged = 0
+    try:
+        for shard_path in files:
+            db.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+            db.execute("BEGIN")
+            for table, columns in _attached_tables(db).items():
+                select = ", ".join(c for c in ["id", "result", "atime", "hits"] if c in columns)
+                merged += db.execute(f"INSERT OR IGNORE INTO main.{table} ({select}) SELECT {select} FROM shard.{table}").rowcount
+            db.execute("COMMIT")
+            db.execute("DETACH DATABASE shard")
+    finally:
+        db.close()
+    return merged
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a size such as "512M" or "2G"
+
+    Args:
+        size (str): size in bytes with an optional K/M/G suffix
+
+    Returns:
+        int: size in bytes
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    size = size.strip().upper().rstrip("B")
+    if size[-1:] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def open_table(path: str, table: str, **kwargs) -> ParseCache:
+    return ParseCache(path, **kwargs) if table == "parsed" else TupleCache("", path, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the JaSPICE parse cache.")
+    parser.add_argument("--db", default=DB_PATH, help="path to the parse cache")
+    parser.add_argument("--table", choices=TABLES + ["all"], default="all", help="cache tier of stats")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="show entries and sizes")
+    evict = commands.add_parser("evict", help="evict entries down to a max size")
+    evict.add_argument("--max-bytes", type=parse_size, required=True, help="max size of both tiers together, e.g. 512M")
+    evict.add_argument("--policy", choices=POLICIES, default="lru", help="eviction policy")
+    commands.add_parser("compact", help="reclaim the space of deleted entries")
+    export = commands.add_parser("export", help="export the cache as content-addressed shards")
+    export.add_argument("directory", help="output directory")
+    export.add_argument("--prefix-length", type=int, default=1, help="length of the key prefix of each shard")
+    merge = commands.add_parser("merge", help="merge shards or caches of other nodes into the cache")
+    merge.add_argument("shards", nargs="+", help="shard files, shard directories or caches")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        shards = export_shards(args.db, args.directory, args.prefix_length)
+        print(f"{args.directory}: {len(shards)} shards, {sum(shards.values())} entries")
+        return
+    if args.command == "merge":
+        print(f"{args.db}: merged {merge_shards(args.db, args.shards)} new entries")
+        return
+
+    if args.command == "stats":
+        for table in TABLES if args.table == "all" else [args.table]:
+            stats = open_table(args.db, table).stats()
+            print(f"{table}: {stats['entries']} entries, {stats['bytes']} bytes, {stats['recorded_hits']} recorded hits")
+    elif args.command == "evict":
+        evicted = open_table(args.db, "parsed", policy=args.policy).evict(args.max_bytes)
+        print(f"{args.db}: evicted {evicted} entries")
+    if args.command != "stats":
+        open_table(args.db, "parsed").compact()
+    print(f"{args.db}: {open_table(args.db, 'parsed').stats()['file_bytes']} bytes on disk")
+
+
+if __name__ == "__main__":
+    main()
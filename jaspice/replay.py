@@ -0,0 +1,204 @@
+"""
+Record/replay KNP backend: recorded -tab outputs replayed by a LangParser or by stand-in `knp -S`/`juman -S` servers,
+so that parsing, caching, matching and the servers run without Juman++/KNP installed
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from typing import Dict, Iterable, List, Optional
+from pyknp import BList
+from jaspice.knp_pool import KNPPool
+from jaspice.knp_wrapper import AnalyzerError
+from jaspice.lang_parser import _LangParser, LangParser
+from jaspice.stub_server import StubServer
+from jaspice.warm import BACKENDS, read_captions
+
+feature_pattern = re.compile(r" ?(<[^>]*>)+$")
+
+
+def load_recordings(path: str) -> Dict[str, str]:
+    """
+    Load recorded KNP outputs from a JSONL file of {"text": ..., "knp": ...} records.
+
+    Args:
+        path (str): fixture file
+
+    Returns:
+        Dict[str, str]: KNP output of each sentence
+    """
+    with open(path, encoding="utf-8") as f:
+        return {record["text"]: record["knp"] for record in map(json.loads, filter(str.strip, f))}
+
+
+def record(texts: Iterable[str], path: str, parser: Optional[_LangParser] = None) -> int:
+    """
+    Append the KNP outputs of sentences not yet recorded in a fixture file, reusing cached parses.
+
+    Args:
+        texts (Iterable[str]): sentences
+        path (str): fixture file
+        parser (Optional[_LangParser], optional): parser running the analyzers. Defaults to LangParser().
+
+    Returns:
+        int: number of new recordings
+    """
+    recorded = load_recordings(path) if os.path.exists(path) else {}
+    texts = [text for text in dict.fromkeys(texts) if text not in recorded]
+    parser = parser or LangParser()
+    results = parser.cache.get_many(texts)
+    misses = [text for text in texts if not results.get(text)]
+    results.update(zip(misses, parser.pool.query_many(misses)))
+    with open(path, "a", encoding="utf-8") as f:
+        for text in texts:
+            f.write(json.dumps({"text": text, "knp": results[text]}, ensure_ascii=False) + "\n")
+    return len(texts)
+
+
+def surface(juman_lines: str) -> str:
+    """
+    Sentence analyzed in a Juman/KNP output: the surface forms of its morphemes.
+
+    Args:
+        juman_lines (str): Juman or KNP -tab output
+
+    Returns:
+        str: sentence
+    """
+    words = []
+    for line in juman_lines.split("\n"):
+        if not line or line[0] in "#*+@" or line == "EOS":
+            continue
+        words.append(" " if line.startswith("\\ ") else line.split(" ", 1)[0])
+    return "".join(words)
+
+
+def juman_output(knp_lines: str) -> str:
+    """
+    Juman output of a sentence reconstructed from its KNP -tab output (morpheme lines without KNP features).
+
+    Args:
+        knp_lines (str): KNP output
+
+    Returns:
+        str: Juman output
+    """
+    lines = [feature_pattern.sub("", line) for line in knp_lines.split("\n")
+             if line and line[0] not in "#*+" and line != "EOS"]
+    return "".join(line + "\n" for line in lines)
+
+
+class ReplayKNP:
+    """
+    Stand-in for a KNP instance: identifies the fixture in the backend fingerprint and builds BLists like KNP.result.
+    """
+    def __init__(self, path: str, pattern: str = "EOS"):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        self.command = "replay"
+        self.options = [f"sha256:{digest}"]
+        self.rcfile = ""
+        self.pattern = pattern
+        self.analyzer = None
+        self.juman = self
+
+    def result(self, input_str: str) -> BList:
+        return BList(input_str, self.pattern)
+
+
+class ReplayPool(KNPPool):
+    """
+    KNP pool answering from recorded outputs after a configurable latency.
+    """
+    def __init__(self, recordings: Dict[str, str], latency: float = 0.):
+        """
+        Args:
+            recordings (Dict[str, str]): KNP output of each sentence
+            latency (float, optional): seconds slept per sentence. Defaults to 0.
+        """
+        super().__init__([])
+        self.recordings = recordings
+        self.latency = latency
+
+    def query(self, text: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        if text not in self.recordings:
+            self._count("failures")
+            raise AnalyzerError(f"no recording for {text!r}")
+        self._count("queries")
+        return self.recordings[text]
+
+    def query_many(self, texts: List[str], chunk_size: int = 64) -> List[str]:
+        return [self.query(text) for text in texts]
+
+
+class ReplayLangParser(_LangParser):
+    def __init__(self, path: str, verbose=False, latency: float = 0., **kwargs) -> None:
+        """
+        Args:
+            path (str): fixture file of recorded KNP outputs
+            verbose (bool, optional): verbose mode. Defaults to False.
+            latency (float, optional): seconds slept per parsed sentence. Defaults to 0.
+        """
+        super().__init__(ReplayKNP(path), verbose, pool=ReplayPool(load_recordings(path), latency), **kwargs)
+
+
+def replay_servers(path: str, latency: float = 0., host: str = "localhost", port: int = 0, juman_port: int = 0):
+    """
+    Stand-in `knp -S` and `juman -S` servers answering from recorded outputs.
+    Unknown sentences get an empty analysis.
+
+    Args:
+        path (str): fixture file of recorded KNP outputs
+        latency (float, optional): seconds slept before each KNP response. Defaults to 0.
+        host (str, optional): host name. Defaults to "localhost".
+        port (int, optional): port of the KNP server, 0 for a free one. Defaults to 0.
+        juman_port (int, optional): port of the JUMAN server, 0 for a free one. Defaults to 0.
+
+    Returns:
+        Tuple[StubServer, StubServer]: KNP and JUMAN servers, not started yet
+    """
+    recordings = load_recordings(path)
+    knp = StubServer(lambda juman_lines: recordings.get(surface(juman_lines), ""), "knp", host, port, latency)
+    juman = StubServer(lambda text: juman_output(recordings.get(text, "")), "juman", host, juman_port)
+    return knp, juman
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record KNP outputs and replay them without Juman++/KNP.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="record KNP outputs of captions")
+    record_parser.add_argument("inputs", nargs="+", help="JSONL or COCO-style JSON files")
+    record_parser.add_argument("-o", "--output", required=True, help="fixture file")
+    record_parser.add_argument("--backend", choices=list(BACKENDS), default="knp", help="KNP backend")
+    record_parser.add_argument("--keep-spaces", action="store_true", help="do not remove spaces from captions")
+    serve_parser = subparsers.add_parser("serve", help="serve recorded outputs like knp -S and juman -S")
+    serve_parser.add_argument("fixture", help="fixture file")
+    serve_parser.add_argument("--host", default="localhost", help="host name")
+    serve_parser.add_argument("--port", type=int, default=31000, help="port of the KNP server")
+    serve_parser.add_argument("--juman-port", type=int, default=32000, help="port of the JUMAN server")
+    serve_parser.add_argument("--latency", type=float, default=0., help="seconds slept before each KNP response")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        captions = read_captions(args.inputs)
+        texts = captions if args.keep_spaces else (caption.replace(" ", "") for caption in captions)
+        print(f"recorded: {record(texts, args.output, BACKENDS[args.backend]())}")
+    elif args.command == "serve":
+        knp, juman = replay_servers(args.fixture, args.latency, args.host, args.port, args.juman_port)
+        juman.start()
+        print(f"KNP server on {knp.address[0]}:{knp.address[1]}, JUMAN server on {juman.address[0]}:{juman.address[1]}")
+        try:
+            knp.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            knp.server.server_close()
+            juman.close()
+
+
+if __name__ == "__main__":
+    main()
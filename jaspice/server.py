@@ -9,6 +9,7 @@ from pydantic import BaseModel
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 from typing import List, Dict
+from jaspice import instrument
 from jaspice.metrics import BatchJaSPICE
 
 
@@ -16,6 +17,7 @@ class ReqItem(BaseModel):
     references: List[List[str]]
     candidates: List[str]
     batch_size: int = 16
+    instrument: bool = False
 
 
 class CallbackServer:
@@ -32,19 +34,24 @@ class CallbackServer:
 
         @fapi.post("/")
         def compute_jaspice(item: ReqItem):
-            jaspice = BatchJaSPICE(size=item.batch_size)
-            spice, N = [], len(item.candidates)
-            batch_cand, batch_refs = [], []
-            for i, (reference, candidate) in enumerate(tqdm(zip(item.references, item.candidates))):
-                batch_refs.append(reference)
-                batch_cand.append(candidate)
-                if (i + 1) % item.batch_size == 0 or i == N - 1:
-                    results = jaspice(
-                        batch_candidate=batch_cand,
-                        batch_references=batch_refs)
-                    spice.extend(results)
-                    batch_cand, batch_refs = [], []
+            # an instrumented request records into its own recorder, apart from concurrent requests
+            recorder = instrument.Recorder(enabled=True) if item.instrument else instrument.current()
+            with instrument.recording(recorder):
+                jaspice = BatchJaSPICE(size=item.batch_size)
+                spice, N = [], len(item.candidates)
+                batch_cand, batch_refs = [], []
+                for i, (reference, candidate) in enumerate(tqdm(zip(item.references, item.candidates))):
+                    batch_refs.append(reference)
+                    batch_cand.append(candidate)
+                    if (i + 1) % item.batch_size == 0 or i == N - 1:
+                        results = jaspice(
+                            batch_candidate=batch_cand,
+                            batch_references=batch_refs)
+                        spice.extend(results)
+                        batch_cand, batch_refs = [], []
 
+            if item.instrument:
+                return JSONResponse(content={"scores": spice, "instrument": recorder.collect()})
             return JSONResponse(content=spice)
 
         host_name = "0.0.0.0"
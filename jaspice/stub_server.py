@@ -0,0 +1,89 @@
+"""
+Local stand-in for KNP (`knp -S`) and JUMAN (`juman -S`) servers
+"""
+import time
+import socketserver
+import threading
+from typing import Callable, Optional, Tuple
+
+
+def echo(text: str) -> str:
+    return text
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def handle(self):
+        stub = self.server.stub
+        lines = []
+        for raw in self.rfile:
+            line = raw.decode("utf-8").rstrip("\n")
+            if line.startswith("RUN"):
+                self.wfile.write(b"200 OK option=[" + line[3:].strip().encode("utf-8") + b"]\n")
+                continue
+            if line == "QUIT":
+                break
+            if stub.mode == "knp" and line != "EOS":
+                lines.append(line + "\n")  # KNP reads Juman output up to EOS
+                continue
+            text = "".join(lines) if stub.mode == "knp" else line
+            lines = []
+            if stub.latency:
+                time.sleep(stub.latency)
+            response = stub.respond(text)
+            if response and not response.endswith("\n"):
+                response += "\n"
+            if not ("\n" + response).endswith("\nEOS\n"):  # recorded outputs may carry their own EOS line
+                response += "EOS\n"
+            self.wfile.write(response.encode("utf-8"))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    stub: "StubServer"
+
+
+class StubServer:
+    """
+    Threaded TCP server speaking the KNP/JUMAN server protocol: `RUN <options>` is acknowledged with `200 OK`,
+    then every request (a line for JUMAN, Juman output up to EOS for KNP) is answered with `respond(request)` and EOS.
+    """
+    def __init__(self, respond: Optional[Callable[[str], str]] = None, mode: str = "knp", host: str = "localhost", port: int = 0,
+                 latency: float = 0.):
+        """
+        Args:
+            respond (Optional[Callable[[str], str]], optional): response to a request. Defaults to echoing it.
+            mode (str, optional): "knp" or "juman". Defaults to "knp".
+            host (str, optional): host name. Defaults to "localhost".
+            port (int, optional): port, 0 for a free one. Defaults to 0.
+            latency (float, optional): seconds slept before each response. Defaults to 0.
+        """
+        assert mode in ["knp", "juman"]
+        self.respond = respond or echo
+        self.mode = mode
+        self.latency = latency
+        self.server = _Server((host, port), _Handler)
+        self.server.stub = self
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        host, port = self.server.server_address[:2]
+        return str(host), port
+
+    def start(self) -> "StubServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
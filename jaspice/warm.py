@@ -0,0 +1,174 @@
+"""
+Offline warm-up of the parse cache
+"""
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from tqdm import tqdm
+from pyknp import KNP
+from jaspice.knp_wrapper import PexpectKNP, backend_fingerprint
+from jaspice.lang_parser import _LangParser, LangParser, LangParserWithPexpect
+from jaspice.parse_cache import DB_PATH, ParseCache
+
+BACKENDS = {"knp": LangParser, "pexpect": LangParserWithPexpect}
+ANALYZERS = {"knp": KNP, "pexpect": PexpectKNP}  # KNP instance of each backend, which fingerprints its cache entries
+
+_worker_parser: Optional[_LangParser] = None
+
+
+def _init_worker(backend: str):
+    global _worker_parser
+    _worker_parser = BACKENDS[backend]()
+
+
+def _parse(text: str) -> Tuple[str, Optional[str]]:
+    try:
+        return text, _worker_parser._knp_query(text)
+    except BaseException:
+        return text, None
+
+
+def _parse_batch(texts: List[str]) -> List[Tuple[str, Optional[str]]]:
+    try:
+        return list(zip(texts, _worker_parser.pool.query_many(texts)))
+    except BaseException:
+        return [_parse(text) for text in texts]
+
+
+def _extract_captions(record) -> Iterator[str]:
+    """
+    Extract captions from a record of a JSONL file or a COCO-style annotation.
+
+    Args:
+        record (Any): string, list of strings or dict with "caption", "text", "candidate(s)" or "references" fields
+
+    Yields:
+        Iterator[str]: captions
+    """
+    if isinstance(record, str):
+        yield record
+    elif isinstance(record, list):
+        for r in record:
+            yield from _extract_captions(r)
+    elif isinstance(record, dict):
+        for key in ["caption", "text", "candidate", "candidates", "references"]:
+            if key in record:
+                yield from _extract_captions(record[key])
+
+
+def read_captions(paths: List[str]) -> Iterator[str]:
+    """
+    Stream captions from JSONL files and COCO-style JSON files
+    (`{"annotations": [{"caption": ...}]}` or `{image_id: [caption, ...]}` as passed to compute_score).
+
+    Args:
+        paths (List[str]): input files
+
+    Yields:
+        Iterator[str]: captions
+    """
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield from _extract_captions(json.loads(line))
+                continue
+
+            data = json.load(f)
+            if isinstance(data, dict) and "annotations" in data:
+                yield from _extract_captions(data["annotations"])
+            elif isinstance(data, dict):
+                yield from _extract_captions(list(data.values()))
+            else:
+                yield from _extract_captions(data)
+
+
+def warm(captions: Iterable[str], backend: str = "knp", num_workers: int = 8, cache_path: str = DB_PATH,
+         chunk_size: int = 512, keep_spaces: bool = False, batch_size: int = 16) -> Dict[str, float]:
+    """
+    Parse all uncached captions with a pool of KNP workers and store them in the parse cache.
+
+    Args:
+        captions (Iterable[str]): captions
+        backend (str, optional): LangParser backend ("knp" or "pexpect"). Defaults to "knp".
+        num_workers (int, optional): number of KNP workers. Defaults to 8.
+        cache_path (str, optional): path to the parse cache. Defaults to DB_PATH.
+        chunk_size (int, optional): number of captions looked up and stored at once. Defaults to 512.
+        keep_spaces (bool, optional): keep spaces (compute_score removes them before parsing). Defaults to False.
+        batch_size (int, optional): captions pipelined through a worker at once. Defaults to 16.
+
+    Returns:
+        Dict[str, float]: statistics
+    """
+    # the analyzers are only started by the workers
+    cache = ParseCache(cache_path, fingerprint=backend_fingerprint(ANALYZERS[backend]()))
+
+    stats: Dict[str, float] = {"captions": 0, "unique": 0, "cached": 0, "parsed": 0, "failed": 0}
+    start = time.perf_counter()
+    seen: Set[str] = set()
+    pbar = tqdm(unit="sent")
+    with multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(backend,)) as pool:
+        chunk: List[str] = []
+
+        def flush_chunk():
+            cached = cache.get_many(chunk)
+            misses = [text for text in chunk if text not in cached]
+            stats["cached"] += len(cached)
+            pbar.update(len(cached))
+            parsed: Dict[str, str] = {}
+            batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+            for results in pool.imap_unordered(_parse_batch, batches):
+                for text, result in results:
+                    if result is None:
+                        stats["failed"] += 1
+                    else:
+                        parsed[text] = result
+                pbar.update(len(results))
+            cache.put_many(parsed)
+            stats["parsed"] += len(parsed)
+            elapsed = time.perf_counter() - start
+            pbar.set_postfix(parsed=stats["parsed"], cached=stats["cached"], rate=f"{stats['parsed'] / elapsed:.1f}/s")
+            chunk.clear()
+
+        for caption in captions:
+            stats["captions"] += 1
+            text = caption if keep_spaces else caption.replace(" ", "")
+            if text in seen:
+                continue
+            seen.add(text)
+            stats["unique"] += 1
+            chunk.append(text)
+            if len(chunk) >= chunk_size:
+                flush_chunk()
+        flush_chunk()
+    pbar.close()
+
+    stats["elapsed"] = time.perf_counter() - start
+    stats["throughput"] = stats["parsed"] / stats["elapsed"] if stats["elapsed"] > 0 else 0.
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-parse captions into the JaSPICE parse cache.")
+    parser.add_argument("inputs", nargs="+", help="JSONL or COCO-style JSON files")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="knp", help="KNP backend")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of KNP workers")
+    parser.add_argument("--cache", default=DB_PATH, help="path to the parse cache")
+    parser.add_argument("--chunk-size", type=int, default=512, help="captions looked up and stored at once")
+    parser.add_argument("--keep-spaces", action="store_true", help="do not remove spaces from captions")
+    parser.add_argument("--batch-size", type=int, default=16, help="captions pipelined through a worker at once")
+    args = parser.parse_args()
+
+    stats = warm(read_captions(args.inputs), args.backend, args.workers, args.cache, args.chunk_size, args.keep_spaces,
+                 args.batch_size)
+    print(f"captions: {stats['captions']}, unique: {stats['unique']}, cached: {stats['cached']}, "
+          f"parsed: {stats['parsed']}, failed: {stats['failed']}")
+    print(f"elapsed: {stats['elapsed']:.1f}s, throughput: {stats['throughput']:.1f} sentences/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,378 @@
 import sqlite3
 import os
+import sys
+import time
+import mmap
+import struct
+import argparse
 import requests
 import gzip
 import shutil
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
 from tqdm import tqdm
+from jaspice import instrument
 
 PATH = "wnjpn.db"
+ARTIFACT_EXTENSION = ".syn"  # artifacts live next to the database they are compiled from
+MAX_INDEX_BYTES = 512 * 1024 * 1024
+MAGIC = b"JASPSYN2"
+HEADER = struct.Struct("<8s8sIIIQQ")  # magic, byteorder, #lemmas, #edges, pool size, size and mtime (ns) of the database
+
+
+def artifact_path(db_path: Optional[str] = None) -> str:
+    """
+    Path of the synonym artifact compiled from a database: next to it, with the ARTIFACT_EXTENSION.
+
+    Args:
+        db_path (Optional[str], optional): path to wnjpn.db. Defaults to None (PATH).
+
+    Returns:
+        str: path to the artifact
+    """
+    return os.path.splitext(db_path or PATH)[0] + ARTIFACT_EXTENSION
+
+
+def db_source(db_path: str) -> Tuple[int, int]:
+    """
+    Size and modification time (ns) of a database, recorded in the artifacts compiled from it.
+
+    Args:
+        db_path (str): path to wnjpn.db
+
+    Returns:
+        Tuple[int, int]: size and mtime, or (0, 0) if the database does not exist
+    """
+    try:
+        stat = os.stat(db_path)
+    except OSError:
+        return (0, 0)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def artifact_is_fresh(path: Optional[str] = None, db_path: Optional[str] = None) -> bool:
+    """
+    Check that an artifact exists, is readable on this host and was compiled from the current database.
+    Without the database (e.g. an artifact shipped alone), any readable artifact is fresh.
+
+    Args:
+        path (Optional[str], optional): path to the artifact. Defaults to None (next to `db_path`).
+        db_path (Optional[str], optional): path to wnjpn.db. Defaults to None (PATH).
+
+    Returns:
+        bool: whether the artifact can be used
+    """
+    db_path = db_path or PATH
+    try:
+        with open(path or artifact_path(db_path), "rb") as f:
+            magic, byteorder, _, _, _, db_size, db_mtime = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return False
+    if magic != MAGIC or byteorder.rstrip(b"\0").decode() != sys.byteorder:
+        return False
+    source = db_source(db_path)
+    return source == (0, 0) or source == (db_size, db_mtime)
+
+
+class SynonymIndex:
+    """
+    In-memory lemma -> synonyms index of the Japanese WordNet.
+
+    Lemmas are interned to integer ids and the synonyms of each lemma are stored
+    as a CSR-style adjacency: the synonyms of lemma `i` are
+    `targets[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, lemmas: List[str], offsets: array, targets: array, stats: Optional[Dict[str, Any]] = None,
+                 source: Tuple[int, int] = (0, 0)) -> None:
+        """
+        Args:
+            lemmas (List[str]): interned lemmas (lemma id -> lemma)
+            offsets (array): adjacency offsets (len(lemmas) + 1 entries)
+            targets (array): lemma ids of synonyms
+            stats (Optional[Dict[str, Any]], optional): load statistics. Defaults to None.
+            source (Tuple[int, int], optional): size and mtime of the database. Defaults to (0, 0).
+        """
+        self.lemmas = lemmas
+        self.lemma_ids = {lemma: i for i, lemma in enumerate(lemmas)}
+        self.offsets = offsets
+        self.targets = targets
+        self.stats = stats or {}
+        self.source = source
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, max_bytes: Optional[int] = MAX_INDEX_BYTES) -> "SynonymIndex":
+        """
+        Load the lemma -> synonyms mapping of wnjpn.db into memory.
+
+        Args:
+            path (Optional[str], optional): path to wnjpn.db. Defaults to None (PATH).
+            max_bytes (Optional[int], optional): memory cap of the index. Defaults to MAX_INDEX_BYTES.
+
+        Raises:
+            MemoryError: the index exceeds `max_bytes`
+
+        Returns:
+            SynonymIndex: loaded index
+        """
+        start = time.perf_counter()
+        path = path or PATH
+        source = db_source(path)  # before reading, so that a concurrent update leaves the artifact stale
+        db = sqlite3.connect(path)
+        try:
+            # the last row wins, as in JaWordNet._get_wordid
+            word_ids: Dict[str, int] = {}
+            word_lemmas: Dict[int, str] = {}
+            for wordid, lemma in db.execute("select wordid, lemma from word order by wordid"):
+                word_ids[lemma] = wordid
+                word_lemmas[wordid] = lemma
+
+            word_synsets: Dict[int, List[str]] = {}
+            synset_words: Dict[str, List[int]] = {}
+            for synset, wordid, lang in db.execute("select synset, wordid, lang from sense"):
+                word_synsets.setdefault(wordid, []).append(synset)
+                if lang == "jpn":
+                    synset_words.setdefault(synset, []).append(wordid)
+        finally:
+            db.close()
+
+        lemmas: List[str] = []
+        lemma_ids: Dict[str, int] = {}
+
+        def intern(lemma: str) -> int:
+            if lemma not in lemma_ids:
+                lemma_ids[lemma] = len(lemmas)
+                lemmas.append(lemma)
+            return lemma_ids[lemma]
+
+        adjacency: Dict[int, List[int]] = {}
+        for lemma, wordid in word_ids.items():
+            synonyms = [
+                intern(word_lemmas[tg_wordid])
+                for synset in word_synsets.get(wordid, [])
+                for tg_wordid in synset_words.get(synset, [])
+                if tg_wordid != wordid and tg_wordid in word_lemmas
+            ]
+            if len(synonyms) > 0:
+                adjacency[intern(lemma)] = synonyms
+
+        offsets, targets = array("I", [0]), array("I")
+        for lemma_id in range(len(lemmas)):
+            targets.extend(adjacency.get(lemma_id, []))
+            offsets.append(len(targets))
+
+        size = cls._estimate_size(lemmas, offsets, targets)
+        if max_bytes is not None and size > max_bytes:
+            raise MemoryError(f"synonym index requires {size} bytes (max: {max_bytes})")
+
+        stats = {
+            "load_time": time.perf_counter() - start,
+            "lemmas": len(lemmas),
+            "entries": len(adjacency),
+            "edges": len(targets),
+            "bytes": size,
+        }
+        return cls(lemmas, offsets, targets, stats, source)
+
+    @staticmethod
+    def _estimate_size(lemmas: List[str], offsets: array, targets: array) -> int:
+        """
+        Estimate the memory footprint of the index.
+
+        Args:
+            lemmas (List[str]): interned lemmas
+            offsets (array): adjacency offsets
+            targets (array): adjacency targets
+
+        Returns:
+            int: estimated size in bytes
+        """
+        lemma_size = sys.getsizeof(lemmas) + sum(sys.getsizeof(lemma) for lemma in lemmas)
+        dict_size = 2 * sys.getsizeof({}) + 100 * len(lemmas)  # rough per-entry cost of lemma_ids
+        array_size = offsets.itemsize * len(offsets) + targets.itemsize * len(targets)
+        return lemma_size + dict_size + array_size
+
+    def get(self, query: str) -> List[str]:
+        """
+        Get synonyms of a lemma.
+
+        Args:
+            query (str): lemma
+
+        Returns:
+            List[str]: synonyms of query
+        """
+        lemma_id = self.lemma_ids.get(query)
+        if lemma_id is None:
+            return []
+        lemmas = self.lemmas
+        return [lemmas[i] for i in self.targets[self.offsets[lemma_id]:self.offsets[lemma_id + 1]]]
+
+    def save(self, path: Optional[str] = None):
+        """
+        Compile the index into a read-only binary artifact for MappedSynonymIndex.
+
+        Layout (after the header): lemma offsets (uint32[n + 1]), adjacency offsets (uint32[n + 1]),
+        synonym lemma ids (uint32[m]) and the UTF-8 lemma pool. Lemmas are sorted by their UTF-8 bytes
+        so that they can be looked up by binary search without any warm-up. The header records the size
+        and mtime of the source database, against which `artifact_is_fresh` checks the artifact.
+
+        Args:
+            path (Optional[str], optional): output path. Defaults to None (next to PATH).
+        """
+        path = path or artifact_path()
+        encoded = [lemma.encode("utf-8") for lemma in self.lemmas]
+        order = sorted(range(len(encoded)), key=lambda i: encoded[i])
+        new_ids = array("I", bytes(4 * len(order)))
+        for new_id, old_id in enumerate(order):
+            new_ids[old_id] = new_id
+
+        key_offsets, adj_offsets, targets = array("I", [0]), array("I", [0]), array("I")
+        pool = bytearray()
+        for old_id in order:
+            pool.extend(encoded[old_id])
+            key_offsets.append(len(pool))
+            targets.extend(new_ids[i] for i in self.targets[self.offsets[old_id]:self.offsets[old_id + 1]])
+            adj_offsets.append(len(targets))
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, sys.byteorder.encode(), len(order), len(targets), len(pool), *self.source))
+            for section in [key_offsets, adj_offsets, targets]:
+                section.tofile(f)
+            f.write(pool)
+        os.replace(tmp_path, path)  # never expose a half-written artifact to other workers
+
+
+class MappedSynonymIndex:
+    """
+    Memory-mapped view of a synonym artifact written by SynonymIndex.save.
+
+    The artifact is opened read-only, so all worker processes mapping the same file
+    share a single physical copy through the page cache.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """
+        Args:
+            path (Optional[str], optional): path to the artifact. Defaults to None (next to PATH).
+
+        Raises:
+            ValueError: the file is not a synonym artifact of this host
+        """
+        start = time.perf_counter()
+        path = path or artifact_path()
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, byteorder, n_lemmas, n_edges, pool_size, *source = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or byteorder.rstrip(b"\0").decode() != sys.byteorder:
+            self.mm.close()
+            raise ValueError(f"{path} is not a synonym artifact for this host")
+
+        view = memoryview(self.mm)
+        pos = HEADER.size
+        self.key_offsets = view[pos:pos + 4 * (n_lemmas + 1)].cast("I")
+        pos += 4 * (n_lemmas + 1)
+        self.adj_offsets = view[pos:pos + 4 * (n_lemmas + 1)].cast("I")
+        pos += 4 * (n_lemmas + 1)
+        self.targets = view[pos:pos + 4 * n_edges].cast("I")
+        pos += 4 * n_edges
+        self.pool_start = pos
+        self.n_lemmas = n_lemmas
+        self.source = tuple(source)
+        self.stats = {
+            "load_time": time.perf_counter() - start,
+            "lemmas": n_lemmas,
+            "edges": n_edges,
+            "bytes": len(self.mm),
+            "path": path,
+        }
+
+    def _lemma(self, lemma_id: int) -> bytes:
+        start = self.pool_start
+        return self.mm[start + self.key_offsets[lemma_id]:start + self.key_offsets[lemma_id + 1]]
+
+    def _find(self, key: bytes) -> int:
+        """
+        Binary search of a lemma.
+
+        Args:
+            key (bytes): UTF-8 encoded lemma
+
+        Returns:
+            int: lemma id or -1 if not found
+        """
+        lo, hi = 0, self.n_lemmas
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._lemma(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n_lemmas and self._lemma(lo) == key:
+            return lo
+        return -1
+
+    def get(self, query: str) -> List[str]:
+        """
+        Get synonyms of a lemma.
+
+        Args:
+            query (str): lemma
+
+        Returns:
+            List[str]: synonyms of query
+        """
+        lemma_id = self._find(query.encode("utf-8"))
+        if lemma_id == -1:
+            return []
+        targets = self.targets[self.adj_offsets[lemma_id]:self.adj_offsets[lemma_id + 1]]
+        return [self._lemma(i).decode("utf-8") for i in targets]
+
+
+def build_artifact(db_path: Optional[str] = None, path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Compile wnjpn.db into a synonym artifact shared by all workers.
+
+    Args:
+        db_path (Optional[str], optional): path to wnjpn.db, downloaded if it is PATH and missing. Defaults to None (PATH).
+        path (Optional[str], optional): output path. Defaults to None (next to `db_path`).
+
+    Returns:
+        Dict[str, Any]: statistics of the compiled index
+    """
+    db_path = db_path or PATH
+    path = path or artifact_path(db_path)
+    if not os.path.exists(db_path):
+        if db_path != PATH:
+            raise FileNotFoundError(f"{db_path} does not exist (only the default {PATH} is downloaded)")
+        JaWordNet()._download_db()
+    index = SynonymIndex.load(db_path, max_bytes=None)
+    index.save(path)
+    return index.stats
 
 
 class JaWordNet:
+    def __init__(self, use_index: bool = True, max_index_bytes: Optional[int] = MAX_INDEX_BYTES, artifact: Optional[str] = "") -> None:
+        """
+        Args:
+            use_index (bool, optional): load synonyms into an in-memory index. Defaults to True.
+            max_index_bytes (Optional[int], optional): memory cap of the index. Defaults to MAX_INDEX_BYTES.
+            artifact (Optional[str], optional): compiled synonym artifact, memory-mapped if it is fresh.
+                Defaults to "" (the artifact next to PATH); None never uses an artifact.
+        """
+        self.use_index = use_index
+        self.max_index_bytes = max_index_bytes
+        self.artifact = artifact
+        self.index: Any = None
+
+    def __getstate__(self):
+        # memory maps cannot be pickled; workers reopen the index lazily
+        state = self.__dict__.copy()
+        state["index"] = None
+        return state
+
     def _download_db(self):
         # download
         print("Download wordnet database ... ")
@@ -27,6 +391,39 @@ class JaWordNet:
             with open(PATH, mode="wb") as decompressed_file:
                 shutil.copyfileobj(gzip_file, decompressed_file)
 
+    def _load_index(self) -> Any:
+        """
+        Load the index on first use: the compiled artifact if it is fresh, otherwise an in-memory index.
+        Falls back to per-lookup SQLite queries if the index exceeds the memory cap.
+
+        Returns:
+            Any: loaded index (MappedSynonymIndex or SynonymIndex)
+        """
+        if self.index is None and self.use_index:
+            if self.artifact is not None:
+                path = self.artifact or artifact_path()
+                if artifact_is_fresh(path):
+                    self.index = MappedSynonymIndex(path)
+                    return self.index
+                if os.path.exists(path):
+                    print(f"{path} is stale or unreadable; rebuild it with jaspice-wordnet")
+            try:
+                self.index = SynonymIndex.load(PATH, self.max_index_bytes)
+            except MemoryError as e:
+                print(f"{e}; fall back to sqlite lookups")
+                self.use_index = False
+        return self.index
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        Statistics (load time, size) of the in-memory index.
+
+        Returns:
+            Dict[str, Any]: statistics
+        """
+        return self.index.stats if self.index is not None else {}
+
     def _get_wordid(self, db, lemma):
         cur = db.execute("select wordid from word where lemma='%s'" % lemma)
         for row in cur:
@@ -40,9 +437,15 @@ class JaWordNet:
             synsets.append(row[0])
         return synsets
 
+    @instrument.timed("wordnet")
     def get_synonyms(self, query):
-        if not os.path.exists(PATH):
+        has_artifact = self.use_index and self.artifact is not None and os.path.exists(self.artifact or artifact_path())
+        if not os.path.exists(PATH) and not has_artifact:
             self._download_db()
+        index = self._load_index()
+        if index is not None:
+            return index.get(query)
+
         db = sqlite3.connect(PATH)
         try:
             wordid = self._get_wordid(db, query)
@@ -61,3 +464,17 @@ class JaWordNet:
 
         db.close()
         return synonyms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile wnjpn.db into a memory-mapped synonym artifact.")
+    parser.add_argument("--db", default=PATH, help="path to wnjpn.db")
+    parser.add_argument("--output", default=None, help="path to the synonym artifact (default: next to the database)")
+    args = parser.parse_args()
+    output = args.output or artifact_path(args.db)
+    stats = build_artifact(args.db, output)
+    print(f"{output}: {stats['lemmas']} lemmas, {stats['edges']} synonyms")
+
+
+if __name__ == "__main__":
+    main()
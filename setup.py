@@ -30,6 +30,14 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/keio-smilab23/JaSPICE",
     packages=setuptools.find_packages(),
+    entry_points={
+        "console_scripts": [
+            "jaspice-wordnet=jaspice.wordnet:main",
+            "jaspice-warm=jaspice.warm:main",
+            "jaspice-cache=jaspice.parse_cache:main",
+            "jaspice-replay=jaspice.replay:main",
+        ],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
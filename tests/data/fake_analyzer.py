@@ -0,0 +1,16 @@
+"""
+Stand-in for Juman++ (--juman) and KNP: echoes its input, crashes on "crash" and hangs on "hang"
+"""
+import sys
+import time
+
+for line in sys.stdin:
+    line = line.rstrip("\n")
+    if "crash" in line:
+        sys.exit(1)
+    if "hang" in line:
+        time.sleep(60)
+    print(line)
+    if "--juman" in sys.argv:
+        print("EOS")
+    sys.stdout.flush()
@@ -1,5 +1,11 @@
+import os
+import json
+import pickle
 import pytest
-from jaspice.graph_parser import JaSceneGraphParser
+from pyknp import BList
+from jaspice.graph_parser import JaSceneGraphParser, SceneGraph, SceneTuple, Vocab, VOCAB, ZEROP, OBJECT, ATTRIBUTE, RELATION
+from jaspice.lang_parser import ParsedLang
+from jaspice.parse_cache import ParseCache
 
 text = "人通りの少なくなった道路で青いズボンを着た男の子がオレンジ色のヘルメットを被りスケートボードに乗っている"
 
@@ -13,6 +19,84 @@ def test_parse_graph():
     assert graph_tuple_list == expected
 
 
+def test_parse_graph_from_knp_output():
+    expected = {
+        "赤い傘の人が座る": ['人', '傘', '座る_人', '傘_の_人'],
+        "机の上にりんごがある": ['林檎', '上', '机', '林檎_有る_上'],
+        "白い服を着た女性が夕方に歩く": ['服', '女性', '白い_服', '歩く_女性', '夕方_女性', '女性_着る_服'],
+    }
+
+    class StubLangParser:
+        pass
+
+    parser = JaSceneGraphParser(StubLangParser(), cache_tuples=False)
+    with open(os.path.join(os.path.dirname(__file__), "data", "knp.jsonl"), encoding="utf-8") as f:
+        samples = {sample["text"]: sample["knp"] for sample in map(json.loads, f)}
+    for text, graph_tuple in expected.items():
+        graph = SceneGraph()
+        parser._parse(graph, ParsedLang(BList(samples[text], "EOS")))
+        assert sorted(graph.get_graph_tuple()) == sorted(graph_tuple)
+
+
+def test_scene_tuple():
+    graph = SceneGraph()
+    obj = graph.add_node("傘", "傘", "NP")
+    attr = graph.add_node("赤い", "赤い", "ATTR")
+    graph.add_edge(obj, attr)
+    tuples = graph.get_scene_tuples()
+    assert sorted(graph.get_graph_tuple()) == ["傘", "赤い_傘"]
+    assert SceneTuple(OBJECT, (VOCAB.intern("傘"),)) in tuples
+    assert SceneTuple.from_string("赤い_傘") == SceneTuple(ATTRIBUTE, (VOCAB.intern("赤い"), VOCAB.intern("傘")))
+
+    rel = SceneTuple.from_words(RELATION, ("人_a", "差す", "傘"))
+    assert rel.words == ("人_a", "差す", "傘")
+    assert str(rel) == "人_a_差す_傘"
+    assert pickle.loads(pickle.dumps(rel)) == rel
+    with pytest.raises(ValueError):
+        SceneTuple.from_string(str(rel))  # 4 words
+    with pytest.raises(ValueError):
+        SceneTuple.from_words(ATTRIBUTE, ("人", "差す", "傘"))
+
+
+def test_vocab_checkpoint():
+    vocab = Vocab(max_words=4)
+    vocab.intern(ZEROP)
+    vocab.pin()
+    assert [vocab.intern(word) for word in ["傘", "人", "傘", "ベンチ"]] == [1, 2, 1, 3]
+    assert not vocab.checkpoint()
+    vocab.intern("道")
+    assert vocab.checkpoint()
+    assert (vocab.words, vocab.generation) == ([ZEROP], 1)
+    assert vocab.intern(ZEROP) == 0 and vocab.intern("道") == 1
+    assert VOCAB.words[0] == ZEROP  # pinned at import
+
+
+def test_tuple_cache(tmp_path, monkeypatch):
+    class StubLangParser:
+        cache = ParseCache(str(tmp_path / "parsed.db"))
+
+    def run_many(texts):
+        parsed.extend(texts)
+        graphs = [SceneGraph() for _ in texts]
+        for graph in graphs:
+            graph.add_edge(graph.add_node("差す", "差す", "OTHER"), graph.add_node("傘", "傘", "NP"))
+        return graphs
+
+    parsed = []
+    parser = JaSceneGraphParser(StubLangParser())
+    monkeypatch.setattr(parser, "run_many", run_many)
+    first = parser.get_tuples_many(["傘を差す", "傘を差す"])
+    second = parser.get_tuples_many(["傘を差す"])
+    assert parsed == ["傘を差す"]
+    assert sorted(map(str, first[0])) == ["[PHI]_差す_傘", "傘"]
+    assert first[0] == first[1] == second[0]
+    assert parser.memory.stats["hits"] == 1
+
+    parser.memory.clear()
+    assert parser.get_tuples_many(["傘を差す"]) == second  # served by the tuple cache
+    assert parsed == ["傘を差す"]
+
+
 # def test_draw_graph():
 #     parser = JaSceneGraphParser()
 #     graph = parser.run(text)
@@ -23,3 +107,31 @@ def test_print_graph():
     parser = JaSceneGraphParser()
     graph = parser.run(text)
     graph.print()
+
+
+def test_scene_graph_build():
+    graph = SceneGraph()
+    man = graph.add_node("男性", "男性", "NP")
+    wear = graph.add_node("着た", "着る", "OTHER")
+    shirt = graph.add_node("シャツ", "シャツ", "NP")
+    red = graph.add_node("赤い", "赤い", "ATTR")
+    walk = graph.add_node("歩く", "歩く", "OTHER")
+    road = graph.add_node("道", "道", "NP")
+    put = graph.add_node("置く", "置く", "OTHER")
+    box = graph.add_node("箱", "箱", "NP")
+    for src, dst in [(man, wear), (wear, shirt), (shirt, red), (walk, shirt), (walk, road), (put, box), (man, wear)]:
+        graph.add_edge(src, dst)
+    assert graph.add_node("男性", "男性", "NP") == man
+    assert graph.add_node("の", "の", "OTHER", unique=True) != graph.add_node("の", "の", "OTHER", unique=True)
+    assert graph.search_nodes("の") == [8, 9]
+    assert graph.get_nsubj_node("シャツ") == man
+    assert graph.get_nsubj_node("シャツ", allow_direct=False) == man
+    assert graph.get_nsubj_node("道") == -1
+
+    # 歩く gets the subject of 着る through シャツ, 置く a zero pronoun
+    assert graph.get_graph_tuple() == ["男性", "シャツ", "道", "箱", "[PHI]", "赤い_シャツ", "男性_着る_シャツ",
+                                       "男性_歩く_シャツ", "男性_歩く_道", "[PHI]_置く_箱"]
+    kinds = [OBJECT, RELATION, OBJECT, ATTRIBUTE, RELATION, OBJECT, RELATION, OBJECT, ATTRIBUTE, ATTRIBUTE, OBJECT]
+    assert [node.kind_code for node in graph.nodes] == kinds
+    assert [node.kind for node in graph.nodes[:4]] == ["object", "relation", "object", "attribute"]
+    assert graph.nodes is graph.nodes
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+import pytest
+from jaspice import instrument
+from jaspice.instrument import Recorder
+from jaspice.knp_pool import AnalyzerProcess, KNPPool, KNPWorker
+from jaspice.parse_cache import ParseCache
+
+FAKE_ANALYZER = os.path.join(os.path.dirname(__file__), "data", "fake_analyzer.py")
+
+
+@pytest.fixture
+def recorder():
+    instrument.RECORDER.reset()
+    instrument.enable()
+    yield instrument.RECORDER
+    instrument.enable(False)
+    instrument.RECORDER.reset()
+
+
+def test_recorder_merge():
+    workers = [Recorder(enabled=True), Recorder(enabled=True)]
+    for i, worker in enumerate(workers):
+        worker.record("knp", 0.001 * (i + 1))
+        worker.record("knp", 0.004, items=8)
+        worker.count("parsed.hits", 3)
+    driver = Recorder()
+    for worker in workers:
+        driver.merge(json.loads(json.dumps(worker.collect())))  # as sent back by Ray workers or the server
+    assert workers[0].snapshot() == {"stages": {}, "counters": {}}
+
+    summary = driver.summary()
+    knp = summary["stages"]["knp"]
+    assert (knp["count"], knp["items"]) == (4, 18)
+    assert knp["total_ms"] == pytest.approx(11.)
+    assert knp["max_ms"] == pytest.approx(4.)
+    assert 1. <= knp["p50_ms"] <= 2.048 < knp["p90_ms"] <= 4.
+    assert summary["counters"] == {"parsed.hits": 6}
+
+
+def test_timed(recorder, tmp_path):
+    cache = ParseCache(str(tmp_path / "parsed.db"))
+    cache.put_many({"傘": "result"})
+    assert cache.get_many(["傘", "人"]) == {"傘": "result"}
+    instrument.enable(False)
+    cache.get("傘")  # not recorded while disabled
+
+    summary = instrument.summary()
+    assert summary["stages"]["cache"]["count"] == 2
+    assert summary["counters"] == {"parsed.hits": 1, "parsed.misses": 1}
+
+
+def test_analyzer_stages(recorder):
+    pool = KNPPool([KNPWorker(AnalyzerProcess([sys.executable, FAKE_ANALYZER, "--juman"]), AnalyzerProcess([sys.executable, FAKE_ANALYZER]))])
+    pool.query("傘")
+    pool.query_many(["傘", "人"])
+    pool.close()
+    stages = instrument.summary()["stages"]
+    assert stages["juman"]["count"] == stages["knp"]["count"] == 4  # including the readiness probe
+    assert instrument.summary()["counters"]["pool.queries"] == 3
+
+
+def test_recording():
+    pool = KNPPool([KNPWorker(AnalyzerProcess([sys.executable, FAKE_ANALYZER, "--juman"]), AnalyzerProcess([sys.executable, FAKE_ANALYZER]))])
+    request = Recorder(enabled=True)
+    with instrument.recording(request):
+        assert instrument.current() is request
+        pool.query_many(["傘", "人"])  # recorded on the pipeline threads, too
+    pool.close()
+    assert instrument.current() is instrument.RECORDER
+    assert instrument.RECORDER.snapshot() == {"stages": {}, "counters": {}}
+    stages = request.summary()["stages"]
+    assert stages["juman"]["count"] == 3 and stages["knp"]["count"] == 3  # including the readiness probe
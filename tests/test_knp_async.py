@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import asyncio
+import pytest
+from jaspice.knp_async import AsyncKNPClient
+from jaspice.knp_wrapper import AnalyzerError
+from jaspice.lang_parser import ParsedLang
+from jaspice.stub_server import StubServer
+
+samples = [json.loads(line) for line in open(os.path.join(os.path.dirname(__file__), "data", "knp.jsonl"), encoding="utf-8")]
+
+
+def test_parse_many():
+    recorded = {sample["text"]: sample["knp"] for sample in samples}
+
+    async def run(knp_port, juman_port):
+        async with AsyncKNPClient([knp_port], connections=2, juman_servers=[juman_port]) as client:
+            texts = [sample["text"] for sample in samples] * 3
+            return texts, await client.parse_many(texts)
+
+    with StubServer(lambda text: recorded[text.strip()]) as knp, StubServer(mode="juman") as juman:
+        texts, lparsed = asyncio.run(run(knp.address[1], juman.address[1]))
+    for text, parsed in zip(texts, lparsed):
+        expected = ParsedLang.from_tab(recorded[text])
+        assert [tag.text for tag in parsed.tags] == [tag.text for tag in expected.tags]
+
+
+def test_concurrent_connections():
+    def respond(text):
+        time.sleep(0.1)
+        return text
+
+    async def run(servers, juman_port):
+        async with AsyncKNPClient(servers, connections=4, juman_servers=[juman_port]) as client:
+            start = time.perf_counter()
+            results = await client.query_many([f"文{i}" for i in range(16)])
+            return results, time.perf_counter() - start
+
+    with StubServer(respond) as knp1, StubServer(respond) as knp2, StubServer(mode="juman") as juman:
+        results, elapsed = asyncio.run(run([knp1.address, knp2.address], juman.address[1]))
+    assert results == [f"文{i}\n" for i in range(16)]
+    assert elapsed < 0.8  # 16 parses of 0.1s on 2 x 4 connections
+
+
+def test_server_failure():
+    def respond(text):
+        raise ValueError(text)  # the stub drops the connection
+
+    async def run(knp_port, juman_port):
+        async with AsyncKNPClient([knp_port], connections=1, juman_servers=[juman_port]) as client:
+            await client.query("傘")
+
+    with StubServer(respond) as knp, StubServer(mode="juman") as juman:
+        with pytest.raises(AnalyzerError):
+            asyncio.run(run(knp.address[1], juman.address[1]))
+
+
+def test_event_loops():
+    with StubServer(lambda text: text) as knp, StubServer(mode="juman") as juman:
+        client = AsyncKNPClient([knp.address[1]], connections=1, juman_servers=[juman.address[1]])
+        assert asyncio.run(client.query("傘")) == "傘\n"
+        assert asyncio.run(client.query("人")) == "人\n"  # the pools rebind to the new event loop
+        asyncio.run(client.close())
+        assert asyncio.run(client.query("道")) == "道\n"
+        asyncio.run(client.close())
@@ -0,0 +1,70 @@
+import os
+import sys
+import pickle
+import pytest
+from jaspice.knp_pool import AnalyzerError, AnalyzerProcess, KNPPool, KNPWorker
+
+FAKE_ANALYZER = os.path.join(os.path.dirname(__file__), "data", "fake_analyzer.py")
+
+
+def make_pool(size=1, timeout=5., **kwargs):
+    workers = [KNPWorker(AnalyzerProcess([sys.executable, FAKE_ANALYZER, "--juman"], timeout),
+                         AnalyzerProcess([sys.executable, FAKE_ANALYZER], timeout)) for _ in range(size)]
+    return KNPPool(workers, **kwargs)
+
+
+def test_pool_query_and_recycle():
+    pool = make_pool(max_queries=2)
+    assert pool.query("傘を差す") == "傘を差す\n"
+    pid = pool.workers[0].juman.process.pid
+    assert pool.query("傘を差す") == "傘を差す\n"
+    assert not pool.workers[0].alive()  # recycled after two queries
+    assert pool.query("座る") == "座る\n"
+    assert pool.workers[0].juman.process.pid != pid
+    assert pool.stats() == {"queries": 3, "failures": 0, "restarts": 0, "recycles": 1, "alive": 1}
+    pool.close()
+
+
+@pytest.mark.parametrize("text", ["crash", "hang"])
+def test_pool_restart(text):
+    pool = make_pool(timeout=0.5, retries=0)
+    assert pool.query("傘") == "傘\n"
+    with pytest.raises(AnalyzerError):
+        pool.query(text)
+    assert not pool.workers[0].alive()
+    assert pool.query("傘") == "傘\n"
+    stats = pool.stats()
+    assert stats["failures"] == stats["restarts"] == 1
+    pool.close()
+
+
+def test_pool_not_ready():
+    pool = KNPPool([KNPWorker(AnalyzerProcess(["jaspice-no-such-analyzer"]), AnalyzerProcess([sys.executable, FAKE_ANALYZER]))])
+    with pytest.raises(AnalyzerError):
+        pool.query("傘")
+
+    pool = pickle.loads(pickle.dumps(make_pool(size=2)))
+    assert [pool.query("傘") for _ in range(3)] == ["傘\n"] * 3
+    pool.close()
+
+
+def test_pool_query_many():
+    pool = make_pool(size=2, timeout=2.)
+    texts = [f"文{i}" for i in range(10)]
+    assert pool.query_many(texts, chunk_size=4) == [f"文{i}\n" for i in range(10)]
+    assert pool.stats()["queries"] == 10
+
+    with pytest.raises(AnalyzerError):
+        pool.query_many(["傘", "crash", "人"])  # the failed chunk falls back to one sentence at a time
+    assert pool.query_many(["傘", "人"]) == ["傘\n", "人\n"]
+    pool.close()
+
+
+def test_pool_query_many_after_hang():
+    pool = make_pool(timeout=0.5)
+    texts = [f"文{i}" for i in range(5)]
+    with pytest.raises(AnalyzerError):
+        pool.query_many(["傘", "hang", "人"])
+    assert not any(thread.is_alive() for thread in pool.workers[0].threads)
+    assert pool.query_many(texts) == [f"{text}\n" for text in texts]
+    pool.close()
@@ -0,0 +1,50 @@
+import os
+import json
+from types import SimpleNamespace
+from pyknp.utils.analyzer import Analyzer
+import jaspice.knp_wrapper
+from jaspice.knp_wrapper import Socket, backend_fingerprint
+from jaspice.stub_server import StubServer
+
+samples = [json.loads(line) for line in open(os.path.join(os.path.dirname(__file__), "data", "knp.jsonl"), encoding="utf-8")]
+
+
+def test_socket_framing():
+    long_output = "".join(sample["knp"].replace("EOS\n", "") for sample in samples) * 200  # multibyte characters split across reads
+    responses = {"long": long_output, "eos": "EOS EOS EOS 名詞\nxEOS\n"}
+    with StubServer(lambda text: responses.get(text.strip(), text)) as server:
+        sock = Socket("localhost", server.address[1], b"RUN -tab -normal\n")
+        assert sock.query("long\nEOS", "EOS") == long_output + "EOS"
+        assert sock.query("eos\nEOS", "EOS") == responses["eos"] + "EOS"
+
+        for text in ["傘", "人", "long"]:  # pipelined: responses sharing a read are kept for the next call
+            sock.send(text + "\nEOS")
+        assert sock.receive() == "傘\nEOS"
+        assert sock.receive() == "人\nEOS"
+        assert sock.receive() == long_output + "EOS"
+        assert not sock.buffer
+
+
+def test_server_fingerprint(monkeypatch):
+    versions = []
+    monkeypatch.setattr(jaspice.knp_wrapper, "command_version", lambda command: versions.append(command) or f"{command} 1.0")
+    juman = SimpleNamespace(command="jumanpp", options=[], rcfile="")
+
+    def knp(port, proc=None):
+        analyzer = Analyzer(backend="socket", server="localhost", port=port, socket_option="RUN -tab -normal\n")
+        return SimpleNamespace(command="knp", options=["-tab"], rcfile="", analyzer=analyzer, juman=juman, proc=proc)
+
+    def header(version):
+        return lambda text: f"# S-ID:1 KNP:{version} DATE:2024/01/01 SCORE:-1.0\n{text}"
+
+    with StubServer(header("5.0-abc")) as knp50, StubServer(header("5.0-abc")) as replica, StubServer(header("5.1-def")) as knp51, \
+            StubServer() as unversioned:
+        fingerprint = backend_fingerprint(knp(knp50.address[1]))
+        assert fingerprint == backend_fingerprint(knp(replica.address[1]))  # same KNP on another port shares the cache
+        assert fingerprint != backend_fingerprint(knp(knp51.address[1]))  # upgraded behind a server
+        port = unversioned.address[1]
+        assert backend_fingerprint(knp(port)) != backend_fingerprint(knp(port + 1))  # falls back to the address
+    assert versions == ["jumanpp"] * 5  # Juman++ runs locally, but no local `knp -v` for the servers
+
+    backend_fingerprint(knp(31000, proc=object()))  # a server spawned by ServerKNP runs the local knp
+    assert versions[-2:] == ["knp", "jumanpp"]
@@ -0,0 +1,76 @@
+import json
+import os
+from pyknp import BList
+from jaspice.lang_parser import Bnst, ParsedLang, parse_tab, subcategory_mask
+
+samples = [json.loads(line) for line in open(os.path.join(os.path.dirname(__file__), "data", "knp.jsonl"), encoding="utf-8")]
+
+
+def test_bnst_parents():
+    for sample in samples:
+        blist = BList(sample["knp"], "EOS")
+        lparsed = ParsedLang(blist)
+        assert len(lparsed.bnsts) == len(blist.bnst_list())
+        for bnst, knp_bnst in zip(lparsed.bnsts, blist.bnst_list()):
+            if knp_bnst.parent is None:
+                assert bnst.parent is None
+                continue
+            assert bnst.parent is lparsed.bnsts[knp_bnst.parent_id]  # shared, not a copy
+            expected = Bnst(knp_bnst.parent)
+            assert (bnst.parent.text, bnst.parent.kind, bnst.parent.raw_text) == (expected.text, expected.kind, expected.raw_text)
+
+
+def test_compact_units():
+    lparsed = ParsedLang(BList(samples[2]["knp"], "EOS"))  # 机の上にりんごがある
+    apple = lparsed.bnsts[2]
+    assert not hasattr(apple, "__dict__")
+    assert apple.morphemes[0].subcategories == ["植物", "人工物-食べ物"]
+    assert apple.morphemes[0] is lparsed.morhs[4]  # shared with tags and morhs
+    assert apple.have_subcategory_mrph(["人工物-食べ物", "色"])
+    assert not apple.have_subcategory_mrph(["色", "数量", "未知"])
+    assert lparsed.bnsts[1].have_subcategory_mrph(subcategory_mask(["場所-機能"]))
+
+
+def test_lazy_parsed_lang():
+    lparsed = ParsedLang(BList(samples[3]["knp"], "EOS"))  # 白い服を着た女性が夕方に歩く
+    assert lparsed._tags is None and lparsed._bnsts is None
+    cargs = {tag.text: [(c.case, c.arg) for c in cargs] for tag, cargs in lparsed.case_args}
+    assert cargs == {"白い": [("ガ", "服")], "着る": [("ガ", "女性"), ("ヲ", "服")], "歩く": [("ガ", "女性"), ("時間", "夕方")]}
+    assert lparsed.parsed is not None
+    assert [bnst.text for bnst in lparsed.bnsts] == ["白い", "服", "着る", "女性", "夕方", "歩く"]
+    assert lparsed.parsed is None  # released once every view is built
+    assert [morh.repname for morh in lparsed.morhs][:3] == ["白い", "服", ""]
+
+
+def view(lparsed):
+    def morh(m):
+        return (m.morpheme, m.pronounce, m.category, m.repname, m.subcategory_mask)
+
+    return {
+        "morhs": [morh(m) for m in lparsed.morhs],
+        "tags": [(tag.text, tag.arguments, [morh(m) for m in tag.morphemes]) for tag in lparsed.tags],
+        "bnsts": [(bnst.text, bnst.raw_text, bnst.kind, bnst.parent_id, bnst.parent and bnst.parent.text, bnst.subcategory_mask,
+                   [morh(m) for m in bnst.morphemes]) for bnst in lparsed.bnsts],
+        "case_args": [(tag.text, [(carg.case, carg.arg) for carg in cargs]) for tag, cargs in lparsed.case_args],
+    }
+
+
+edge_cases = [
+    # KNP v4.2 -anaphora predicate-argument structure
+    samples[0]["knp"].replace("<格解析結果:座る/すわる:動1:ガ/C/人/2/0/1;ヲ/U/-/-/-/->", "<述語項構造:座る/すわる:動1:ガ/N/人/0/2/5;ヲ/-/-/-/-/->"),
+    # unparsable case analysis (reported by pyknp)
+    samples[0]["knp"].replace("<格解析結果:座る/すわる:動1:ガ/C/人/2/0/1;ヲ/U/-/-/-/->", "<格解析結果:壊れた>"),
+    # KNP v4.1 -anaphora
+    samples[0]["knp"].replace("<格解析結果:座る/すわる:動1:ガ/C/人/2/0/1;ヲ/U/-/-/-/->", "<EID:1><項構造:座る/すわる:動1:ガ/N/人/1><格解析結果:座る/すわる:動1:ガ/C/人/2/0/1>"),
+    # quoted surface form, morphemes without features, comments and blank lines
+    "# S-ID:5 KNP:5.0\n# comment\n\n* -1D <体言>\n+ -1D <体言>\n\" \" \" 特殊 1 括弧始 3 * 0 * 0 NIL\n傘 かさ 傘 名詞 6 普通名詞 1 * 0 * 0 NIL\nEOS\n",
+    "* -1D <体言>\n+ -1D <体言>\n傘 かさ 傘 名詞 6 普通名詞 1 * 0 * 0 \"代表表記:傘/かさ カテゴリ:人工物-その他;色\"\nEOS\n",
+]
+
+
+def test_parse_tab_matches_pyknp(capsys):
+    for sample in [sample["knp"] for sample in samples] + edge_cases:
+        assert view(ParsedLang.from_tab(sample)) == view(ParsedLang(BList(sample, "EOS")))
+    assert all(parse_tab(sample["knp"]) is not None for sample in samples)
+    assert parse_tab(edge_cases[0]) is not None
+    assert parse_tab(edge_cases[2]) is None  # left to pyknp
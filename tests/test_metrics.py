@@ -1,5 +1,6 @@
 import pytest
-from jaspice.metrics import JaSPICE, BatchJaSPICE
+from jaspice.metrics import JaSPICE, BatchJaSPICE, BatchMatcher
+from jaspice.graph_parser import SceneTuple
 
 
 def test_jaspice():
@@ -32,6 +33,43 @@ def test_compute_F():
     assert jaspice._compute_F(P, R) == 0.0
 
 
+def test_compute_matching(monkeypatch):
+    class StubLangParser:  # matching never parses
+        pass
+
+    synonyms = {"人": ["人間", "ヒト"], "座る": ["腰掛ける"], "傘": ["アンブレラ"]}
+    jaspice = JaSPICE(StubLangParser())
+    monkeypatch.setattr(jaspice, "_get_synonyms", lambda word: synonyms.get(word, []))
+
+    cand = set(map(SceneTuple.from_string, ["人", "傘", "人_座る_ベンチ", "赤い_傘"]))
+    ref = set(map(SceneTuple.from_string, ["人間", "アンブレラ", "ヒト_腰掛ける_ベンチ", "青い_傘", "人_差す_傘"]))
+    assert jaspice._compute_matching(cand, ref) == 3.0
+    assert jaspice._compute_matching(ref, cand) == 3.0
+    assert jaspice._compute_matching(set(), ref) == 0.0
+
+
+def test_batch_matcher(monkeypatch):
+    class StubLangParser:  # matching never parses
+        pass
+
+    synonyms = {"人": ["人間", "ヒト"], "座る": ["腰掛ける"], "傘": ["アンブレラ"]}
+    jaspice = JaSPICE(StubLangParser())
+    monkeypatch.setattr(jaspice, "_get_synonyms", lambda word: synonyms.get(word, []))
+    matcher = BatchMatcher()
+    monkeypatch.setattr(matcher.wordnet, "get_synonyms", lambda word: synonyms.get(word, []))
+
+    cands = [["人", "傘", "人_座る_ベンチ", "赤い_傘"], ["人"], [], ["海", "人_見る_海"]]
+    refs = [["人間", "アンブレラ", "ヒト_腰掛ける_ベンチ", "青い_傘", "人_差す_傘"], [], ["人"], ["海", "ヒト_見る_海", "人"]]
+    cands = [set(map(SceneTuple.from_string, c)) for c in cands]
+    refs = [set(map(SceneTuple.from_string, r)) for r in refs]
+    match, P, R, F = matcher.compute(cands, refs)
+    assert match.tolist() == [3.0, 0.0, 0.0, 2.0]
+    for i in range(len(cands)):
+        assert match[i] == jaspice._compute_matching(cands[i], refs[i])
+    assert F[0] == pytest.approx(jaspice._compute_F(3 / 4, 3 / 5))
+    assert matcher(cands, refs) == F.tolist()
+
+
 def test_batch_jaspice():
     refs, caps = [], []
     refs.append(['川の中で黒い熊が取っ組み合いをしている', '湖の中で取っ組み合っている黒い熊である', '湖の中で喧嘩をする二頭の熊と湖の端っこで水に浸かっている熊', '川でじゃれ合う2匹の熊と川に浸かる熊', '熊が二匹水の中で取っ組み合いをしている'])
@@ -54,3 +92,10 @@ def test_batch_jaspice():
     assert res[0] == pytest.approx(0.182, 1e-3)
     assert res[1] == pytest.approx(0.0556, 1e-3)
     assert res[2] == pytest.approx(0.0870, 1e-3)
+
+    jaspice = BatchJaSPICE(vectorized=True)
+    res = jaspice(refs, caps)
+    assert len(res) == 3
+    assert res[0] == pytest.approx(0.182, 1e-3)
+    assert res[1] == pytest.approx(0.0556, 1e-3)
+    assert res[2] == pytest.approx(0.0870, 1e-3)
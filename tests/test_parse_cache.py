@@ -0,0 +1,192 @@
+import gc
+import time
+import pickle
+import weakref
+import itertools
+import pytest
+import sqlite3
+from jaspice.parse_cache import LRUCache, ParseCache, TupleCache, export_shards, merge_shards
+
+result = "* -1D <体言>\n+ -1D <体言>\n傘 かさ 傘 名詞 6 普通名詞 1 * 0 * 0 \"代表表記:傘/かさ\" <It's>\n"
+
+
+def test_parse_cache(tmp_path):
+    path = str(tmp_path / "parsed.db")
+    cache = ParseCache(path, commit_size=2, commit_interval=60)
+    assert cache.get("傘") is None
+
+    cache.put("傘", result)
+    assert cache.get("傘") == result  # visible before the group commit
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM parsed").fetchone()[0] == 0
+
+    cache.put("赤い傘", result)
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM parsed").fetchone()[0] == 2
+    assert cache.count() == 2
+
+
+def test_parse_cache_release(tmp_path):
+    path = str(tmp_path / "parsed.db")
+    cache = ParseCache(path, commit_size=8, commit_interval=60)
+    cache.put("傘", result)
+    cache.close()
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM parsed").fetchone()[0] == 1
+
+    cache.put("赤い傘", result)
+    released = weakref.ref(cache)
+    del cache
+    gc.collect()
+    assert released() is None  # not pinned by the exit handler
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM parsed").fetchone()[0] == 2
+
+
+def test_parse_cache_pickle(tmp_path):
+    path = str(tmp_path / "parsed.db")
+    cache = ParseCache(path, commit_size=8)
+    cache.put("傘", result)
+    cache.flush()
+
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.get("傘") == result
+    assert restored.pending == {}
+
+
+def test_parse_cache_many(tmp_path):
+    path = str(tmp_path / "parsed.db")
+    cache = ParseCache(path, commit_size=8)
+    cache.put("傘", result)
+    cache.put_many({"赤い傘": result + "a", "人": result + "b"})
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM parsed").fetchone()[0] == 3
+
+    cache.put("ベンチ", result + "c")
+    texts = ["傘", "赤い傘", "未知", "ベンチ", "傘"]
+    assert cache.get_many(texts) == {"傘": result, "赤い傘": result + "a", "ベンチ": result + "c"}
+    assert cache.get_many([]) == {}
+
+
+def test_parse_cache_format(tmp_path):
+    path = str(tmp_path / "parsed.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE parsed(id STRING PRIMARY KEY, result STRING)")
+    db.execute("INSERT INTO parsed (id, result) VALUES (?, ?)", (ParseCache(path).key("傘"), result))  # legacy entry
+    db.commit()
+
+    legacy, knp420, knp421 = ParseCache(path), ParseCache(path, fingerprint="knp4.20"), ParseCache(path, fingerprint="knp4.21")
+    assert legacy.get("傘") == result
+    assert knp420.get("傘") is None
+    knp420.put_many({"傘": result * 10})
+    assert knp420.get("傘") == result * 10
+    assert knp421.get("傘") is None
+
+    stored = sqlite3.connect(path).execute("SELECT result FROM parsed WHERE id = ?", (knp420.key("傘"),)).fetchone()[0]
+    assert isinstance(stored, bytes) and len(stored) < len((result * 10).encode("utf-8"))
+
+
+def test_lru_cache():
+    cache = LRUCache(max_entries=2, max_bytes=10)
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    assert cache.get("a") == 1
+    cache.put("c", 3, 4)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    cache.put("d", 4, 6)  # over max_bytes, evicts "a"
+    assert cache.get("a") is None
+    cache.put("e", 5, 11)  # larger than the cache
+    assert cache.get("e") is None
+    assert cache.stats == {"hits": 2, "misses": 3, "evictions": 2, "entries": 2, "bytes": 10}
+
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.get("c") is None
+    assert restored.max_bytes == 10
+
+
+@pytest.mark.parametrize("policy, survivor", [("lru", "a"), ("lfu", "c")])
+def test_parse_cache_eviction(tmp_path, monkeypatch, policy, survivor):
+    clock = itertools.count(1)
+    monkeypatch.setattr(time, "time", lambda: float(next(clock)))
+    cache = ParseCache(str(tmp_path / "parsed.db"), commit_size=1, max_bytes=10 ** 9, policy=policy)
+    for text in ["a", "b", "c"]:
+        cache.put(text, result)
+    cache.get("c")
+    cache.get("c")
+    cache.get("a")  # most recent, but less frequent than "c"
+    cache.flush()
+
+    entry_size = cache.size() // 3
+    assert cache.evict(max_bytes=entry_size * 2) == 2
+    assert list(cache.get_many(["a", "b", "c"])) == [survivor]
+
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 4 and stats["misses"] == 2
+    assert stats["hit_rate"] == 4 / 6
+
+
+def test_parse_cache_max_bytes(tmp_path):
+    path = str(tmp_path / "parsed.db")
+    cache = ParseCache(path, commit_size=4, max_bytes=2000)
+    for i in range(100):
+        cache.put(f"傘{i}", result + str(i))
+    cache.flush()
+    assert 0 < cache.size() <= 2000
+    assert cache.evictions > 0
+    assert cache.compact() is None
+    assert cache.stats()["file_bytes"] > 0
+
+
+def test_parse_cache_shared_budget(tmp_path, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(time, "time", lambda: float(next(clock)))
+    path = str(tmp_path / "parsed.db")
+    parses = ParseCache(path, commit_size=1, max_bytes=10 ** 9)
+    tuples = TupleCache("1", path, commit_size=1, max_bytes=10 ** 9)
+    parses.put("a", result)
+    tuples.put("b", result)
+    parses.put("c", result)
+    tuples.put("d", result)
+
+    entry_size = parses.size() // 2
+    assert tuples.evict(max_bytes=entry_size * 3) == 2
+    assert list(parses.get_many(["a", "c"])) == ["c"]
+    assert list(tuples.get_many(["b", "d"])) == ["d"]
+
+
+def test_parse_cache_write_error(tmp_path, monkeypatch):
+    cache = ParseCache(str(tmp_path / "parsed.db"), commit_size=1)
+
+    def locked(result):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(cache, "encode", locked)
+    cache.put("傘", result)  # reported, not raised
+    assert cache.get("傘") == result
+
+    monkeypatch.undo()
+    cache.flush()  # retried with the next commit
+    assert ParseCache(cache.path).get("傘") == result
+
+
+def test_export_merge_shards(tmp_path):
+    node1, node2, merged = (str(tmp_path / name) for name in ["node1.db", "node2.db", "merged.db"])
+    ParseCache(node1).put_many({"傘": result, "赤い傘": result})
+    ParseCache(node2).put_many({"赤い傘": result, "青い傘": result})
+    TupleCache("1", node2).put_many({"青い傘": "[]"})
+
+    shards = export_shards(node1, str(tmp_path / "shards"))
+    assert sum(shards.values()) == 2
+    for name in shards:
+        keys = sqlite3.connect(str(tmp_path / "shards" / name)).execute("SELECT id FROM parsed").fetchall()
+        assert all(key.startswith(name[0]) for (key,) in keys)
+    assert merge_shards(merged, [str(tmp_path / "shards"), node2]) == 4  # node2 is merged as a whole cache
+
+    cache = ParseCache(merged)
+    assert cache.count() == 3
+    assert cache.get_many(["傘", "赤い傘", "青い傘"]) == {"傘": result, "赤い傘": result, "青い傘": result}
+    assert TupleCache("1", merged).get("青い傘") == "[]"
+    assert merge_shards(merged, [node1]) == 0
+
+    shard = str(tmp_path / "shards" / next(iter(shards)))
+    with open(shard, "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(ValueError):
+        merge_shards(merged, [str(tmp_path / "shards")])
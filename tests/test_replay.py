@@ -0,0 +1,35 @@
+import os
+import asyncio
+from jaspice.graph_parser import JaSceneGraphParser
+from jaspice.knp_async import AsyncKNPClient
+from jaspice.replay import ReplayLangParser, juman_output, load_recordings, record, replay_servers, surface
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "data", "knp.jsonl")
+
+
+def test_replay_lang_parser(tmp_path):
+    lparser = ReplayLangParser(FIXTURE, cache_path=str(tmp_path / "parsed.db"))
+    parser = JaSceneGraphParser(lparser, cache_tuples=False)
+    assert sorted(parser.run("机の上にりんごがある").get_graph_tuple()) == ['上', '机', '林檎', '林檎_有る_上']
+    assert parser.run("未収録の文").failed
+
+    path = str(tmp_path / "recorded.jsonl")
+    texts = list(load_recordings(FIXTURE))
+    assert record(texts + texts[:1], path, lparser) == len(texts)
+    assert record(texts, path, lparser) == 0
+    assert load_recordings(path) == load_recordings(FIXTURE)
+
+
+def test_replay_servers():
+    recordings = load_recordings(FIXTURE)
+    for text, knp in recordings.items():
+        assert surface(knp) == surface(juman_output(knp)) == text
+
+    async def run(knp_port, juman_port):
+        async with AsyncKNPClient([knp_port], connections=2, juman_servers=[juman_port]) as client:
+            return await client.query_many(list(recordings))
+
+    knp, juman = replay_servers(FIXTURE, latency=0.01)
+    with knp, juman:
+        results = asyncio.run(run(knp.address[1], juman.address[1]))
+    assert results == [output[:-len("EOS\n")] for output in recordings.values()]
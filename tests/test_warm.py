@@ -0,0 +1,18 @@
+import json
+from jaspice.warm import read_captions
+
+
+def test_read_captions(tmp_path):
+    jsonl = tmp_path / "captions.jsonl"
+    jsonl.write_text("\n".join([
+        json.dumps({"candidate": "白い服を着た人", "references": ["人が座っている", "傘をさした人"]}),
+        "",
+        json.dumps("赤い車"),
+    ]), encoding="utf-8")
+    coco = tmp_path / "captions.json"
+    coco.write_text(json.dumps({"annotations": [{"image_id": 1, "caption": "犬が走っている"}]}), encoding="utf-8")
+    refs = tmp_path / "refs.json"
+    refs.write_text(json.dumps({"1": ["猫が寝ている", "赤い車"]}), encoding="utf-8")
+
+    captions = list(read_captions([str(jsonl), str(coco), str(refs)]))
+    assert captions == ["白い服を着た人", "人が座っている", "傘をさした人", "赤い車", "犬が走っている", "猫が寝ている", "赤い車"]
@@ -0,0 +1,85 @@
+import sqlite3
+import pytest
+import jaspice.wordnet
+from jaspice.wordnet import JaWordNet, SynonymIndex, MappedSynonymIndex, artifact_is_fresh, artifact_path, build_artifact
+
+
+@pytest.fixture
+def wordnet_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "wnjpn.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE word (wordid integer primary key, lang text, lemma text, pron text, pos text)")
+    db.execute("CREATE TABLE sense (synset text, wordid integer, lang text, rank text, lexid integer, freq integer, src text)")
+    words = [(1, "jpn", "人"), (2, "jpn", "人間"), (3, "jpn", "ヒト"), (4, "eng", "person"),
+             (5, "jpn", "傘"), (6, "jpn", "アンブレラ"), (7, "jpn", "座る")]
+    senses = [("s-person", 1, "jpn"), ("s-person", 2, "jpn"), ("s-person", 4, "eng"),
+              ("s-human", 1, "jpn"), ("s-human", 3, "jpn"),
+              ("s-umbrella", 5, "jpn"), ("s-umbrella", 6, "jpn"), ("s-sit", 7, "jpn")]
+    db.executemany("INSERT INTO word (wordid, lang, lemma) values (?, ?, ?)", words)
+    db.executemany("INSERT INTO sense (synset, wordid, lang) values (?, ?, ?)", senses)
+    db.commit()
+    db.close()
+    monkeypatch.setattr(jaspice.wordnet, "PATH", path)
+    return path
+
+
+def test_synonym_index(wordnet_db):
+    index = SynonymIndex.load(wordnet_db)
+    assert sorted(index.get("人")) == ["ヒト", "人間"]
+    assert index.get("person") == ["人", "人間"]
+    assert index.get("傘") == ["アンブレラ"]
+    assert index.get("座る") == []
+    assert index.get("未知語") == []
+    assert index.stats["edges"] == len(index.targets)
+    assert index.stats["bytes"] > 0
+
+
+def test_synonym_index_memory_cap(wordnet_db):
+    with pytest.raises(MemoryError):
+        SynonymIndex.load(wordnet_db, max_bytes=1)
+
+
+def test_index_matches_sqlite(wordnet_db):
+    indexed, queried = JaWordNet(artifact=None), JaWordNet(use_index=False)
+    for lemma in ["人", "人間", "ヒト", "person", "傘", "アンブレラ", "座る", "未知語", "it's"]:
+        assert sorted(indexed.get_synonyms(lemma)) == sorted(queried.get_synonyms(lemma))
+    assert indexed.stats["lemmas"] > 0
+    assert queried.stats == {}
+
+
+def test_mapped_synonym_index(wordnet_db, tmp_path):
+    path = str(tmp_path / "wnjpn.syn")
+    stats = build_artifact(wordnet_db, path)
+    index, mapped = SynonymIndex.load(wordnet_db), MappedSynonymIndex(path)
+    assert mapped.stats["lemmas"] == stats["lemmas"]
+    for lemma in ["人", "人間", "ヒト", "person", "傘", "アンブレラ", "座る", "未知語", ""]:
+        assert mapped.get(lemma) == index.get(lemma)
+
+    wordnet = JaWordNet(artifact=path)
+    assert sorted(wordnet.get_synonyms("人")) == ["ヒト", "人間"]
+    assert isinstance(wordnet.index, MappedSynonymIndex)
+
+    with pytest.raises(FileNotFoundError):
+        build_artifact(str(tmp_path / "missing.db"))  # not downloaded to PATH instead
+
+
+def test_stale_artifact(wordnet_db):
+    path = artifact_path()
+    assert path == wordnet_db[:-len(".db")] + ".syn"  # next to the database
+    assert not artifact_is_fresh()
+    build_artifact()
+    assert artifact_is_fresh()
+    assert isinstance(JaWordNet()._load_index(), MappedSynonymIndex)
+
+    db = sqlite3.connect(wordnet_db)
+    db.execute("INSERT INTO word (wordid, lang, lemma) values (8, 'jpn', 'ヒューマン')")
+    db.execute("INSERT INTO sense (synset, wordid, lang) values ('s-human', 8, 'jpn')")
+    db.commit()
+    db.close()
+    assert not artifact_is_fresh()
+    wordnet = JaWordNet()
+    assert sorted(wordnet.get_synonyms("人")) == ["ヒト", "ヒューマン", "人間"]  # from the database, not the stale artifact
+    assert isinstance(wordnet.index, SynonymIndex)
+
+    build_artifact()
+    assert sorted(JaWordNet().get_synonyms("人")) == ["ヒト", "ヒューマン", "人間"]